@@ -4,6 +4,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
+from app.text_match import KeywordMatcher
+
 GENERIC_PATTERNS = (
     "ajustar prácticas y controles",
     "define 1-2 acciones medibles",
@@ -13,6 +15,7 @@ GENERIC_PATTERNS = (
     "nivel bueno: ajustar",
     "nivel promedio: ajustar",
 )
+_GENERIC = KeywordMatcher({"generico": GENERIC_PATTERNS})
 
 SECCION_DESC: Dict[str, Dict[str, str]] = {
     "Estrategia": {
@@ -75,10 +78,10 @@ SECCION_DESC: Dict[str, Dict[str, str]] = {
 
 
 def is_generic_text(text: str) -> bool:
-    t = (text or "").strip().lower()
+    t = (text or "").strip()
     if len(t) < 20:
         return True
-    return any(p in t for p in GENERIC_PATTERNS)
+    return _GENERIC.primero(t) is not None
 
 
 def prioridad_from_score(score: float) -> str:
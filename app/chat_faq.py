@@ -0,0 +1,294 @@
+"""Capa de respuestas locales delante del modelo para los chats.
+
+Dos niveles, ambos en microsegundos y sin llamada al LLM:
+
+- ``FaqIndex``: preguntas de ejemplo → respuesta, indexadas por n-gramas de
+  caracteres (3-gramas sobre el texto de app.text_normalize) con pesos TF-IDF.
+  Una pregunta se responde si su similitud coseno con algún ejemplo alcanza
+  ``min_score``; los 3-gramas toleran erratas ("cuanto cuetsa") y los que no
+  aparecen en el índice restan, así que un mensaje largo con otra intención no
+  se confunde con una FAQ corta.
+- ``SemanticCache``: respuestas del modelo a preguntas que llegaron sin
+  historial (LRU con TTL), por chat y versión de prompt. Una pregunta con otra
+  redacción ("¿Sirve MentHIA para restaurantes?" / "sirve menthia para un
+  restaurante") se busca
+  con MinHash + LSH sobre sus 3-gramas y se sirve si su similitud Jaccard con
+  la original alcanza ``min_sim``. Sin servicios de embeddings.
+
+Variables de entorno:
+- LLM_FAQ (1) — 0 desactiva ambos niveles.
+- LLM_FAQ_MIN_SCORE (0.6) — similitud mínima para responder con una FAQ.
+- LLM_FAQ_CACHE_TTL (86400), LLM_FAQ_CACHE_MAX_ENTRIES (512),
+  LLM_FAQ_CACHE_MIN_SIM (0.75) — caché semántica de respuestas del modelo.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from app.llm_cache import prompt_version
+from app.text_normalize import normalizar
+
+_N = 3
+_NO_PALABRA = re.compile(r"[^\w]+")
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def faq_enabled() -> bool:
+    return os.getenv("LLM_FAQ", "1").strip() != "0"
+
+
+def _ngramas(texto: str) -> Counter:
+    t = f" {normalizar(texto)} "
+    return Counter(t[i : i + _N] for i in range(len(t) - _N + 1))
+
+
+def _clave(pregunta: str) -> str:
+    """Texto normalizado sin signos: "¿Qué es MentHIA?" y "que es menthia" comparten clave."""
+    return " ".join(_NO_PALABRA.sub(" ", normalizar(pregunta)).split())
+
+
+@dataclass(frozen=True)
+class FaqHit:
+    respuesta: str
+    intencion: str
+    pregunta: str  # ejemplo más parecido
+    score: float
+
+
+class FaqIndex:
+    def __init__(self, entradas: Iterable[tuple[str, Iterable[str], str]], min_score: float = 0.6) -> None:
+        """``entradas``: ``(intención, preguntas de ejemplo, respuesta)``."""
+        self.min_score = min_score
+        self._docs: list[tuple[str, str, str]] = []  # (intención, pregunta, respuesta)
+        tfs: list[Counter] = []
+        for intencion, preguntas, respuesta in entradas:
+            for pregunta in preguntas:
+                grams = _ngramas(pregunta)
+                if grams:
+                    self._docs.append((intencion, pregunta, respuesta))
+                    tfs.append(grams)
+        df = Counter(g for tf in tfs for g in tf)
+        n = len(tfs)
+        self._idf = {g: math.log((n + 1) / (d + 1)) + 1 for g, d in df.items()}
+        self._idf_nuevo = math.log(n + 1) + 1  # n-grama que ningún ejemplo contiene
+        self._postings: dict[str, list[tuple[int, float]]] = {}
+        for doc, tf in enumerate(tfs):
+            pesos = {g: (1 + math.log(c)) * self._idf[g] for g, c in tf.items()}
+            norma = math.sqrt(sum(w * w for w in pesos.values()))
+            for g, w in pesos.items():
+                self._postings.setdefault(g, []).append((doc, w / norma))
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def buscar(self, texto: str) -> Optional[FaqHit]:
+        """Ejemplo más parecido si su similitud alcanza ``min_score``."""
+        tf = _ngramas(texto)
+        if not tf or not self._docs:
+            return None
+        pesos = {g: (1 + math.log(c)) * self._idf.get(g, self._idf_nuevo) for g, c in tf.items()}
+        norma = math.sqrt(sum(w * w for w in pesos.values()))
+        scores: dict[int, float] = {}
+        for g, w in pesos.items():
+            for doc, wd in self._postings.get(g, ()):
+                scores[doc] = scores.get(doc, 0.0) + w * wd
+        if not scores:
+            return None
+        doc, score = max(scores.items(), key=lambda kv: kv[1])
+        score /= norma
+        if score < self.min_score:
+            return None
+        intencion, pregunta, respuesta = self._docs[doc]
+        return FaqHit(respuesta, intencion, pregunta, round(score, 3))
+
+
+class SemanticCache:
+    """Respuestas del modelo reutilizables ante preguntas con otra redacción.
+
+    Cada pregunta se reduce a su conjunto de 3-gramas (``_clave``) y a una firma
+    MinHash de ``_PERMUTACIONES`` valores; la firma se parte en bandas (LSH) que
+    forman el índice invertido, así que solo se comparan las entradas que
+    comparten alguna banda. Entre esos candidatos se responde con la de mayor
+    similitud Jaccard exacta si alcanza ``min_sim``.
+
+    ``namespace`` separa chats y versiones de prompt (``namespace()``): al ver
+    una versión nueva de un chat se descartan las entradas de la anterior.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 512, min_sim: float = 0.75) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_sim = min_sim
+        self._mem: "OrderedDict[tuple[str, str], _Entrada]" = OrderedDict()
+        self._bandas: dict[tuple[str, int, bytes], set[tuple[str, str]]] = {}
+        self._versiones: dict[str, str] = {}  # chat → namespace vigente
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, pregunta: str) -> Optional[str]:
+        clave = _clave(pregunta)
+        if not clave:
+            return None
+        now = time.time()
+        with self._lock:
+            self._vigente(namespace)
+            key = (namespace, clave)
+            entry = self._mem.get(key)
+            if entry is None:
+                grams = _shingles(clave)
+                firma = _minhash(grams)
+                mejor = 0.0
+                for candidato in self._candidatos(namespace, firma):
+                    otra = self._mem[candidato]
+                    sim = len(grams & otra.grams) / len(grams | otra.grams)
+                    if sim > mejor and otra.expira > now:
+                        key, entry, mejor = candidato, otra, sim
+                if mejor < self.min_sim:
+                    entry = None
+            if entry is None or entry.expira <= now:
+                if entry is not None:
+                    self._quitar(key)
+                self.misses += 1
+                return None
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return entry.respuesta
+
+    def set(self, namespace: str, pregunta: str, respuesta: str) -> None:
+        clave = _clave(pregunta)
+        if not clave:
+            return
+        grams = _shingles(clave)
+        firma = _minhash(grams)
+        key = (namespace, clave)
+        with self._lock:
+            self._vigente(namespace)
+            if key in self._mem:
+                self._quitar(key)
+            self._mem[key] = _Entrada(respuesta, grams, _bandas(firma), time.time() + self.ttl)
+            for banda in self._mem[key].bandas:
+                self._bandas.setdefault((namespace, *banda), set()).add(key)
+            while len(self._mem) > self.max_entries:
+                self._quitar(next(iter(self._mem)))
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._mem), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+    def _vigente(self, namespace: str) -> None:
+        chat = namespace.split(":", 1)[0]
+        anterior = self._versiones.get(chat)
+        if anterior == namespace:
+            return
+        self._versiones[chat] = namespace
+        if anterior is not None:
+            for key in [k for k in self._mem if k[0] == anterior]:
+                self._quitar(key)
+
+    def _candidatos(self, namespace: str, firma: Any) -> set[tuple[str, str]]:
+        out: set[tuple[str, str]] = set()
+        for banda in _bandas(firma):
+            out |= self._bandas.get((namespace, *banda), set())
+        return out
+
+    def _quitar(self, key: tuple[str, str]) -> None:
+        entry = self._mem.pop(key)
+        for banda in entry.bandas:
+            bucket = self._bandas.get((key[0], *banda))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bandas[(key[0], *banda)]
+
+
+@dataclass
+class _Entrada:
+    respuesta: str
+    grams: frozenset
+    bandas: tuple[tuple[int, bytes], ...]
+    expira: float
+
+
+def _shingles(clave: str) -> frozenset:
+    t = f" {clave} "
+    return frozenset(t[i : i + _N] for i in range(len(t) - _N + 1))
+
+
+# MinHash con permutaciones universales (a·x + b) mod p sobre el CRC32 de cada
+# 3-grama; p < 2^31 y x < 2^32, así que el producto cabe en uint64.
+_PERMUTACIONES = 64
+_FILAS_POR_BANDA = 4  # 16 bandas: candidatos a partir de Jaccard ~0.5
+_PRIMO = (1 << 31) - 1
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, _PRIMO, _PERMUTACIONES, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIMO, _PERMUTACIONES, dtype=np.uint64)[:, None]
+
+
+def _minhash(grams: frozenset) -> np.ndarray:
+    x = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    return ((_A * x + _B) % _PRIMO).min(axis=1)
+
+
+def _bandas(firma: np.ndarray) -> tuple[tuple[int, bytes], ...]:
+    return tuple(
+        (i, firma[j : j + _FILAS_POR_BANDA].tobytes())
+        for i, j in enumerate(range(0, _PERMUTACIONES, _FILAS_POR_BANDA))
+    )
+
+
+def namespace(chat: str, system_prompt: str) -> str:
+    """Espacio de la caché semántica: chat + versión del prompt."""
+    return f"{chat}:{prompt_version(system_prompt)}"
+
+
+_stats_lock = threading.Lock()
+_stats: dict[str, Counter] = {}
+
+
+def record_tier(tag: str, tier: str) -> None:
+    """Cuenta por chat qué nivel respondió (faq/rapida/local, aprendida, llm, fallback)."""
+    with _stats_lock:
+        _stats.setdefault(tag, Counter())[tier] += 1
+
+
+def tiers_snapshot() -> dict[str, Any]:
+    with _stats_lock:
+        return {tag: dict(c) for tag, c in _stats.items()}
+
+
+def min_score() -> float:
+    return _env_num("LLM_FAQ_MIN_SCORE", 0.6)
+
+
+_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _cache
+    if _cache is None:
+        _cache = SemanticCache(
+            ttl=_env_num("LLM_FAQ_CACHE_TTL", 86400),
+            max_entries=int(_env_num("LLM_FAQ_CACHE_MAX_ENTRIES", 512)),
+            min_sim=_env_num("LLM_FAQ_CACHE_MIN_SIM", 0.75),
+        )
+    return _cache
@@ -0,0 +1,267 @@
+"""Historial de conversaciones del agente F.I.N.A.N.C.I.A. guardado en el servidor.
+
+Antes el frontend reenviaba todo ``messages`` en cada turno y el backend lo
+volvía a normalizar completo. Con un ``conversationId`` el cliente solo manda el
+turno nuevo: el historial ya normalizado ({role, content}) vive aquí, listo para
+pasarse tal cual a Anthropic, y cada turno se agrega en O(1).
+
+Capas: LRU en memoria con TTL deslizante (cada turno renueva la vida de la
+conversación) y, opcionalmente, SQLite en disco (una fila por turno, así que
+agregar no reescribe el historial) para sobrevivir reinicios y compartirse entre
+workers. Una conversación desalojada del LRU se recarga de SQLite al pedirla, y
+también una en memoria cuyo ``updated_at`` en SQLite es más reciente (otro worker
+agregó turnos). El ``seq`` de cada turno se asigna dentro de la escritura, así que
+dos workers con copias desfasadas nunca pisan turnos ajenos. ``purge_loop`` (desde
+el lifespan de app.main) borra cada hora las conversaciones expiradas.
+
+Variables de entorno:
+- LLM_CONV_TTL (172800) — segundos sin actividad antes de expirar.
+- LLM_CONV_MAX_ENTRIES (1000) — conversaciones en memoria.
+- LLM_CONV_DB — ruta del archivo SQLite (sin definir: solo memoria).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+@dataclass
+class Conversation:
+    id: str
+    messages: list[dict[str, str]] = field(default_factory=list)
+    profile: dict[str, str] = field(default_factory=dict)
+    updated_at: float = 0.0
+    # Resumen de messages[:summarized] (app.llm_agente_financia); solo en memoria,
+    # se reconstruye si la conversación se recarga de SQLite.
+    summary: Optional[dict[str, Any]] = None
+    summarized: int = 0
+
+
+class ConversationStore:
+    def __init__(self, ttl: float = 172800, max_entries: int = 1000, db_path: str = "") -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_conversations ("
+                    "id TEXT PRIMARY KEY, profile TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_conversation_turns ("
+                    "id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                    "content TEXT NOT NULL, PRIMARY KEY (id, seq))"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Conversaciones en SQLite deshabilitadas (%s): %s", db_path, e)
+                self._db = None
+
+    def create(
+        self,
+        messages: Optional[list[dict[str, str]]] = None,
+        profile: Optional[dict[str, str]] = None,
+    ) -> Conversation:
+        conv = Conversation(id=uuid.uuid4().hex, profile=dict(profile or {}), updated_at=time.time())
+        with self._lock:
+            self._mem_put(conv)
+            self._db_write(
+                "INSERT INTO llm_conversations (id, profile, updated_at) VALUES (?, ?, ?)",
+                (conv.id, json.dumps(conv.profile, ensure_ascii=False), conv.updated_at),
+            )
+        if messages:
+            self.append(conv, *messages)
+        return conv
+
+    def get(self, conv_id: str) -> Optional[Conversation]:
+        now = time.time()
+        with self._lock:
+            cached = self._mem.get(conv_id)
+            if cached is not None:
+                stored = self._db_updated_at(conv_id)
+                if cached.updated_at + self.ttl > now and (stored is None or stored <= cached.updated_at):
+                    self._mem.move_to_end(conv_id)
+                    return cached
+                del self._mem[conv_id]
+            conv = self._db_load(conv_id, now)
+            if conv is not None:
+                if cached is not None and len(conv.messages) >= cached.summarized:
+                    # SQLite solo agrega turnos: el resumen del prefijo sigue valiendo.
+                    conv.summary, conv.summarized = cached.summary, cached.summarized
+                self._mem_put(conv)
+            return conv
+
+    def append(self, conv: Conversation, *turns: dict[str, str]) -> None:
+        """Agrega turnos ya normalizados al final del historial."""
+        with self._lock:
+            conv.updated_at = time.time()
+            seq = self._db_append(conv, turns)
+            if seq is not None and seq != len(conv.messages):
+                # La copia en memoria estaba desfasada: se trae el historial completo.
+                fresh = self._db_load(conv.id, conv.updated_at)
+                if fresh is not None:
+                    conv.messages[:] = fresh.messages
+                    return
+            conv.messages.extend(turns)
+
+    def set_profile(self, conv: Conversation, profile: dict[str, str]) -> None:
+        with self._lock:
+            conv.profile = dict(profile)
+            self._db_write(
+                "UPDATE llm_conversations SET profile = ? WHERE id = ?",
+                (json.dumps(conv.profile, ensure_ascii=False), conv.id),
+            )
+
+    def delete(self, conv_id: str) -> bool:
+        with self._lock:
+            found = self._mem.pop(conv_id, None) is not None
+            if self._db is not None:
+                try:
+                    cur = self._db.execute("DELETE FROM llm_conversations WHERE id = ?", (conv_id,))
+                    self._db.execute("DELETE FROM llm_conversation_turns WHERE id = ?", (conv_id,))
+                    self._db.commit()
+                    found = found or cur.rowcount > 0
+                except sqlite3.Error as e:
+                    logger.warning("Error borrando conversación: %s", e)
+        return found
+
+    def purge(self) -> int:
+        """Elimina de SQLite las conversaciones expiradas; devuelve cuántas."""
+        if self._db is None:
+            return 0
+        before = time.time() - self.ttl
+        with self._lock:
+            try:
+                cur = self._db.execute(
+                    "DELETE FROM llm_conversations WHERE updated_at < ?", (before,)
+                )
+                self._db.execute(
+                    "DELETE FROM llm_conversation_turns WHERE id NOT IN (SELECT id FROM llm_conversations)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Error purgando conversaciones: %s", e)
+                return 0
+        return cur.rowcount
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._mem), "sqlite": self._db is not None}
+
+    def _mem_put(self, conv: Conversation) -> None:
+        self._mem[conv.id] = conv
+        self._mem.move_to_end(conv.id)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _db_write(self, sql: str, params: tuple) -> None:
+        if self._db is None:
+            return
+        try:
+            self._db.execute(sql, params)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Error escribiendo conversación: %s", e)
+
+    def _db_append(self, conv: Conversation, turns: tuple[dict[str, str], ...]) -> Optional[int]:
+        """Inserta ``turns`` tras el último ``seq`` guardado; devuelve el primero usado."""
+        if self._db is None:
+            return None
+        try:
+            # BEGIN IMMEDIATE serializa a los workers que comparten el archivo.
+            self._db.execute("BEGIN IMMEDIATE")
+            seq = self._db.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM llm_conversation_turns WHERE id = ?",
+                (conv.id,),
+            ).fetchone()[0]
+            self._db.executemany(
+                "INSERT INTO llm_conversation_turns (id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(conv.id, seq + i, t["role"], t["content"]) for i, t in enumerate(turns)],
+            )
+            self._db.execute(
+                "UPDATE llm_conversations SET updated_at = ? WHERE id = ?", (conv.updated_at, conv.id)
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            self._db.rollback()
+            logger.warning("Error escribiendo conversación: %s", e)
+            return None
+        return seq
+
+    def _db_updated_at(self, conv_id: str) -> Optional[float]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT updated_at FROM llm_conversations WHERE id = ?", (conv_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Error leyendo conversación: %s", e)
+            return None
+        return row[0] if row else None
+
+    def _db_load(self, conv_id: str, now: float) -> Optional[Conversation]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT profile, updated_at FROM llm_conversations WHERE id = ?", (conv_id,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl <= now:
+                return None
+            turns = self._db.execute(
+                "SELECT role, content FROM llm_conversation_turns WHERE id = ? ORDER BY seq",
+                (conv_id,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Error leyendo conversación: %s", e)
+            return None
+        return Conversation(
+            id=conv_id,
+            messages=[{"role": r, "content": c} for r, c in turns],
+            profile=json.loads(row[0]),
+            updated_at=row[1],
+        )
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversations() -> ConversationStore:
+    global _store
+    if _store is None:
+        _store = ConversationStore(
+            ttl=float(_env_int("LLM_CONV_TTL", 172800)),
+            max_entries=_env_int("LLM_CONV_MAX_ENTRIES", 1000),
+            db_path=os.getenv("LLM_CONV_DB", "").strip(),
+        )
+    return _store
+
+
+async def purge_loop(interval: float = 3600) -> None:
+    """Purga las conversaciones expiradas al arrancar y cada ``interval`` segundos."""
+    while True:
+        get_conversations().purge()
+        await asyncio.sleep(interval)
@@ -0,0 +1,192 @@
+"""Motor columnar de ratios F.I.N.A.N.C.I.A. para todos los periodos.
+
+``estados_financieros`` (uno por periodo, del más antiguo al más reciente) se
+convierte una vez en una matriz periodos × campos y cada ratio (liquidez,
+prueba ácida, DSO/DIO/DPO, ciclo de conversión, DSCR, Altman Z privado, ...) se
+calcula como una columna para todos los periodos a la vez, con las mismas
+fórmulas y guardas que el cálculo por periodo que existía en
+``llm_financia.calcular_ratios_locales`` (que ahora es el último periodo de esta
+serie).
+
+Sobre la serie se agregan variaciones interanuales, CAGR de los montos y la
+pendiente de tendencia (mínimos cuadrados) de cada ratio, para que el modelo
+reciba una serie compacta en lugar de los estados crudos.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+CAMPOS = (
+    "ingresos",
+    "costo_ventas",
+    "utilidad_neta",
+    "ebitda",
+    "activo_circulante",
+    "activo_total",
+    "pasivo_circulante",
+    "pasivo_total",
+    "capital_contable",
+    "inventarios",
+    "cuentas_por_cobrar",
+    "cuentas_por_pagar",
+    "gastos_financieros",
+    "deuda_bancaria_corto_plazo",
+    "deuda_bancaria_largo_plazo",
+)
+
+# Montos de los que se reporta crecimiento (YoY y CAGR).
+MONTOS_CRECIMIENTO = ("ingresos", "ebitda", "utilidad_neta", "activo_total", "capital_contable")
+
+RATIOS = (
+    "liquidez_corriente",
+    "prueba_acida",
+    "apalancamiento",
+    "endeudamiento",
+    "margen_bruto",
+    "margen_ebitda",
+    "margen_neto",
+    "ROA",
+    "ROE",
+    "DSO",
+    "DIO",
+    "DPO",
+    "ciclo_conversion_efectivo",
+    "DSCR",
+    "cobertura_intereses",
+    "altman_z_score_privado",
+)
+
+ALTMAN = ("X1", "X2", "X3", "X4", "X5")
+
+
+def _float(val: Any) -> float:
+    try:
+        return float(val)
+    except Exception:
+        return 0.0
+
+
+def _etiqueta(estado: Dict[str, Any], i: int) -> str:
+    for k in ("periodo", "anio", "año", "ejercicio", "fecha"):
+        if estado.get(k) not in (None, ""):
+            return str(estado[k])
+    return f"P{i + 1}"
+
+
+def matriz_estados(estados: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Matriz (periodos × CAMPOS); valores no numéricos o ausentes valen 0."""
+    return np.array(
+        [[_float(e.get(c, 0)) for c in CAMPOS] for e in estados], dtype=float
+    ).reshape(len(estados), len(CAMPOS))
+
+
+def _div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """``num / den`` donde ``den > 0``; 0 en otro caso (misma guarda que el cálculo escalar)."""
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def ratios_por_periodo(m: np.ndarray) -> Dict[str, np.ndarray]:
+    c = {name: m[:, j] for j, name in enumerate(CAMPOS)}
+    ingresos, costo = c["ingresos"], c["costo_ventas"]
+    ebitda, utilidad = c["ebitda"], c["utilidad_neta"]
+    ac, at = c["activo_circulante"], c["activo_total"]
+    pc, pt = c["pasivo_circulante"], c["pasivo_total"]
+    capital = c["capital_contable"]
+    gastos_fin = c["gastos_financieros"]
+
+    r: Dict[str, np.ndarray] = {}
+    with np.errstate(invalid="ignore", over="ignore"):
+        r["liquidez_corriente"] = _div(ac, pc)
+        r["prueba_acida"] = _div(ac - c["inventarios"], pc)
+        r["apalancamiento"] = _div(pt, capital)
+        r["endeudamiento"] = _div(pt, at)
+        r["margen_bruto"] = _div(ingresos - costo, ingresos)
+        r["margen_ebitda"] = _div(ebitda, ingresos)
+        r["margen_neto"] = _div(utilidad, ingresos)
+        r["ROA"] = _div(utilidad, at)
+        r["ROE"] = _div(utilidad, capital)
+        r["DSO"] = _div(c["cuentas_por_cobrar"], ingresos) * 365
+        r["DIO"] = _div(c["inventarios"], costo) * 365
+        r["DPO"] = _div(c["cuentas_por_pagar"], costo) * 365
+        r["ciclo_conversion_efectivo"] = r["DSO"] + r["DIO"] - r["DPO"]
+        amortizacion = (c["deuda_bancaria_corto_plazo"] + c["deuda_bancaria_largo_plazo"]) / 3
+        r["DSCR"] = _div(ebitda, gastos_fin + amortizacion)
+        r["cobertura_intereses"] = _div(ebitda, gastos_fin)
+        # Altman Z para empresas privadas; utilidades retenidas ≈ capital contable.
+        r["X1"] = _div(ac - pc, at)
+        r["X2"] = _div(capital, at)
+        r["X3"] = _div(ebitda, at)
+        r["X4"] = _div(capital, pt)
+        r["X5"] = _div(ingresos, at)
+        r["altman_z_score_privado"] = (
+            0.717 * r["X1"] + 0.847 * r["X2"] + 3.107 * r["X3"] + 0.420 * r["X4"] + 0.998 * r["X5"]
+        )
+    return r
+
+
+def _pendientes(y: np.ndarray) -> np.ndarray:
+    """Pendiente por columna de la recta de mínimos cuadrados contra el índice de periodo."""
+    n = y.shape[0]
+    if n < 2:
+        return np.zeros(y.shape[1])
+    x = np.arange(n, dtype=float) - (n - 1) / 2
+    return (x @ (y - y.mean(axis=0))) / (x @ x)
+
+
+def _cagr(serie: np.ndarray) -> float | None:
+    """Crecimiento anual compuesto (periodos anuales); None si no es calculable."""
+    if len(serie) < 2 or serie[0] <= 0 or serie[-1] <= 0:
+        return None
+    return float((serie[-1] / serie[0]) ** (1 / (len(serie) - 1)) - 1)
+
+
+def _yoy(serie: np.ndarray) -> List[float | None]:
+    anterior, actual = serie[:-1], serie[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cambio = np.where(anterior != 0, (actual - anterior) / np.abs(anterior), np.nan)
+    return [None if not np.isfinite(v) else round(float(v), 4) for v in cambio]
+
+
+def _redondear(valores: np.ndarray, nd: int = 4) -> List[float]:
+    return [round(float(v), nd) for v in valores]
+
+
+def ultimo_periodo(r: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Ratios del periodo más reciente, con la forma histórica de ``calcular_ratios_locales``."""
+    ratios: Dict[str, Any] = {name: float(r[name][-1]) for name in RATIOS}
+    ratios["altman_componentes"] = {x: float(r[x][-1]) for x in ALTMAN}
+    return ratios
+
+
+def calcular_series(datos_financieros: Dict[str, Any]) -> Dict[str, Any]:
+    """Serie compacta para el prompt: montos clave, ratios por periodo y tendencias."""
+    estados = datos_financieros.get("estados_financieros") or []
+    if not estados:
+        return {}
+    m = matriz_estados(estados)
+    r = ratios_por_periodo(m)
+    ratios_m = np.column_stack([r[name] for name in RATIOS])
+    pendientes = _pendientes(ratios_m)
+
+    montos = {name: m[:, CAMPOS.index(name)] for name in MONTOS_CRECIMIENTO}
+    out: Dict[str, Any] = {
+        "periodos": [_etiqueta(e, i) for i, e in enumerate(estados)],
+        "montos": {name: _redondear(v, 2) for name, v in montos.items()},
+        "ratios": {name: _redondear(r[name]) for name in RATIOS},
+    }
+    if len(estados) > 1:
+        out["tendencias"] = {
+            name: {
+                "pendiente_por_periodo": round(float(pendientes[j]), 4),
+                "delta_ultimo": round(float(r[name][-1] - r[name][-2]), 4),
+            }
+            for j, name in enumerate(RATIOS)
+        }
+        out["crecimiento"] = {
+            name: {"yoy": _yoy(v), "cagr": None if (g := _cagr(v)) is None else round(g, 4)}
+            for name, v in montos.items()
+        }
+    return out
@@ -0,0 +1,192 @@
+"""Calificación por lotes del modelo General (7 secciones), sin LLM.
+
+Misma fórmula que ``llm_general._calcular_modelo`` para N cuestionarios: las
+respuestas se traducen una sola vez a una matriz de puntos (N × 7 × 6) con las
+tablas ``NUMERO_A_PUNTOS_Q15`` / ``LETRA_A_PUNTOS_Q15`` / ``NUMERO_A_PUNTOS_Q6``
+y calificaciones, clasificaciones, índice, Capa 1 (índice de app/percentiles.py)
+y Capa 2 se calculan sobre arreglos. Sirve para re-calificar la base histórica tras un cambio de rúbrica.
+
+La calificación por sección aplica los mismos dos redondeos a 2 decimales que el
+escalar (``interno`` y luego ``interno / MAX_INTERNO * 100``); ``np.round`` y
+``round()`` coinciden porque ningún valor cae justo en un empate. Capa 2 sale de
+una tabla precalculada con la función escalar (``_capa2_tabla``), ya que solo
+depende de la suma de clasificaciones. La paridad con ``_calcular_modelo`` se
+comprueba en test_general_batch.py.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from app.llm_general import (
+    LETRA_A_PUNTOS_Q15,
+    MAX_INTERNO,
+    NOMBRES_SECCION,
+    NUMERO_A_PUNTOS_Q15,
+    NUMERO_A_PUNTOS_Q6,
+    PREFIJOS,
+    SECCION_VALOR,
+    _diagnostico_global,
+    _nivel_madurez,
+    _normalizar_entrada,
+    _sector_percentil,
+    _tamano_empresa,
+)
+from app.percentiles import BANDAS, bandas, grupos
+
+CLASIFICACIONES = ("Deficiente", "Promedio", "Bueno", "Líder")
+N_SECCIONES = len(PREFIJOS)
+
+# Q1-Q5 → puntos; los números tienen prioridad sobre las letras, como en el escalar.
+_PUNTOS_Q15 = {**LETRA_A_PUNTOS_Q15, **NUMERO_A_PUNTOS_Q15}
+_PUNTOS_Q6 = {**NUMERO_A_PUNTOS_Q6, "A": 0, "B": 5, "C": 10}
+
+
+def _capa2_tabla() -> list[tuple[float, str, str]]:
+    """(índice, diagnóstico, estado) para cada suma posible de valores de sección."""
+    tabla = []
+    for k in range(3 * N_SECCIONES + 1):
+        lider, resto = divmod(k, 3)
+        clasifs = ["Líder"] * lider + ([CLASIFICACIONES[resto]] if resto else [])
+        clasifs += ["Deficiente"] * (N_SECCIONES - len(clasifs))
+        idx, diag = _diagnostico_global(clasifs)
+        if idx < 0.5: estado = "Deficiente (0)"
+        elif idx < 1.5: estado = "Promedio (1)"
+        elif idx < 2.5: estado = "Bueno (2)"
+        else: estado = "Líder (3)"
+        tabla.append((idx, diag, estado))
+    return tabla
+
+
+_CAPA2 = _capa2_tabla()
+
+
+def _puntos(raw: Any, tabla: Dict[str, int], memo: Dict[Any, float]) -> float:
+    # La clave incluye el tipo: 1, 1.0 y True son iguales como clave pero no como texto.
+    key = (type(raw), raw)
+    try:
+        return memo[key]
+    except KeyError:
+        pass
+    except TypeError:  # valor no hashable: sin memo
+        return float(tabla.get(str(raw).strip().upper(), np.nan))
+    memo[key] = value = float(tabla.get(str(raw).strip().upper(), np.nan))
+    return value
+
+
+def matriz_respuestas(datos: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Matriz (N × 7 × 6) de puntos: Q1-Q5 (NaN si falta o no es válida) y Q6."""
+    claves = [[f"{pref}q{q}" for q in range(1, 6)] for pref in PREFIJOS]
+    memo15: Dict[Any, float] = {}
+    memo6: Dict[Any, float] = {}
+    nan = float("nan")
+    plano: List[float] = []
+    for d in datos:
+        get = d.get
+        for pref, qs in zip(PREFIJOS, claves):
+            for k in qs:
+                val = get(k)
+                plano.append(nan if val is None else _puntos(val, _PUNTOS_Q15, memo15))
+            # Q6 no reconocida vale 0 (mismo default que el escalar).
+            q6 = _puntos(get(f"{pref}q6", "A"), _PUNTOS_Q6, memo6)
+            plano.append(0.0 if q6 != q6 else q6)
+    return np.array(plano, dtype=float).reshape(len(datos), N_SECCIONES, 6)
+
+
+@dataclass
+class ModeloGeneralBatch:
+    """Resultados de N cuestionarios; ``calificaciones`` y ``clasificaciones`` son N × 7."""
+
+    calificaciones: np.ndarray
+    clasificaciones: np.ndarray  # códigos 0-3 (= SECCION_VALOR)
+    indice_menthia_0_100: np.ndarray
+    capa2_codigo: np.ndarray  # suma de códigos de sección (0-21), índice en _CAPA2
+    sector: List[str]
+    tamano: List[str]
+    capa1_percentil: List[str]
+    nivel_madurez: List[str]
+
+    def __len__(self) -> int:
+        return len(self.indice_menthia_0_100)
+
+    def row(self, k: int) -> Dict[str, Any]:
+        """Cuestionario ``k`` con la misma forma que ``_calcular_modelo``."""
+        califs = self.calificaciones[k].tolist()
+        clasifs = [CLASIFICACIONES[c] for c in self.clasificaciones[k].tolist()]
+        capa2_idx, capa2_diag, estado = _CAPA2[int(self.capa2_codigo[k])]
+        detalle = [
+            {
+                "nombre": NOMBRES_SECCION[i],
+                "prefijo": pref.rstrip("_").upper(),
+                "calificacion": califs[i],
+                "calificacion_max": 100,
+                "clasificacion": clasifs[i],
+                "valor_numerico": SECCION_VALOR.get(clasifs[i], 0),
+            }
+            for i, pref in enumerate(PREFIJOS)
+        ]
+        return {
+            "calificaciones": califs,
+            "clasificaciones": clasifs,
+            "detalle_secciones": detalle,
+            "indice_menthia_0_100": self.indice_menthia_0_100[k].item(),
+            "sector": self.sector[k], "tamano": self.tamano[k],
+            "capa1_percentil": self.capa1_percentil[k],
+            "capa2_indice": capa2_idx, "capa2_diagnostico": capa2_diag,
+            "nivel_madurez": self.nivel_madurez[k], "estado_madurez": estado,
+        }
+
+    def columns(self) -> Dict[str, Any]:
+        capa2 = [_CAPA2[c] for c in self.capa2_codigo.tolist()]
+        return {
+            "calificaciones": self.calificaciones.tolist(),
+            "clasificaciones": [[CLASIFICACIONES[c] for c in fila] for fila in self.clasificaciones.tolist()],
+            "indice_menthia_0_100": self.indice_menthia_0_100.tolist(),
+            "sector": self.sector,
+            "tamano": self.tamano,
+            "capa1_percentil": self.capa1_percentil,
+            "capa2_indice": [c[0] for c in capa2],
+            "capa2_diagnostico": [c[1] for c in capa2],
+            "estado_madurez": [c[2] for c in capa2],
+            "nivel_madurez": self.nivel_madurez,
+        }
+
+
+def calcular_modelo_batch(diagnosticos: Sequence[Any]) -> ModeloGeneralBatch:
+    datos = [_normalizar_entrada(d) for d in diagnosticos]
+    m = matriz_respuestas(datos)
+
+    q15 = m[:, :, :5]
+    contestadas = (~np.isnan(q15)).sum(axis=2)
+    suma = np.nansum(q15, axis=2)
+    prom = np.where(contestadas > 0, suma / 5, 0.0)
+    interno = prom + m[:, :, 5]
+    # Mismos redondeos que el escalar, sin suponer que los puntos caen en múltiplos de 5.
+    califs = np.round(np.round(interno, 2) / MAX_INTERNO * 100, 2)
+    clasifs = np.searchsorted([25, 50, 75], califs, side="right")
+
+    # Suma secuencial como sum() de Python y round() exacto por fila.
+    total = califs[:, 0].copy()
+    for s in range(1, N_SECCIONES):
+        total += califs[:, s]
+    indice = np.array([round(x, 2) for x in (total / N_SECCIONES).tolist()])
+
+    sectores = [str(d.get("sector") or d.get("sectorNormalizado") or "Servicios") for d in datos]
+    tamanos = [_tamano_empresa(d.get("numeroEmpleados")) for d in datos]
+    indice_l = indice.tolist()
+    capa1_codigos = bandas(indice, grupos([_sector_percentil(s) for s in sectores], tamanos))
+    capa1 = [BANDAS[c] for c in capa1_codigos.tolist()]
+
+    return ModeloGeneralBatch(
+        calificaciones=califs,
+        clasificaciones=clasifs,
+        indice_menthia_0_100=indice,
+        capa2_codigo=clasifs.sum(axis=1),
+        sector=sectores,
+        tamano=tamanos,
+        capa1_percentil=capa1,
+        nivel_madurez=[_nivel_madurez(i) for i in indice_l],
+    )
@@ -0,0 +1,352 @@
+"""Trabajos asíncronos para los diagnósticos pesados.
+
+``POST .../analyze?async=1`` encola el diagnóstico y responde de inmediato con
+un ``job_id``; el cliente consulta ``GET /api/jobs/{job_id}`` hasta que el estado
+pase a ``done`` (con ``result``) o ``error``. Así la conexión HTTP no queda
+abierta toda la generación (502 del proxy, ver RAILWAY_502_FIX.md) y el reporte
+se termina aunque el cliente se desconecte.
+
+Los trabajos corren en un pool de workers asyncio dentro del proceso. El estado
+vive en un backend intercambiable: memoria (por defecto) o SQLite, que además
+permite retomar los trabajos que quedaron pendientes.
+
+Cada trabajo en curso lleva un ``owner`` y un ``lease_until`` que su worker
+renueva mientras corre. Un worker solo toma un trabajo con ``claim`` (atómico en
+el backend) si está en cola o si su lease venció, así que con varios procesos
+sobre el mismo SQLite ninguno repite una llamada de pago que otro proceso vivo
+está haciendo. Un barrido periódico borra los trabajos vencidos (``LLM_JOBS_TTL``)
+y retoma los que dejó a medias un proceso caído.
+
+Variables de entorno:
+- LLM_JOBS_WORKERS (4) — trabajos simultáneos.
+- LLM_JOBS_DB — ruta del archivo SQLite (sin definir: solo memoria).
+- LLM_JOBS_TTL (86400) — segundos que se conserva un trabajo terminado.
+- LLM_JOBS_LEASE (60) — segundos de lease de un trabajo en curso; también es el
+  intervalo del barrido.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional, Protocol
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+Handler = Callable[[dict[str, Any]], Awaitable[Any]]
+
+
+def _claimable(job: dict[str, Any], now: float) -> bool:
+    if job["status"] == QUEUED:
+        return True
+    return job["status"] == RUNNING and job.get("lease_until", 0) < now
+
+
+def _take(job: dict[str, Any], owner: str, now: float, lease: float) -> None:
+    job.update(status=RUNNING, owner=owner, lease_until=now + lease, updated_at=now)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+class JobStore(Protocol):
+    def save(self, job: dict[str, Any]) -> None: ...
+
+    def load(self, job_id: str) -> Optional[dict[str, Any]]: ...
+
+    def pending(self) -> list[dict[str, Any]]: ...
+
+    def claim(
+        self, job_id: str, owner: str, now: float, lease: float
+    ) -> Optional[dict[str, Any]]: ...
+
+    def purge(self, before: float) -> int: ...
+
+
+class MemoryJobStore:
+    def __init__(self) -> None:
+        self._jobs: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: dict[str, Any]) -> None:
+        text = json.dumps(job, ensure_ascii=False, default=str)
+        with self._lock:
+            self._jobs[job["id"]] = text
+
+    def load(self, job_id: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            text = self._jobs.get(job_id)
+        return json.loads(text) if text is not None else None
+
+    def pending(self) -> list[dict[str, Any]]:
+        # En memoria no hay trabajos que sobrevivan a un reinicio.
+        return []
+
+    def claim(
+        self, job_id: str, owner: str, now: float, lease: float
+    ) -> Optional[dict[str, Any]]:
+        with self._lock:
+            text = self._jobs.get(job_id)
+            if text is None or not _claimable(job := json.loads(text), now):
+                return None
+            _take(job, owner, now, lease)
+            self._jobs[job_id] = json.dumps(job, ensure_ascii=False, default=str)
+        return job
+
+    def purge(self, before: float) -> int:
+        with self._lock:
+            old = [
+                k for k, text in self._jobs.items()
+                if (job := json.loads(text))["status"] in (DONE, ERROR)
+                and job["updated_at"] < before
+            ]
+            for k in old:
+                del self._jobs[k]
+        return len(old)
+
+
+class SqliteJobStore:
+    def __init__(self, db_path: str) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "job TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def save(self, job: dict[str, Any]) -> None:
+        text = json.dumps(job, ensure_ascii=False, default=str)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_jobs (id, status, updated_at, job) VALUES (?, ?, ?, ?)",
+                (job["id"], job["status"], job["updated_at"], text),
+            )
+            self._db.commit()
+
+    def load(self, job_id: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT job FROM llm_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pending(self) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job FROM llm_jobs WHERE status IN (?, ?) ORDER BY updated_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def claim(
+        self, job_id: str, owner: str, now: float, lease: float
+    ) -> Optional[dict[str, Any]]:
+        # BEGIN IMMEDIATE toma el candado de escritura del archivo: entre
+        # procesos, solo uno puede leer-y-marcar el trabajo a la vez.
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                row = self._db.execute(
+                    "SELECT job FROM llm_jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                if row is None or not _claimable(job := json.loads(row[0]), now):
+                    self._db.rollback()
+                    return None
+                _take(job, owner, now, lease)
+                self._db.execute(
+                    "UPDATE llm_jobs SET status = ?, updated_at = ?, job = ? WHERE id = ?",
+                    (job["status"], job["updated_at"],
+                     json.dumps(job, ensure_ascii=False, default=str), job_id),
+                )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return job
+
+    def purge(self, before: float) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM llm_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, ERROR, before),
+            )
+            self._db.commit()
+        return cur.rowcount
+
+
+def _error_payload(e: BaseException) -> dict[str, Any]:
+    if isinstance(e, HTTPException):
+        return {"detail": e.detail, "status": e.status_code}
+    return {"detail": str(e) or type(e).__name__, "status": 500}
+
+
+class JobQueue:
+    """Cola de trabajos con ``workers`` tareas asyncio; los handlers se registran
+    por tipo (``general``, ``financia``) para poder retomar trabajos persistidos."""
+
+    def __init__(
+        self, store: JobStore, workers: int = 4, ttl: float = 86400, lease: float = 60
+    ) -> None:
+        self.store = store
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.lease = max(1.0, lease)
+        self.owner = uuid.uuid4().hex
+        self._handlers: dict[str, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        """Arranca los workers y el barrido (idempotente) y reencola lo pendiente
+        del backend."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._sweeper()))
+        self.sweep(resume_queued=True)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def sweep(self, resume_queued: bool = False) -> None:
+        """Borra los trabajos vencidos y reencola los huérfanos: ``RUNNING`` con
+        el lease vencido y, al arrancar (``resume_queued``), también los ``QUEUED``
+        que dejó otro proceso."""
+        now = time.time()
+        self.store.purge(now - self.ttl)
+        for job in self.store.pending():
+            if job["id"] in self._queued or job["kind"] not in self._handlers:
+                continue
+            if job["status"] == QUEUED and not resume_queued:
+                continue
+            if _claimable(job, now):
+                logger.info("Retomando trabajo %s (%s)", job["id"], job["kind"])
+                self._enqueue(job["id"])
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Barrido de trabajos falló: %s", e)
+
+    def _enqueue(self, job_id: str) -> None:
+        self._queued.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    def submit(self, kind: str, data: dict[str, Any]) -> dict[str, Any]:
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        self.start()
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": QUEUED,
+            "created_at": now,
+            "updated_at": now,
+            "input": data,
+            "result": None,
+            "error": None,
+        }
+        self.store.save(job)
+        self._enqueue(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[dict[str, Any]]:
+        return self.store.load(job_id)
+
+    def _update(self, job: dict[str, Any], **fields: Any) -> None:
+        job.update(fields, updated_at=time.time())
+        self.store.save(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.store.claim(job_id, self.owner, time.time(), self.lease)
+        if job is None:
+            # Terminado, o en curso en otro proceso con el lease vigente.
+            return
+        heartbeat = asyncio.get_running_loop().create_task(self._renew(job))
+        try:
+            result = await self._handlers[job["kind"]](job["input"])
+        except asyncio.CancelledError:
+            # Apagado: el trabajo queda en RUNNING con el lease liberado para que
+            # se retome al arrancar (SQLite).
+            self._update(job, lease_until=0)
+            raise
+        except Exception as e:
+            logger.warning("Trabajo %s (%s) falló: %s", job_id, job["kind"], e)
+            self._update(job, status=ERROR, error=_error_payload(e))
+            return
+        finally:
+            heartbeat.cancel()
+        self._update(job, status=DONE, result=result)
+
+    async def _renew(self, job: dict[str, Any]) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self._update(job, lease_until=time.time() + self.lease)
+
+
+def public_view(job: dict[str, Any]) -> dict[str, Any]:
+    """Lo que ve el cliente: sin la entrada original ni el lease."""
+    return {k: v for k, v in job.items() if k not in ("input", "owner", "lease_until")}
+
+
+_jobs: Optional[JobQueue] = None
+
+
+def get_jobs() -> JobQueue:
+    global _jobs
+    if _jobs is None:
+        db_path = os.getenv("LLM_JOBS_DB", "").strip()
+        store: JobStore = MemoryJobStore()
+        if db_path:
+            try:
+                store = SqliteJobStore(db_path)
+            except sqlite3.Error as e:
+                logger.warning("Trabajos SQLite deshabilitados (%s): %s", db_path, e)
+        _jobs = JobQueue(
+            store,
+            workers=_env_int("LLM_JOBS_WORKERS", 4),
+            ttl=float(_env_int("LLM_JOBS_TTL", 86400)),
+            lease=float(_env_int("LLM_JOBS_LEASE", 60)),
+        )
+    return _jobs
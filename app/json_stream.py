@@ -0,0 +1,198 @@
+"""Parser JSON incremental para las respuestas de Claude.
+
+Consume el texto por fragmentos (tal como llega de ``messages.stream``) y emite
+cada clave de primer nivel en cuanto se cierra su valor, más cada elemento de los
+arreglos de primer nivel (``recomendaciones_por_seccion[0]``, ...). Ignora lo que
+haya antes del primer ``{`` y después del ``}`` final, así que tolera bloques
+```json y texto adicional del modelo.
+
+Cada valor se decodifica una sola vez; el objeto final se arma con esos valores,
+sin volver a parsear el texto completo.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, List, Optional, Tuple
+
+Field = Tuple[str, Any]
+
+_WS = " \t\r\n"
+
+
+class JsonStreamParser:
+    """Uso: ``for path, value in parser.feed(chunk)`` y al final ``parser.close()``."""
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._obj_start = 0
+        self._done = False
+        self._failed = False
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_is_key = False
+        self._key_start = 0
+        # Fases dentro del objeto raíz: key → colon → value → in_value
+        self._expect = "key"
+        self._key: Optional[str] = None
+        self._value_start = 0
+        self._in_array = False
+        self._value_is_array = False
+        self._items: List[Any] = []
+        self._item_start: Optional[int] = None
+        self.result: dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> List[Field]:
+        if self._done or self._failed or not chunk:
+            return []
+        self._buf += chunk
+        out: List[Field] = []
+        try:
+            self._scan(out)
+        except (json.JSONDecodeError, ValueError):
+            self._failed = True
+        return out
+
+    def close(self) -> Optional[dict[str, Any]]:
+        """Objeto completo, o None si el texto no contenía un objeto JSON cerrado y válido."""
+        return self.result if self._done and not self._failed else None
+
+    # ------------------------------------------------------------------
+
+    def _reset(self) -> None:
+        """El ``{`` encontrado no abría un objeto JSON: seguir buscando después de él."""
+        self._started = False
+        self._depth = 0
+        self._expect = "key"
+        self._key = None
+        self._in_array = False
+        self._items = []
+        self._item_start = None
+        self.result = {}
+        self._pos = self._obj_start + 1
+
+    def _finish_item(self, end: int, out: List[Field]) -> None:
+        if self._item_start is None:
+            return
+        item = json.loads(self._buf[self._item_start:end])
+        out.append((f"{self._key}[{len(self._items)}]", item))
+        self._items.append(item)
+        self._item_start = None
+
+    def _finish_value(self, end: int, out: List[Field]) -> None:
+        if self._value_is_array:
+            value: Any = self._items
+        else:
+            value = json.loads(self._buf[self._value_start:end])
+        self.result[self._key] = value
+        out.append((self._key, value))
+
+    def _invalid(self) -> None:
+        # Texto previo con llaves: se descarta. Un objeto ya a medio emitir, no.
+        if self.result:
+            raise ValueError("JSON inválido")
+        self._reset()
+
+    def _scan(self, out: List[Field]) -> None:
+        buf = self._buf
+        while self._pos < len(buf) and not self._done:
+            i = self._pos
+            c = buf[i]
+            self._pos += 1
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._obj_start = i
+                    self._depth = 1
+                    self._expect = "key"
+                continue
+
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._str_is_key:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                        self._expect = "colon"
+                continue
+
+            if c in _WS:
+                continue
+
+            depth = self._depth
+            if c == '"':
+                self._in_str = True
+                self._str_is_key = depth == 1 and self._expect == "key"
+                if self._str_is_key:
+                    self._key_start = i
+                elif depth == 1 and self._expect == "value":
+                    self._value_start = i
+                    self._expect = "in_value"
+                    self._value_is_array = False
+                elif depth == 2 and self._in_array and self._item_start is None:
+                    self._item_start = i
+                continue
+
+            if depth == 1:
+                if self._expect == "key":
+                    if c == "}" and not self.result:
+                        self._done = True
+                    else:
+                        self._invalid()
+                elif self._expect == "colon":
+                    if c == ":":
+                        self._expect = "value"
+                    else:
+                        self._invalid()
+                elif self._expect == "value":
+                    self._value_start = i
+                    self._expect = "in_value"
+                    self._value_is_array = c == "["
+                    if c == "[":
+                        self._in_array = True
+                        self._items = []
+                        self._item_start = None
+                        self._depth = 2
+                    elif c == "{":
+                        self._depth = 2
+                elif c in ",}":
+                    self._finish_value(i, out)
+                    if c == ",":
+                        self._expect = "key"
+                    else:
+                        self._done = True
+                continue
+
+            # depth >= 2: dentro de un valor anidado
+            if c in "[{":
+                if depth == 2 and self._in_array and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+            elif c in "]}":
+                if depth == 2 and self._in_array:
+                    self._finish_item(i, out)
+                    self._in_array = False
+                self._depth -= 1
+            elif depth == 2 and self._in_array:
+                if c == ",":
+                    self._finish_item(i, out)
+                elif self._item_start is None:
+                    self._item_start = i
+
+
+def parse_json_object(text: str) -> Optional[dict[str, Any]]:
+    """Primer objeto JSON del texto (con o sin ```json / texto alrededor), o None."""
+    parser = JsonStreamParser()
+    parser.feed(text or "")
+    return parser.close()
@@ -1,16 +1,32 @@
 """Agente F.I.N.A.N.C.I.A.™ — chat conversacional de diagnóstico de bancabilidad.
 
-Usa Anthropic (ANTHROPIC_API_KEY) vía call_claude_text. El frontend mantiene el
-historial de conversación y este módulo solo genera la siguiente respuesta del
-agente. El diagnóstico final se entrega como un bloque JSON entre los marcadores
+Usa Anthropic (ANTHROPIC_API_KEY) vía call_claude_text. Con ``conversationId`` el
+historial se guarda en el servidor (app.conversations) y el frontend solo envía
+el turno nuevo en ``message``; sin él, el frontend reenvía todo ``messages`` en
+cada turno, como antes.
+
+Cuando el historial supera LLM_AGENTE_RESUMEN_TOKENS (estimados), los turnos
+antiguos se compactan en un resumen estructurado (PASO actual, respuestas a
+preguntas numeradas, cifras capturadas, resto del intercambio) que viaja en el
+contexto dinámico del system prompt; los últimos LLM_AGENTE_TURNOS_RECIENTES
+mensajes van literales. El resumen es determinista (sin otra llamada al modelo)
+e incremental: en conversaciones guardadas solo se procesan los turnos que
+envejecen. El diagnóstico final se entrega como un bloque JSON entre los marcadores
 >>>DIAGNOSIS_DATA_START<<< y >>>DIAGNOSIS_DATA_END<<< que el frontend parsea para
 encender el semáforo de bancabilidad.
 """
 
+import os
+import re
 from datetime import datetime, timezone
+from typing import Any
 from zoneinfo import ZoneInfo
 
+from fastapi import HTTPException
+
+from app.conversations import get_conversations
 from app.llm_anthropic import call_claude_text
+from app.llm_tokens import estimar_entrada
 
 SYSTEM_PROMPT = """Eres el Agente F.I.N.A.N.C.I.A.™ de MentHIA, un mentor financiero virtual especializado en transformar PyMEs mexicanas desordenadas en empresas estructuradas, confiables y financiables. Combinas el rigor de un analista de crédito bancario con la cercanía de un mentor que entiende el desorden real de los negocios mexicanos.
 
@@ -91,6 +107,12 @@ Al inicio, cuando el usuario te saluda, inicia el PASO 1 inmediatamente con una
 _VALID_ROLES = {"user", "assistant"}
 
 
+def _sanitize_turn(content: Any) -> str:
+    if not isinstance(content, str):
+        content = "" if content is None else str(content)
+    return content.strip()
+
+
 def _sanitize_messages(raw: Any) -> list[dict[str, str]]:
     """Normaliza el historial recibido a [{role, content}] válido para Anthropic."""
     if not isinstance(raw, list):
@@ -100,12 +122,9 @@ def _sanitize_messages(raw: Any) -> list[dict[str, str]]:
         if not isinstance(item, dict):
             continue
         role = str(item.get("role", "")).strip().lower()
-        content = item.get("content", "")
         if role not in _VALID_ROLES:
             continue
-        if not isinstance(content, str):
-            content = str(content)
-        content = content.strip()
+        content = _sanitize_turn(item.get("content", ""))
         if not content:
             continue
         clean.append({"role": role, "content": content})
@@ -156,51 +175,229 @@ def _format_profile_context(profile: dict[str, str]) -> str:
     )
 
 
-def _build_system_prompt(profile: dict[str, str]) -> str:
+def _build_dynamic_context(profile: dict[str, str], resumen: str = "") -> str:
+    """Bloques que cambian por día/usuario. Van después de SYSTEM_PROMPT para que
+    el prefijo estático se sirva desde la caché de prompts de Anthropic."""
     block = _format_profile_context(profile)
     try:
         today = datetime.now(ZoneInfo("America/Mexico_City")).strftime("%A %d de %B de %Y")
     except Exception:
         today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     date_block = f"FECHA DE REFERENCIA (hoy, México): {today}"
-    parts = [SYSTEM_PROMPT, date_block]
+    parts = [date_block]
     if block:
         parts.append(block)
-    system = "\n\n".join(parts)
-    return system
+    if resumen:
+        parts.append(resumen)
+    return "\n\n".join(parts)
+
+
+# --- Resumen acumulado de los turnos antiguos ---
+
+_PASO = re.compile(r"\bPASO\s*(\d)\b", re.IGNORECASE)
+# "3. ¿Cuánto facturas?" / "**3)** ..." al inicio de línea en el turno del agente.
+_PREGUNTA_NUM = re.compile(r"^[\s*#-]*(\d{1,2})\s*[.)]\**\s*(.+)$", re.MULTILINE)
+# "1) 18 millones, 2. 12 millones" en el turno del usuario; "18.5" no es un número de pregunta.
+_RESPUESTA_NUM = re.compile(r"(?:^|[\s,;])(\d{1,2})\s*(?:[):\-]|\.(?!\d))\s*([^,;\n]+)")
+_CLAUSULA = re.compile(r"[^.;\n]*\d[^.;\n]*")
+_DIAGNOSTICO = re.compile(r">>>DIAGNOSIS_DATA_START<<<(.*?)>>>DIAGNOSIS_DATA_END<<<", re.DOTALL)
+_SCORE = re.compile(r'"score_global"\s*:\s*"?(\d+(?:\.\d+)?)')
+_SEMAFORO = re.compile(r'"semaforo"\s*:\s*"(\w+)"')
+
+# Topes por sección para que el resumen no crezca con la conversación.
+_MAX_RESUMEN = {"respuestas": 60, "cifras": 40, "intercambio": 24}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _corto(texto: str, n: int = 200) -> str:
+    texto = " ".join(texto.replace("*", "").split())
+    return texto if len(texto) <= n else texto[: n - 1] + "…"
+
+
+def _resumen_vacio() -> dict[str, Any]:
+    return {
+        "paso": None,
+        "diagnostico": None,
+        "preguntas_abiertas": {},
+        "respuestas": [],
+        "cifras": [],
+        "intercambio": [],
+    }
+
+
+def _resumir(turnos: list[dict[str, str]], resumen: dict[str, Any]) -> dict[str, Any]:
+    """Incorpora ``turnos`` (los que salen de la ventana literal) a ``resumen``."""
+    preguntas: dict[str, str] = resumen["preguntas_abiertas"]
+    for t in turnos:
+        content = t["content"]
+        if t["role"] == "assistant":
+            if pasos := _PASO.findall(content):
+                resumen["paso"] = pasos[-1]
+            if m := _DIAGNOSTICO.search(content):
+                score, semaforo = _SCORE.search(m.group(1)), _SEMAFORO.search(m.group(1))
+                resumen["diagnostico"] = (
+                    f"score_global {score.group(1) if score else '?'}, "
+                    f"semáforo {semaforo.group(1) if semaforo else '?'}"
+                )
+                content = content[: m.start()]
+            preguntas = {n: _corto(q, 140) for n, q in _PREGUNTA_NUM.findall(content)}
+            abiertas = [q for q in re.split(r"(?<=\?)\s+", content) if q.rstrip().endswith("?")]
+            if abiertas and not preguntas:
+                resumen["intercambio"].append("Agente: " + _corto(" ".join(abiertas[-2:])))
+            continue
+        numeradas = _RESPUESTA_NUM.findall(content) if preguntas else []
+        if numeradas:
+            for n, respuesta in numeradas:
+                pregunta = preguntas.get(n, f"Pregunta {n}")
+                resumen["respuestas"].append(f"{pregunta} → {_corto(respuesta, 120)}")
+        else:
+            resumen["intercambio"].append("Usuario: " + _corto(content))
+            resumen["cifras"].extend(_corto(c, 160) for c in _CLAUSULA.findall(content))
+        preguntas = {}
+    # Preguntas numeradas del último turno resumido: las responde un turno literal.
+    resumen["preguntas_abiertas"] = preguntas
+    for key, tope in _MAX_RESUMEN.items():
+        del resumen[key][:-tope]
+    return resumen
+
+
+def _formatear_resumen(resumen: dict[str, Any]) -> str:
+    lines = ["RESUMEN DE LA CONVERSACIÓN PREVIA (turnos anteriores compactados; datos ya confirmados):"]
+    if resumen["paso"]:
+        lines.append(f"- Último PASO mencionado: {resumen['paso']}")
+    if resumen["diagnostico"]:
+        lines.append(f"- Diagnóstico ya entregado: {resumen['diagnostico']}")
+    if resumen["preguntas_abiertas"]:
+        lines.append("Preguntas numeradas del último mensaje resumido del agente:")
+        lines.extend(f"- {n}. {q}" for n, q in resumen["preguntas_abiertas"].items())
+    for key, title in (
+        ("respuestas", "Respuestas a preguntas numeradas"),
+        ("cifras", "Cifras capturadas"),
+        ("intercambio", "Resto del intercambio"),
+    ):
+        if resumen[key]:
+            lines.append(f"{title}:")
+            lines.extend(f"- {item}" for item in resumen[key])
+    return "\n".join(lines)
+
+
+def _compactar_historial(
+    messages: list[dict[str, str]],
+    resumen: dict[str, Any] | None = None,
+    desde: int = 0,
+) -> tuple[int, dict[str, Any] | None]:
+    """Índice desde el que el historial va literal y resumen de lo anterior.
+
+    ``resumen``/``desde`` son el estado previo (conversaciones guardadas); solo
+    se resumen los turnos entre ``desde`` y el nuevo corte, que siempre cae en un
+    turno del usuario y deja al menos LLM_AGENTE_TURNOS_RECIENTES mensajes.
+    """
+    umbral = _env_int("LLM_AGENTE_RESUMEN_TOKENS", 8000)
+    if estimar_entrada("", messages[desde:]) <= umbral:
+        return desde, resumen
+    corte = max(desde, len(messages) - _env_int("LLM_AGENTE_TURNOS_RECIENTES", 6))
+    while corte < len(messages) and messages[corte]["role"] != "user":
+        corte += 1
+    if corte >= len(messages) or corte == desde:
+        return desde, resumen
+    return corte, _resumir(messages[desde:corte], resumen or _resumen_vacio())
+
+
+def _greeting(profile: dict[str, str]) -> str:
+    name = profile.get("fullName")
+    if name:
+        return (
+            f"¡Hola, **{name}**! Para comenzar el diagnóstico, cuéntame: "
+            "**¿cuál es tu objetivo principal hoy?**"
+        )
+    return (
+        "Para comenzar el diagnóstico, cuéntame: **¿cómo te llamas y cuál es "
+        "tu objetivo principal hoy?**"
+    )
+
+
+async def _reply(
+    messages: list[dict[str, str]],
+    profile: dict[str, str],
+    resumen: dict[str, Any] | None = None,
+) -> str | None:
+    return await call_claude_text(
+        SYSTEM_PROMPT,
+        messages,
+        max_tokens=2500,
+        system_suffix=_build_dynamic_context(profile, _formatear_resumen(resumen) if resumen else ""),
+        tag="agente_financia",
+        priority="chat",
+    )
+
+
+_UNAVAILABLE: dict[str, Any] = {
+    "reply": (
+        "⚠️ No pude conectarme con el motor de análisis en este momento. "
+        "Revisa que el modelo Anthropic (ANTHROPIC_MODEL_NAME) sea válido, "
+        "por ejemplo claude-sonnet-4-5, e inténtalo de nuevo."
+    ),
+    "ok": False,
+    "error": "anthropic_unavailable",
+}
+
+
+async def _conversation_chat(data: dict) -> dict[str, Any]:
+    """Turno con historial en el servidor: solo se normaliza el mensaje nuevo.
+
+    Un ``conversationId`` desconocido o expirado se recrea a partir de
+    ``messages`` si el cliente lo reenvía; si no, 404 para que lo reenvíe.
+    """
+    store = get_conversations()
+    conv_id = str(data.get("conversationId") or "").strip()
+    profile = _sanitize_profile_context(data.get("profileContext"))
+    conv = store.get(conv_id) if conv_id else None
+    if conv is None:
+        if conv_id and not data.get("messages"):
+            raise HTTPException(
+                status_code=404,
+                detail="Conversación no encontrada o expirada; reenvía el historial en messages",
+            )
+        conv = store.create(_sanitize_messages(data.get("messages")), profile)
+    elif profile and profile != conv.profile:
+        store.set_profile(conv, profile)
+
+    turn = _sanitize_turn(data.get("message"))
+    pending = [{"role": "user", "content": turn}] if turn else []
+    if not conv.messages and not pending:
+        return {"reply": _greeting(conv.profile), "ok": True, "conversationId": conv.id}
+    if not pending and conv.messages[-1]["role"] != "user":
+        raise HTTPException(status_code=400, detail="Falta el turno nuevo del usuario (message)")
+
+    historial = conv.messages + pending
+    desde, resumen = _compactar_historial(historial, conv.summary, conv.summarized)
+    reply = await _reply(historial[desde:], conv.profile, resumen)
+    conv.summarized, conv.summary = desde, resumen
+    if not reply:
+        return {**_UNAVAILABLE, "conversationId": conv.id}
+    # El turno del usuario se guarda junto con la respuesta: un fallo permite reintentar.
+    store.append(conv, *pending, {"role": "assistant", "content": reply})
+    return {"reply": reply, "ok": True, "conversationId": conv.id}
 
 
 async def agente_financia_chat(data: dict) -> dict[str, Any]:
+    if "conversationId" in data or "message" in data:
+        return await _conversation_chat(data)
+
     messages = _sanitize_messages(data.get("messages"))
     profile = _sanitize_profile_context(data.get("profileContext"))
     if not messages:
-        name = profile.get("fullName")
-        if name:
-            return {
-                "reply": (
-                    f"¡Hola, **{name}**! Para comenzar el diagnóstico, cuéntame: "
-                    "**¿cuál es tu objetivo principal hoy?**"
-                ),
-                "ok": True,
-            }
-        return {
-            "reply": (
-                "Para comenzar el diagnóstico, cuéntame: **¿cómo te llamas y cuál es "
-                "tu objetivo principal hoy?**"
-            ),
-            "ok": True,
-        }
-
-    reply = call_claude_text(_build_system_prompt(profile), messages, max_tokens=2500)
+        return {"reply": _greeting(profile), "ok": True}
+
+    desde, resumen = _compactar_historial(messages)
+    reply = await _reply(messages[desde:], profile, resumen)
     if not reply:
-        return {
-            "reply": (
-                "⚠️ No pude conectarme con el motor de análisis en este momento. "
-                "Revisa que el modelo Anthropic (ANTHROPIC_MODEL_NAME) sea válido, "
-                "por ejemplo claude-sonnet-4-5, e inténtalo de nuevo."
-            ),
-            "ok": False,
-            "error": "anthropic_unavailable",
-        }
+        return dict(_UNAVAILABLE)
 
     return {"reply": reply, "ok": True}
@@ -1,18 +1,45 @@
-"""Cliente Anthropic: JSON estricto para diagnósticos."""
+"""Cliente Anthropic asíncrono: JSON estricto para diagnósticos y texto para chats.
+
+Todas las llamadas a Claude pasan por aquí (AsyncAnthropic) para no bloquear el
+event loop de uvicorn mientras se genera una respuesta larga. El cliente es el
+compartido de app.llm_clients (pool con keep-alive), no uno nuevo por llamada.
+
+Los system prompts largos y estáticos se envían marcados para la caché de prompts
+de Anthropic (ANTHROPIC_PROMPT_CACHE=0 lo desactiva); el uso de tokens de cada
+llamada, incluidos aciertos y escrituras de caché, se registra en app.llm_metrics.
+
+Respaldo entre modelos con cobertura: si el primario no emite su primer token
+dentro del p95 observado de su TTFT, se lanza el siguiente en paralelo y gana el
+primero que termine (o que hable, en streaming); el otro se cancela sin contar
+como fallo en su circuito. Los modelos con el circuito abierto (app.llm_circuit)
+se omiten. Cada llamada ocupa un lugar del limitador del proveedor
+(app.llm_limits) mientras dura, y el respaldo en paralelo otro con su propia
+reserva de tokens (sin lugar libre no se cubre); su ``max_tokens`` es el
+presupuesto adaptativo de la etiqueta (app.llm_tokens), con el valor del call site
+como techo.
+"""
 
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import os
-import re
-from typing import Any
+import time
+from typing import Any, AsyncIterator
 
-import anthropic
+from app.json_stream import parse_json_object
+from app.llm_circuit import CircuitBreaker, Probe, counts_as_failure, get_breaker
+from app.llm_clients import get_clients
+from app.llm_limits import get_limiter
+from app.llm_metrics import record_ttft, record_usage, ttft_percentile
+from app.llm_tokens import planificar, registrar_salida
 
 logger = logging.getLogger(__name__)
 
 _DEFAULT_SONNET = "claude-sonnet-4-5"
+# Hedging: sin historial de TTFT se espera _HEDGE_DEFAULT_S antes del respaldo.
+_HEDGE_DEFAULT_S = 8.0
+_HEDGE_MIN_S = 1.0
 # Modelos con fecha que Anthropic deprecó → alias vigentes
 _MODEL_ALIASES: dict[str, str] = {
     "claude-sonnet-4-20250514": "claude-sonnet-4-5",
@@ -23,7 +50,15 @@ _MODEL_ALIASES: dict[str, str] = {
 }
 
 
-def _resolve_model() -> str:
+def _api_key() -> str:
+    return os.environ.get("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
+
+
+def anthropic_configured() -> bool:
+    return bool(_api_key())
+
+
+def resolve_model() -> str:
     raw = (
         os.environ.get("ANTHROPIC_MODEL_NAME")
         or os.environ.get("ANTHROPIC_MODEL")
@@ -34,7 +69,7 @@ def _resolve_model() -> str:
 
 
 def _models_to_try() -> list[str]:
-    primary = _resolve_model()
+    primary = resolve_model()
     fallbacks = ["claude-sonnet-4-5", "claude-sonnet-4-6"]
     ordered = [primary]
     for m in fallbacks:
@@ -43,75 +78,358 @@ def _models_to_try() -> list[str]:
     return ordered
 
 
-def extract_json_object(text: str) -> dict[str, Any] | None:
-    t = text.strip()
-    m = re.search(r"\{[\s\S]*\}\s*$", t)
-    if m:
+def _text_from_message(msg: Any) -> str:
+    parts: list[str] = []
+    for b in msg.content:
+        if b.type == "text":
+            parts.append(b.text)
+    return "\n".join(parts)
+
+
+def _prompt_cache_enabled() -> bool:
+    return os.environ.get("ANTHROPIC_PROMPT_CACHE", "1") == "1"
+
+
+def _system_param(system: str, system_suffix: str | None) -> Any:
+    """System prompt como bloques: el prefijo estático se marca para la caché de
+    prompts de Anthropic (``cache_control: ephemeral``) y el sufijo dinámico
+    (fecha, perfil del usuario) va después, fuera del prefijo cacheado."""
+    if not _prompt_cache_enabled():
+        return f"{system}\n\n{system_suffix}" if system_suffix else system
+    blocks: list[dict[str, Any]] = [
+        {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+    ]
+    if system_suffix:
+        blocks.append({"type": "text", "text": system_suffix})
+    return blocks
+
+
+def _probe(model: str) -> Probe:
+    async def probe() -> bool:
+        client = get_clients().anthropic()
+        if client is None:
+            return False
+        await client.messages.create(
+            model=model, max_tokens=1, messages=[{"role": "user", "content": "ping"}]
+        )
+        return True
+
+    return probe
+
+
+def _breaker(model: str) -> CircuitBreaker:
+    return get_breaker(f"anthropic:{model}", probe=_probe(model))
+
+
+def _hedge_delay(model: str) -> float | None:
+    """Segundos sin primer token tras los cuales se lanza el siguiente modelo en
+    paralelo. Por defecto, el p95 reciente del TTFT del modelo (LLM_HEDGE_AFTER_S
+    lo fija; LLM_HEDGE=0 vuelve al respaldo secuencial)."""
+    if os.environ.get("LLM_HEDGE", "1") != "1":
+        return None
+    fixed = os.environ.get("LLM_HEDGE_AFTER_S", "").strip()
+    if fixed:
         try:
-            return json.loads(m.group(0))
-        except json.JSONDecodeError:
+            return max(0.0, float(fixed))
+        except ValueError:
             pass
-    fence = re.search(r"```(?:json)?\s*([\s\S]*?)```", t, re.IGNORECASE)
-    if fence:
+    p95 = ttft_percentile(model, 95)
+    return max(_HEDGE_MIN_S, p95 if p95 is not None else _HEDGE_DEFAULT_S)
+
+
+class _Attempt:
+    """Una llamada en streaming a un modelo; acumula el texto y avisa del primer token."""
+
+    def __init__(self, client: Any, model: str, request: dict[str, Any], tag: str) -> None:
+        self.model = model
+        self.breaker = _breaker(model)
+        self.started_at = time.monotonic()
+        self.first_token = asyncio.Event()
+        self.ready = asyncio.Event()  # primer token o fin (éxito o error)
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue()
+        self.parts: list[str] = []
+        self.reported = False
+        self.task = asyncio.create_task(self._run(client, request, tag))
+        self.task.add_done_callback(lambda _t: self.ready.set())
+
+    async def _run(self, client: Any, request: dict[str, Any], tag: str) -> str:
         try:
-            return json.loads(fence.group(1).strip())
-        except json.JSONDecodeError:
-            return None
+            async with client.messages.stream(model=self.model, **request) as stream:
+                async for text in stream.text_stream:
+                    if not self.first_token.is_set():
+                        record_ttft(self.model, time.monotonic() - self.started_at)
+                        self.first_token.set()
+                        self.ready.set()
+                    self.parts.append(text)
+                    self.queue.put_nowait(text)
+                final = await stream.get_final_message()
+            record_usage(tag, self.model, getattr(final, "usage", None))
+            registrar_salida(tag, final)
+            self.breaker.record_success()
+            return "".join(self.parts)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            # 400/401/403 hablan de la petición, no de la salud del modelo.
+            status = getattr(e, "status_code", None)
+            if status is None or counts_as_failure(status):
+                self.breaker.record_failure(f"{type(e).__name__}: {e}")
+            else:
+                self.breaker.release()
+            raise
+        finally:
+            self.queue.put_nowait(None)
+
+    def failed(self) -> bool:
+        if not self.task.done() or self.task.cancelled():
+            return self.task.cancelled()
+        if self.task.exception() is None:
+            return False
+        if not self.reported:
+            self.reported = True
+            logger.warning("Anthropic falló (%s): %s", self.model, self.task.exception())
+        return True
+
+
+async def _wait_ready(attempts: list[_Attempt], timeout: float | None) -> bool:
+    """Espera el primer token de los que aún no hablan, o el fin de los que ya
+    hablaron. False si venció ``timeout`` sin novedades."""
+    created: list[asyncio.Task] = []
+    waits: list[asyncio.Future] = []
+    for a in attempts:
+        if a.first_token.is_set():
+            waits.append(a.task)
+        else:
+            w = asyncio.create_task(a.ready.wait())
+            created.append(w)
+            waits.append(w)
     try:
-        return json.loads(t)
-    except json.JSONDecodeError:
-        return None
+        done, _ = await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for w in created:
+            w.cancel()
+    return bool(done)
+
+
+class _Race:
+    """Modelos de _models_to_try() con cobertura (hedging): el siguiente modelo se
+    lanza si el actual falla o si no emite su primer token dentro de _hedge_delay."""
+
+    def __init__(self, client: Any, request: dict[str, Any], tag: str, tokens: int) -> None:
+        self.client = client
+        self.request = request
+        self.tag = tag
+        self.tokens = tokens
+        self.models = _models_to_try()
+        self.next_index = 0
+        self.attempts: list[_Attempt] = []
+        self.hedge_denied = False
+
+    def _launch(self) -> bool:
+        """Lanza el siguiente modelo cuyo circuito admita tráfico.
+
+        El llamador ya ocupa un lugar del limitador; un respaldo en paralelo
+        (otro intento sigue corriendo) necesita el suyo, con su reserva de
+        tokens. Si el limitador no lo concede sin esperar, no se cubre: el
+        respaldo queda para cuando el intento actual falle."""
+        hedge = bool(self._running())
+        limiter = get_limiter("anthropic")
+        if hedge and not limiter.try_acquire(self.tokens):
+            self.hedge_denied = True
+            logger.info("Anthropic: limitador saturado, sin respaldo en paralelo")
+            return False
+        while self.next_index < len(self.models):
+            model = self.models[self.next_index]
+            self.next_index += 1
+            if not _breaker(model).allow():
+                logger.info("Anthropic: circuito de %s abierto, se omite", model)
+                continue
+            attempt = _Attempt(self.client, model, self.request, self.tag)
+            if hedge:
+                logger.info("Anthropic: lanzando respaldo %s en paralelo", model)
+                attempt.task.add_done_callback(lambda _t: limiter.release())
+            self.attempts.append(attempt)
+            return True
+        if hedge:
+            limiter.release()
+        return False
+
+    def _running(self) -> list[_Attempt]:
+        return [a for a in self.attempts if not a.task.done()]
+
+    def _timeout(self, running: list[_Attempt]) -> float | None:
+        if (
+            self.hedge_denied
+            or self.next_index >= len(self.models)
+            or any(a.first_token.is_set() for a in running)
+        ):
+            return None
+        last = self.attempts[-1]
+        delay = _hedge_delay(last.model)
+        if delay is None:
+            return None
+        return max(0.0, delay - (time.monotonic() - last.started_at))
+
+    async def _step(self, pick: Any) -> _Attempt | None:
+        """Espera hasta que ``pick`` elija un intento; lanza respaldos por fallo o demora."""
+        if not self.attempts:
+            self._launch()
+        while True:
+            for a in self.attempts:
+                if not a.failed() and pick(a):
+                    return a
+            running = self._running()
+            if not running:
+                if not self._launch():
+                    return None
+                continue
+            if not await _wait_ready(running, self._timeout(running)):
+                self._launch()
+
+    async def first_to_finish(self) -> str | None:
+        winner = await self._step(lambda a: a.task.done())
+        return winner.task.result() if winner else None
+
+    async def first_to_speak(self) -> _Attempt | None:
+        return await self._step(lambda a: a.first_token.is_set() or a.task.done())
+
+    def cancel_all(self, keep: _Attempt | None = None) -> None:
+        for a in self.attempts:
+            if a is keep:
+                continue
+            if not a.task.done():
+                a.task.cancel()
+            elif not a.task.cancelled():
+                a.task.exception()  # evita "exception was never retrieved"
 
 
-def call_claude_json(system: str, user: str, max_tokens: int = 6000) -> dict[str, Any] | None:
-    key = os.environ.get("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
-    if not key:
+def _request(
+    system: str,
+    messages: list[dict[str, str]],
+    max_tokens: int,
+    temperature: float | None,
+    system_suffix: str | None,
+    tag: str,
+) -> tuple[dict[str, Any], int]:
+    """Request para messages.create/stream y tokens a reservar en el bucket TPM
+    (entrada estimada + max_tokens)."""
+    plan = planificar(tag, system + (system_suffix or ""), messages, max_tokens)
+    request: dict[str, Any] = {
+        "max_tokens": plan.max_tokens,
+        "system": _system_param(system, system_suffix),
+        "messages": plan.messages,
+    }
+    if temperature is not None:
+        request["temperature"] = temperature
+    return request, plan.tokens_entrada + plan.max_tokens
+
+
+async def _create_message(
+    system: str,
+    messages: list[dict[str, str]],
+    max_tokens: int,
+    temperature: float | None,
+    system_suffix: str | None = None,
+    tag: str = "claude",
+    priority: str = "diagnostic",
+) -> str | None:
+    """Texto del primer modelo que termine (con respaldo en paralelo si el primario tarda)."""
+    client = get_clients().anthropic()
+    if client is None:
         return None
-    client = anthropic.Anthropic(api_key=key)
-    for model in _models_to_try():
+    request, tokens = _request(system, messages, max_tokens, temperature, system_suffix, tag)
+    async with get_limiter("anthropic").slot(priority, tokens):
+        race = _Race(client, request, tag, tokens)
         try:
-            msg = client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                system=system,
-                messages=[{"role": "user", "content": user}],
-            )
-        except Exception as e:  # noqa: BLE001
-            logger.warning("Anthropic messages.create falló (%s): %s", model, e)
-            continue
-        parts: list[str] = []
-        for b in msg.content:
-            if b.type == "text":
-                parts.append(b.text)
-        raw = "\n".join(parts)
-        parsed = extract_json_object(raw)
-        if parsed is None and raw:
-            logger.warning(
-                "Anthropic devolvió texto sin JSON parseable (primeros 120 chars): %s",
-                raw[:120],
-            )
-        return parsed
-    return None
-
-def call_claude_text(system: str, messages: list[dict[str, str]], max_tokens: int = 1000) -> str | None:
-    key = os.environ.get("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
-    if not key:
+            return await race.first_to_finish()
+        finally:
+            race.cancel_all()
+
+
+async def call_claude_json(
+    system: str,
+    user: str,
+    max_tokens: int = 6000,
+    temperature: float | None = None,
+    tag: str = "claude",
+    priority: str = "diagnostic",
+) -> dict[str, Any] | None:
+    raw = await _create_message(
+        system,
+        [{"role": "user", "content": user}],
+        max_tokens,
+        temperature,
+        tag=tag,
+        priority=priority,
+    )
+    if raw is None:
         return None
-    client = anthropic.Anthropic(api_key=key)
-    for model in _models_to_try():
+    parsed = parse_json_object(raw)
+    if parsed is None and raw:
+        logger.warning(
+            "Anthropic devolvió texto sin JSON parseable (primeros 120 chars): %s",
+            raw[:120],
+        )
+    return parsed
+
+
+async def call_claude_text(
+    system: str,
+    messages: list[dict[str, str]],
+    max_tokens: int = 1000,
+    temperature: float | None = None,
+    system_suffix: str | None = None,
+    tag: str = "claude",
+    priority: str = "diagnostic",
+) -> str | None:
+    return await _create_message(
+        system,
+        messages,
+        max_tokens,
+        temperature,
+        system_suffix=system_suffix,
+        tag=tag,
+        priority=priority,
+    )
+
+
+async def stream_claude_text(
+    system: str,
+    messages: list[dict[str, str]],
+    max_tokens: int = 1000,
+    temperature: float | None = None,
+    system_suffix: str | None = None,
+    tag: str = "claude",
+    priority: str = "diagnostic",
+) -> AsyncIterator[str]:
+    """Genera el texto de Claude en fragmentos conforme llega (messages.stream).
+
+    Gana el primer modelo que emita un token (el respaldo se lanza en paralelo si
+    el primario falla o tarda más que _hedge_delay); los demás se cancelan. Un
+    corte a mitad de la respuesta se propaga al llamador.
+    """
+    client = get_clients().anthropic()
+    if client is None:
+        raise RuntimeError("ANTHROPIC_API_KEY no configurada")
+    request, tokens = _request(system, messages, max_tokens, temperature, system_suffix, tag)
+    async with get_limiter("anthropic").slot(priority, tokens):
+        race = _Race(client, request, tag, tokens)
         try:
-            msg = client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                system=system,
-                messages=messages,
-            )
-        except Exception as e:
-            logger.warning("Anthropic text messages.create falló (%s): %s", model, e)
-            continue
-        parts: list[str] = []
-        for b in msg.content:
-            if b.type == "text":
-                parts.append(b.text)
-        return "\n".join(parts)
-    return None
+            winner = await race.first_to_speak()
+            if winner is None:
+                raise RuntimeError("ningún modelo Claude respondió")
+            race.cancel_all(keep=winner)
+            while True:
+                chunk = await winner.queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+            winner.task.result()
+        finally:
+            race.cancel_all()
+
+
+def check_admission() -> None:
+    """Rechazo rápido (503) antes de abrir un flujo SSE si la cola de Anthropic está llena."""
+    get_limiter("anthropic").check_admission()
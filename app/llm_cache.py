@@ -0,0 +1,264 @@
+"""Caché de reportes LLM por entrada canónica.
+
+Un mismo cuestionario reenviado (refresh, reintento del front) produce la misma
+clave: hash SHA-256 de la entrada normalizada + modelo + hash del system prompt
+(cambiar el prompt invalida sus entradas). Solo se guardan respuestas exitosas
+del modelo, nunca los fallbacks.
+
+Capas: LRU en memoria con TTL y, opcionalmente, SQLite en disco compartido entre
+reinicios/workers. Los valores se guardan como JSON serializado, así que cada
+acierto devuelve exactamente el mismo reporte (y un dict nuevo que el llamador
+puede modificar).
+
+Además, ``SingleFlight`` une solicitudes idénticas simultáneas (doble submit,
+dos pestañas) en una sola llamada al modelo, con la misma clave.
+
+Variables de entorno:
+- LLM_CACHE (1) — 0 desactiva la caché.
+- LLM_CACHE_TTL (86400) — segundos de vida de una entrada.
+- LLM_CACHE_MAX_ENTRIES (256) — tamaño del LRU en memoria.
+- LLM_CACHE_DB — ruta del archivo SQLite (sin definir: solo memoria).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def prompt_version(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(namespace: str, payload: Any, *, model: str, system_prompt: str) -> str:
+    """Clave determinista: mismo payload (sin importar el orden de claves) → misma clave."""
+    raw = _canonical_json(
+        {
+            "ns": namespace,
+            "model": model,
+            "prompt": prompt_version(system_prompt),
+            "input": payload,
+        }
+    )
+    return f"{namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: float = 86400,
+        max_entries: int = 256,
+        db_path: str = "",
+        enabled: bool = True,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._mem: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        if enabled and db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Caché LLM SQLite deshabilitada (%s): %s", db_path, e)
+                self._db = None
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[1])
+                del self._mem[key]
+            row = self._db_get(key, now)
+            if row is None:
+                self.misses += 1
+                return None
+            text, expires = row
+            self._mem_put(key, text, expires)
+            self.hits += 1
+            return json.loads(text)
+
+    def set(self, key: str, value: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            text = json.dumps(value, ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as e:
+            logger.warning("Reporte no serializable, no se cachea: %s", e)
+            return
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, text, now + self.ttl)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, expires) VALUES (?, ?, ?)",
+                        (key, text, now + self.ttl),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Error escribiendo caché LLM: %s", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._mem),
+            "hits": self.hits,
+            "misses": self.misses,
+            "sqlite": self._db is not None,
+        }
+
+    def _mem_put(self, key: str, text: str, expires: float) -> None:
+        self._mem[key] = (expires, text)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple[str, float]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Error leyendo caché LLM: %s", e)
+            return None
+        if row is None:
+            return None
+        if row[1] <= now:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        return row[0], row[1]
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(
+            ttl=float(_env_int("LLM_CACHE_TTL", 86400)),
+            max_entries=_env_int("LLM_CACHE_MAX_ENTRIES", 256),
+            db_path=os.getenv("LLM_CACHE_DB", "").strip(),
+            enabled=os.getenv("LLM_CACHE", "1") == "1",
+        )
+    return _cache
+
+
+class SingleFlight:
+    """Coalesce llamadas idénticas en curso: la primera (líder) llama al modelo y
+    las concurrentes con la misma clave esperan su resultado en lugar de repetir
+    la llamada. Vive en el event loop del proceso; no coordina entre workers."""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future] = {}
+
+    def begin(self, key: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[key] = fut
+        return fut
+
+    def finish(
+        self,
+        key: str,
+        fut: asyncio.Future,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Publica el resultado del líder. ``CancelledError`` = líder abandonado
+        (p. ej. el cliente SSE se desconectó): los seguidores lo reintentan."""
+        if self._calls.get(key) is fut:
+            del self._calls[key]
+        if fut.done():
+            return
+        if error is None:
+            fut.set_result(result)
+        elif isinstance(error, asyncio.CancelledError):
+            fut.cancel()
+        else:
+            fut.set_exception(error)
+            fut.exception()  # marcado como leído aunque no haya seguidores
+
+    async def follow(self, key: str) -> Any:
+        """Resultado de la llamada en curso con esa clave (copia propia), o None si
+        no hay ninguna o el líder la abandonó. Propaga el error del líder."""
+        fut = self._calls.get(key)
+        if fut is None:
+            return None
+        logger.info("Single-flight: esperando llamada en curso %s", key[:24])
+        try:
+            return copy.deepcopy(await asyncio.shield(fut))
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                return None
+            raise
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while key in self._calls:
+            shared = await self.follow(key)
+            if shared is not None:
+                return shared
+        fut = self.begin(key)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(key, fut, error=e)
+            raise
+        self.finish(key, fut, result)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+_flight = SingleFlight()
+
+
+def get_flight() -> SingleFlight:
+    return _flight
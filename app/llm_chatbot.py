@@ -1,6 +1,10 @@
 import logging
 from typing import Any
+from .chat_faq import FaqIndex, faq_enabled, get_semantic_cache, min_score, namespace, record_tier
 from .llm_anthropic import call_claude_text
+from .llm_grok import QUICK_RESPONSES
+from .llm_grok_ayuda import LOCAL_RESPONSES
+from .llm_limits import LLMOverloaded
 
 logger = logging.getLogger(__name__)
 
@@ -59,47 +63,121 @@ REGLAS:
 - No des discursos largos; responde puntualmente.
 - Siempre orienta al usuario hacia una acción concreta dentro de la plataforma."""
 
+# Respuestas locales: las usa el fallback por palabras clave y el índice de FAQs.
+_RESPUESTAS = {
+    "diagnosticos": "Tenemos varios diagnósticos: General, MENTHIA 360 (rápido), Profundo (detallado), de Emergencia (crisis), de Competencia, Agente F.I.N.A.N.C.I.A. (bancabilidad), F.I.N.A.N.C.I.A. PRO y F.I.N.A.N.C.I.A. EXPRESS. ¿Cuál necesitas o quieres que te recomiende uno?",
+    "financia": "El Agente F.I.N.A.N.C.I.A. evalúa la bancabilidad de tu PyME y te da un semáforo (rojo/amarillo/verde) con un plan de acción. Lo encuentras en Diagnóstico > Agente F.I.N.A.N.C.I.A.",
+    "crisis": "F.I.N.A.N.C.I.A. PRO y F.I.N.A.N.C.I.A. EXPRESS están diseñados para empresas en crisis. PRO es la versión estructurada y EXPRESS la rápida. Los encuentras en la sección de Diagnóstico.",
+    "emergencia": "Para situaciones urgentes tenemos el Diagnóstico de Emergencia que prioriza las acciones inmediatas. Ve a Diagnóstico > Emergencia desde tu dashboard.",
+    "competencia": "El Diagnóstico de Competencia te permite comparar tu empresa frente a tus competidores y analizar tu participación de mercado. Lo encuentras en la sección de Diagnóstico.",
+    "mentoria": "Puedes encontrar y agendar mentorías 1:1 con especialistas en el Marketplace. Hay expertos en finanzas, marketing, operaciones, legal y más.",
+    "analisis_financiero": "En la sección de Análisis Financiero puedes subir tus estados financieros y obtener una interpretación con IA. Para un diagnóstico completo de bancabilidad, usa el Agente F.I.N.A.N.C.I.A.",
+    "marketplace": "En el Marketplace encuentras consultores y mentores especializados. Puedes filtrar por área de expertise y agendar sesiones directamente.",
+    "citas": "Puedes gestionar tus citas en la sección Mis Citas del dashboard. Para agendar una nueva, busca un mentor en el Marketplace.",
+    "cursos": "La capacitación digital está próximamente. Mientras tanto, puedes agendar una mentoría 1:1 con un especialista en el tema que te interese.",
+    "precios": "La información de precios la puedes consultar en las FAQs o contactando directamente al equipo de MentHIA.",
+    "saludo": "Hola, soy el asistente de MentHIA. Puedo ayudarte con diagnósticos empresariales, análisis financiero, mentorías 1:1 y más. ¿Qué necesitas hoy?",
+    "gracias": "De nada. ¿Hay algo más en lo que pueda orientarte?",
+    "ayuda": "Puedo orientarte sobre: diagnósticos (General, MENTHIA 360, Profundo, Emergencia, Competencia, Agente F.I.N.A.N.C.I.A., F.I.N.A.N.C.I.A. PRO, F.I.N.A.N.C.I.A. EXPRESS), mentorías 1:1, análisis financiero y más. ¿Qué necesitas?",
+    "menthia_360": "MENTHIA 360 es la forma más rápida de obtener un panorama de tu empresa. En pocos minutos obtienes recomendaciones accionables. Ve a Diagnóstico > MENTHIA 360.",
+    "profundo": "El Diagnóstico Profundo es un análisis extenso por área funcional. Ideal si ya hiciste MENTHIA 360 y quieres mayor detalle. Ve a Diagnóstico > Profundo.",
+    "cupones": "Puedes gestionar tus cupones de descuento en la sección Cupones del dashboard.",
+    "historial": "En Mi Historial puedes ver todos tus diagnósticos y sesiones pasadas. Lo encuentras en la sección Actividad del menú.",
+    "perfil": "Puedes actualizar tus datos personales en la sección Mi Perfil desde el menú lateral.",
+    "registro": "Para registrarte entra a www.ment-hia.com, da clic en Registro y completa tus datos. Después puedes iniciar tu diagnóstico desde el Dashboard.",
+    "contacto": "Puedes contactar al equipo de MentHIA en contacto@ment-hia.com.",
+    "como_funciona": "MentHIA combina IA y mentores expertos: empiezas con un diagnóstico que te da un panorama claro y, con base en él, puedes agendar mentorías 1:1 en el Marketplace. Si no sabes por dónde empezar, prueba MENTHIA 360.",
+    "default": "Soy el asistente de MentHIA. Puedo orientarte sobre diagnósticos empresariales, análisis financiero, mentorías con expertos y más. ¿En qué te ayudo?",
+}
+
 def get_fallback_response(message: str) -> str:
     msg = message.lower()
     if 'diagnóstico' in msg or 'diagnostico' in msg:
-        return "Tenemos varios diagnósticos: General, MENTHIA 360 (rápido), Profundo (detallado), de Emergencia (crisis), de Competencia, Agente F.I.N.A.N.C.I.A. (bancabilidad), F.I.N.A.N.C.I.A. PRO y F.I.N.A.N.C.I.A. EXPRESS. ¿Cuál necesitas o quieres que te recomiende uno?"
+        return _RESPUESTAS["diagnosticos"]
     if 'financia' in msg or 'bancab' in msg or 'banco' in msg or 'crédito' in msg or 'credito' in msg:
-        return "El Agente F.I.N.A.N.C.I.A. evalúa la bancabilidad de tu PyME y te da un semáforo (rojo/amarillo/verde) con un plan de acción. Lo encuentras en Diagnóstico > Agente F.I.N.A.N.C.I.A."
+        return _RESPUESTAS["financia"]
     if 'recupera' in msg or 'crisis' in msg or 'quiebra' in msg:
-        return "F.I.N.A.N.C.I.A. PRO y F.I.N.A.N.C.I.A. EXPRESS están diseñados para empresas en crisis. PRO es la versión estructurada y EXPRESS la rápida. Los encuentras en la sección de Diagnóstico."
+        return _RESPUESTAS["crisis"]
     if 'emergencia' in msg or 'urgente' in msg or 'urgencia' in msg:
-        return "Para situaciones urgentes tenemos el Diagnóstico de Emergencia que prioriza las acciones inmediatas. Ve a Diagnóstico > Emergencia desde tu dashboard."
+        return _RESPUESTAS["emergencia"]
     if 'competencia' in msg or 'competidor' in msg or 'mercado' in msg:
-        return "El Diagnóstico de Competencia te permite comparar tu empresa frente a tus competidores y analizar tu participación de mercado. Lo encuentras en la sección de Diagnóstico."
+        return _RESPUESTAS["competencia"]
     if 'mentor' in msg or 'asesor' in msg or 'consultor' in msg:
-        return "Puedes encontrar y agendar mentorías 1:1 con especialistas en el Marketplace. Hay expertos en finanzas, marketing, operaciones, legal y más."
+        return _RESPUESTAS["mentoria"]
     if 'financiero' in msg or 'finanzas' in msg or 'estados financieros' in msg:
-        return "En la sección de Análisis Financiero puedes subir tus estados financieros y obtener una interpretación con IA. Para un diagnóstico completo de bancabilidad, usa el Agente F.I.N.A.N.C.I.A."
+        return _RESPUESTAS["analisis_financiero"]
     if 'marketplace' in msg or 'servicio' in msg:
-        return "En el Marketplace encuentras consultores y mentores especializados. Puedes filtrar por área de expertise y agendar sesiones directamente."
+        return _RESPUESTAS["marketplace"]
     if 'cita' in msg or 'agendar' in msg or 'agenda' in msg:
-        return "Puedes gestionar tus citas en la sección Mis Citas del dashboard. Para agendar una nueva, busca un mentor en el Marketplace."
+        return _RESPUESTAS["citas"]
     if 'curso' in msg or 'aprend' in msg or 'capacit' in msg:
-        return "La capacitación digital está próximamente. Mientras tanto, puedes agendar una mentoría 1:1 con un especialista en el tema que te interese."
+        return _RESPUESTAS["cursos"]
     if 'precio' in msg or 'costo' in msg or 'cuánto' in msg or 'cuanto' in msg:
-        return "La información de precios la puedes consultar en las FAQs o contactando directamente al equipo de MentHIA."
+        return _RESPUESTAS["precios"]
     if 'hola' in msg or 'buenas' in msg or 'hey' in msg or 'buenos' in msg:
-        return "Hola, soy el asistente de MentHIA. Puedo ayudarte con diagnósticos empresariales, análisis financiero, mentorías 1:1 y más. ¿Qué necesitas hoy?"
+        return _RESPUESTAS["saludo"]
     if 'gracias' in msg or 'thank' in msg:
-        return "De nada. ¿Hay algo más en lo que pueda orientarte?"
+        return _RESPUESTAS["gracias"]
     if 'ayuda' in msg or 'help' in msg:
-        return "Puedo orientarte sobre: diagnósticos (General, MENTHIA 360, Profundo, Emergencia, Competencia, Agente F.I.N.A.N.C.I.A., F.I.N.A.N.C.I.A. PRO, F.I.N.A.N.C.I.A. EXPRESS), mentorías 1:1, análisis financiero y más. ¿Qué necesitas?"
+        return _RESPUESTAS["ayuda"]
     if 'express' in msg:
-        return "MENTHIA 360 es la forma más rápida de obtener un panorama de tu empresa. En pocos minutos obtienes recomendaciones accionables. Ve a Diagnóstico > MENTHIA 360."
+        return _RESPUESTAS["menthia_360"]
     if 'profundo' in msg:
-        return "El Diagnóstico Profundo es un análisis extenso por área funcional. Ideal si ya hiciste MENTHIA 360 y quieres mayor detalle. Ve a Diagnóstico > Profundo."
+        return _RESPUESTAS["profundo"]
     if 'cupón' in msg or 'cupon' in msg or 'descuento' in msg:
-        return "Puedes gestionar tus cupones de descuento en la sección Cupones del dashboard."
+        return _RESPUESTAS["cupones"]
     if 'historial' in msg:
-        return "En Mi Historial puedes ver todos tus diagnósticos y sesiones pasadas. Lo encuentras en la sección Actividad del menú."
+        return _RESPUESTAS["historial"]
     if 'perfil' in msg or 'cuenta' in msg or 'datos' in msg:
-        return "Puedes actualizar tus datos personales en la sección Mi Perfil desde el menú lateral."
-    return "Soy el asistente de MentHIA. Puedo orientarte sobre diagnósticos empresariales, análisis financiero, mentorías con expertos y más. ¿En qué te ayudo?"
+        return _RESPUESTAS["perfil"]
+    return _RESPUESTAS["default"]
+
+# Preguntas de ejemplo por intención; las claves de llm_grok.QUICK_RESPONSES se
+# agregan como formulaciones de la intención equivalente y los términos de
+# llm_grok_ayuda.LOCAL_RESPONSES como "¿qué es ...?".
+_PREGUNTAS = {
+    "diagnosticos": ["diagnóstico", "diagnósticos", "qué diagnósticos tienen", "qué tipos de diagnóstico hay"],
+    "financia": ["agente financia", "bancabilidad", "quiero un crédito", "crédito bancario", "me va a prestar el banco"],
+    "crisis": ["mi empresa está en crisis", "estoy en quiebra", "recupera"],
+    "emergencia": ["diagnóstico de emergencia", "es urgente", "tengo una emergencia"],
+    "competencia": ["diagnóstico de competencia", "compararme con mis competidores", "participación de mercado"],
+    "mentoria": ["mentoría", "quiero un mentor", "hablar con un asesor", "consultores"],
+    "analisis_financiero": ["análisis financiero", "subir mis estados financieros", "estados financieros"],
+    "marketplace": ["marketplace", "qué es el marketplace"],
+    "citas": ["mis citas", "agendar una cita", "cómo agendo"],
+    "cursos": ["cursos", "capacitación", "tienen cursos"],
+    "precios": ["precio", "precios", "cuánto cuesta", "costo", "tarifa", "cuánto cobran", "cuál es el precio"],
+    "saludo": ["hola", "buenas", "buenos días", "buenas tardes", "hey"],
+    "gracias": ["gracias", "muchas gracias", "thank you"],
+    "ayuda": ["ayuda", "help", "qué puedes hacer", "en qué me ayudas"],
+    "menthia_360": ["menthia 360", "diagnóstico express", "diagnóstico rápido"],
+    "profundo": ["diagnóstico profundo"],
+    "cupones": ["cupones", "cupón de descuento", "tienen descuentos"],
+    "historial": ["mi historial", "dónde veo mis diagnósticos anteriores"],
+    "perfil": ["mi perfil", "cambiar mis datos", "actualizar mi perfil"],
+    "registro": ["registro", "cómo me registro", "registrarme", "crear una cuenta"],
+    "contacto": ["contacto", "cómo los contacto", "correo de contacto"],
+    "como_funciona": ["cómo funciona", "cómo funciona menthia", "qué es menthia"],
+}
+_QUICK_INTENCION = {
+    "precio": "precios", "cuanto cuesta": "precios", "costo": "precios", "tarifa": "precios",
+    "registr": "registro", "contacto": "contacto", "gracias": "gracias",
+    "diagnostico": "diagnosticos", "como funciona": "como_funciona",
+}
+
+
+def _faq_entradas() -> list[tuple[str, list[str], str]]:
+    preguntas = {k: list(v) for k, v in _PREGUNTAS.items()}
+    for key in QUICK_RESPONSES:
+        if key in _QUICK_INTENCION:
+            preguntas[_QUICK_INTENCION[key]].append(key)
+    entradas = [(k, v, _RESPUESTAS[k]) for k, v in preguntas.items()]
+    entradas += [(f"termino:{k}", [k, f"qué es {k}"], v) for k, v in LOCAL_RESPONSES.items()]
+    return entradas
+
+
+_FAQ = FaqIndex(_faq_entradas(), min_score=min_score())
+_NAMESPACE = namespace("chatbot", MENTHIA_CHAT_PROMPT)
 
 async def handle_chatbot(data: dict[str, Any]) -> dict[str, Any]:
     message = data.get("message", "")
@@ -108,6 +186,18 @@ async def handle_chatbot(data: dict[str, Any]) -> dict[str, Any]:
     if not message:
         return {"reply": "Mensaje vacío."}
 
+    # Nivel local (app/chat_faq.py): FAQ difusa y respuestas aprendidas, sin modelo.
+    sin_historial = not messages
+    if faq_enabled():
+        hit = _FAQ.buscar(message)
+        if hit:
+            record_tier("chatbot", "faq")
+            return {"reply": hit.respuesta}
+        learned = get_semantic_cache().get(_NAMESPACE, message) if sin_historial else None
+        if learned:
+            record_tier("chatbot", "aprendida")
+            return {"reply": learned}
+
     # Format messages for Anthropic
     anthropic_messages = []
     # Take last 6 messages
@@ -122,10 +212,26 @@ async def handle_chatbot(data: dict[str, Any]) -> dict[str, Any]:
     anthropic_messages.append({"role": "user", "content": message})
     
     # Try calling Anthropic API
-    reply = call_claude_text(MENTHIA_CHAT_PROMPT, anthropic_messages, max_tokens=250)
+    # Prioridad más baja: ante saturación se responde con el fallback local.
+    try:
+        reply = await call_claude_text(
+            MENTHIA_CHAT_PROMPT,
+            anthropic_messages,
+            max_tokens=250,
+            tag="chatbot",
+            priority="landing",
+        )
+    except LLMOverloaded:
+        reply = None
     
     if reply:
-        return {"reply": reply.strip()}
+        reply = reply.strip()
+        record_tier("chatbot", "llm")
+        # Sin historial la respuesta no depende del contexto: se puede reutilizar.
+        if sin_historial and faq_enabled():
+            get_semantic_cache().set(_NAMESPACE, message, reply)
+        return {"reply": reply}
     else:
         # Fallback if API fails
+        record_tier("chatbot", "fallback")
         return {"reply": get_fallback_response(message)}
@@ -0,0 +1,233 @@
+"""Circuit breakers por proveedor/modelo LLM.
+
+Cada destino ("anthropic:claude-sonnet-4-5", "xai", "openai", ...) tiene un
+breaker: tras LLM_CB_FAILURES errores o timeouts consecutivos se abre y las
+llamadas pasan directo a la siguiente opción sana. Pasado LLM_CB_COOLDOWN_S se
+prueba en segundo plano (si el destino registró una sonda) o con la siguiente
+llamada real (half-open); un éxito lo cierra y un fallo lo vuelve a abrir.
+
+Las llamadas por SDK (emergencia, profundo, validación de consultores) pasan por
+``guard(openai_breaker())``; las HTTP directas (chats, visión) registran el
+resultado a mano según el status. Estados expuestos en GET /api/admin/llm/circuits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+Probe = Callable[[], Awaitable[bool]]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        probe: Optional[Probe] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe = probe
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = ""
+        self.total_failures = 0
+        self.total_successes = 0
+        self._trial_in_flight = False
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def allow(self) -> bool:
+        """¿Se puede enviar tráfico? En half-open deja pasar una sola llamada de prueba."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            if self._probe_task is not None and not self._probe_task.done():
+                return False
+            self.state = HALF_OPEN
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.total_successes += 1
+        self.failures = 0
+        self._trial_in_flight = False
+        if self.state != CLOSED:
+            logger.info("Circuito %s cerrado", self.name)
+        self.state = CLOSED
+
+    def record_failure(self, reason: str = "error") -> None:
+        self.total_failures += 1
+        self.failures += 1
+        self.last_error = reason[:200]
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._open()
+
+    def release(self) -> None:
+        """La llamada de prueba se canceló sin resultado: otra podrá intentarlo."""
+        self._trial_in_flight = False
+
+    def reset(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def _open(self) -> None:
+        if self.state != OPEN:
+            logger.warning(
+                "Circuito %s abierto tras %d fallos (%s)", self.name, self.failures, self.last_error
+            )
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        if self.probe is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            if self._probe_task is None or self._probe_task.done():
+                self._probe_task = loop.create_task(self._probe_loop())
+
+    async def _probe_loop(self) -> None:
+        while self.state == OPEN:
+            await asyncio.sleep(self.cooldown)
+            if self.state != OPEN:
+                return
+            try:
+                ok = await self.probe()
+            except Exception as e:  # noqa: BLE001
+                ok = False
+                self.last_error = f"sonda: {e}"[:200]
+            if ok:
+                self.record_success()
+                return
+            self.opened_at = time.monotonic()
+            logger.info("Sonda de %s falló; el circuito sigue abierto", self.name)
+
+    def snapshot(self) -> dict[str, Any]:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "total_failures": self.total_failures,
+            "total_successes": self.total_successes,
+            "last_error": self.last_error,
+            "retry_in_s": round(retry_in, 1),
+            "background_probe": self.probe is not None,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, probe: Optional[Probe] = None) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name,
+            failure_threshold=int(_env_float("LLM_CB_FAILURES", 5)),
+            cooldown=_env_float("LLM_CB_COOLDOWN_S", 30.0),
+            probe=probe,
+        )
+        _breakers[name] = breaker
+    elif probe is not None and breaker.probe is None:
+        breaker.probe = probe
+    return breaker
+
+
+def breakers_snapshot() -> dict[str, dict[str, Any]]:
+    return {name: b.snapshot() for name, b in sorted(_breakers.items())}
+
+
+def reset_breaker(name: str) -> bool:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        return False
+    breaker.reset()
+    return True
+
+
+def counts_as_failure(status_code: int) -> bool:
+    """Respuestas HTTP que indican un destino no sano (no errores del request)."""
+    return status_code >= 500 or status_code in (404, 408, 429)
+
+
+def models_probe(provider: str, base_url: str, key_env: str) -> Probe:
+    """Sonda sin costo para APIs compatibles con OpenAI: GET {base_url}/models."""
+
+    async def probe() -> bool:
+        from app.llm_clients import get_clients
+
+        key = os.getenv(key_env, "").strip().strip('"').strip("'")
+        if not key:
+            return False
+        response = await get_clients().http(provider).get(
+            f"{base_url}/models",
+            timeout=10.0,
+            headers={"Authorization": f"Bearer {key}"},
+        )
+        return response.status_code == 200
+
+    return probe
+
+
+def openai_breaker() -> CircuitBreaker:
+    """Breaker compartido de OpenAI: chats, emergencia, profundo, visión y validación."""
+    from app.llm_clients import OPENAI_BASE_URL
+
+    return get_breaker("openai", probe=models_probe("openai", OPENAI_BASE_URL, "OPENAI_API_KEY"))
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito del destino está abierto: la llamada no se envió."""
+
+
+@asynccontextmanager
+async def guard(breaker: CircuitBreaker) -> AsyncIterator[None]:
+    """Envuelve una llamada de SDK al destino del breaker.
+
+    Rechaza con ``CircuitOpenError`` si el circuito no admite tráfico y registra
+    el resultado: éxito, fallo, o nada si la excepción trae un status HTTP que
+    no indica un destino enfermo (p. ej. 400 por un request inválido).
+    """
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuito {breaker.name} abierto")
+    try:
+        yield
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        status = getattr(e, "status_code", None)
+        if isinstance(status, int) and not counts_as_failure(status):
+            breaker.release()
+        else:
+            breaker.record_failure(f"{type(e).__name__}: {e}")
+        raise
+    breaker.record_success()
@@ -0,0 +1,144 @@
+"""Registro de clientes LLM de larga vida (Anthropic, OpenAI, xAI).
+
+Un solo pool HTTP (keep-alive + HTTP/2) por proveedor para todo el proceso: se
+crea en el arranque de FastAPI (lifespan) y se cierra al apagar, en lugar de abrir
+un cliente y un handshake TLS nuevos en cada llamada.
+
+Variables de entorno:
+- LLM_POOL_MAX_CONNECTIONS (100) — conexiones simultáneas por proveedor.
+- LLM_POOL_MAX_KEEPALIVE (20) — conexiones ociosas que se mantienen abiertas.
+- LLM_POOL_KEEPALIVE_EXPIRY (30) — segundos antes de cerrar una conexión ociosa.
+- LLM_HTTP2 (1) — HTTP/2 si el paquete `h2` está instalado.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+
+import anthropic
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+XAI_BASE_URL = "https://api.x.ai/v1"
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# Timeout por defecto del pool; cada llamada puede pasar el suyo.
+_DEFAULT_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+
+def _env_key(name: str) -> str:
+    return os.getenv(name, "").strip().strip('"').strip("'")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("LLM_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.info("Paquete h2 no instalado; los pools LLM usan HTTP/1.1")
+        return False
+    return True
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int("LLM_POOL_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("LLM_POOL_MAX_KEEPALIVE", 20),
+        keepalive_expiry=float(_env_int("LLM_POOL_KEEPALIVE_EXPIRY", 30)),
+    )
+
+
+class LLMClients:
+    """Clientes compartidos por proveedor; se crean bajo demanda y viven todo el proceso."""
+
+    def __init__(self) -> None:
+        self._http: dict[str, httpx.AsyncClient] = {}
+        self._anthropic: anthropic.AsyncAnthropic | None = None
+        self._anthropic_key = ""
+        self._openai: openai.AsyncOpenAI | None = None
+        self._openai_key = ""
+
+    def http(self, provider: str) -> httpx.AsyncClient:
+        """Pool HTTP del proveedor ("anthropic", "openai" o "xai")."""
+        client = self._http.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=_http2_enabled(),
+                limits=_pool_limits(),
+                timeout=_DEFAULT_TIMEOUT,
+            )
+            self._http[provider] = client
+        return client
+
+    def anthropic(self) -> anthropic.AsyncAnthropic | None:
+        key = _env_key("ANTHROPIC_API_KEY")
+        if not key:
+            return None
+        if self._anthropic is None or key != self._anthropic_key:
+            try:
+                self._anthropic = anthropic.AsyncAnthropic(
+                    api_key=key, http_client=self.http("anthropic")
+                )
+            except TypeError as e:
+                # SDKs que no aceptan un httpx.AsyncClient externo: se conserva
+                # una sola instancia con su pool interno.
+                logger.info("AsyncAnthropic sin pool compartido: %s", e)
+                self._anthropic = anthropic.AsyncAnthropic(api_key=key)
+            self._anthropic_key = key
+        return self._anthropic
+
+    def openai(self) -> openai.AsyncOpenAI | None:
+        key = _env_key("OPENAI_API_KEY")
+        if not key:
+            return None
+        if self._openai is None or key != self._openai_key:
+            self._openai = openai.AsyncOpenAI(
+                api_key=key, http_client=self.http("openai")
+            )
+            self._openai_key = key
+        return self._openai
+
+    def xai(self) -> httpx.AsyncClient:
+        """xAI (Grok) expone una API compatible con OpenAI; se usa vía httpx directo."""
+        return self.http("xai")
+
+    async def startup(self) -> None:
+        for provider in ("anthropic", "openai", "xai"):
+            self.http(provider)
+        logger.info(
+            "Pools LLM listos (http2=%s, max_connections=%s)",
+            _http2_enabled(),
+            _pool_limits().max_connections,
+        )
+
+    async def aclose(self) -> None:
+        clients: list = list(self._http.values())
+        if self._anthropic is not None:
+            clients.append(self._anthropic)
+        self._http.clear()
+        self._anthropic = None
+        self._openai = None
+        for client in clients:
+            try:
+                close = getattr(client, "aclose", None) or client.close
+                await close()
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Error cerrando pool HTTP LLM: %s", e)
+
+
+_clients = LLMClients()
+
+
+def get_clients() -> LLMClients:
+    return _clients
@@ -4,9 +4,11 @@ import os
 import json
 import logging
 from typing import Dict, Any, List, Optional
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from app.llm_circuit import guard, openai_breaker
+from app.llm_clients import get_clients
+
 logger = logging.getLogger("consultant_validation")
 
 # Carga variables de entorno
@@ -15,8 +17,6 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
 
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-
 # =====================================================
 # PROMPT MAESTRO DE VALIDACIÓN DE CONSULTORES - PLATIA
 # =====================================================
@@ -251,6 +251,7 @@ async def validar_consultor(
     """
     
     # Fallback si no hay API key
+    client = get_clients().openai()
     if not OPENAI_API_KEY or not client:
         logger.warning("OpenAI no configurado, usando fallback")
         return _respuesta_fallback(form_data)
@@ -267,16 +268,17 @@ Evalúa las 6 dimensiones y asigna el MentHIA Trust Score™ correspondiente.
 Sé objetivo, justo y alineado con los valores de MentHIA."""
 
     try:
-        completion = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": CONSULTANT_VALIDATION_SYSTEM_PROMPT},
-                {"role": "user", "content": user_msg}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.3,  # Baja temperatura para análisis más objetivo
-            max_tokens=2000
-        )
+        async with guard(openai_breaker()):
+            completion = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": CONSULTANT_VALIDATION_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_msg}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.3,  # Baja temperatura para análisis más objetivo
+                max_tokens=2000
+            )
 
         content = completion.choices[0].message.content or "{}"
         parsed = json.loads(content)
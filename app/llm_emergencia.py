@@ -2,20 +2,22 @@
 # MENTHIA CrisisNow - Módulo de Intervención Empresarial Inmediata
 import os
 import json
-import asyncio
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from fastapi import HTTPException
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from app.llm_circuit import guard, openai_breaker
+from app.llm_clients import get_clients
+from app.prompt_compact import compactar, registrar_ahorro
+from app.text_match import KeywordMatcher
+from app.text_normalize import Normalizado, normalizar_campos, unir
+
 # Carga variables de entorno (usa .env)
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip().strip('"').strip("'")
 MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4o").strip().strip('"').strip("'")
 
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-
 # =====================================================
 # PROMPT SYSTEM DE MENTHIA CRISISNOW
 # =====================================================
@@ -102,15 +104,23 @@ RISK_PATTERNS = {
     "personal_perdido": ["renunciaron todos", "sin personal", "equipo perdido"]
 }
 
+_SENTIMIENTO = KeywordMatcher({"stress": SENTIMENT_STRESS, "negative": SENTIMENT_NEGATIVE})
+_RIESGOS = KeywordMatcher(RISK_PATTERNS)
+
+# Campos de texto libre: se normalizan una vez por solicitud (app.text_normalize).
+_CAMPOS_SENTIMIENTO = ("problematicaEspecifica", "problemaMasUrgente", "impactoDelProblema")
+_CAMPOS_RIESGO = _CAMPOS_SENTIMIENTO + ("principalPrioridad",)
+
+
 def _analizar_sentimiento(texto: str) -> Dict[str, Any]:
     if not texto:
         return {"sentimiento": "neutral", "nivel_estres": 0, "indicadores": []}
     
-    texto_lower = texto.lower()
     indicadores = []
     
-    stress_count = sum(1 for word in SENTIMENT_STRESS if word in texto_lower)
-    negative_count = sum(1 for word in SENTIMENT_NEGATIVE if word in texto_lower)
+    hits = _SENTIMIENTO.categorias(texto)
+    stress_count = len(hits.get("stress", ()))
+    negative_count = len(hits.get("negative", ()))
     
     if stress_count > 2 or negative_count > 5:
         nivel_estres = 3
@@ -125,22 +135,11 @@ def _analizar_sentimiento(texto: str) -> Dict[str, Any]:
     
     return {"sentimiento": sentimiento, "nivel_estres": nivel_estres, "indicadores": indicadores}
 
-def _detectar_patrones_riesgo(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
-    textos = [
-        str(diagnostico_data.get("problematicaEspecifica", "")),
-        str(diagnostico_data.get("problemaMasUrgente", "")),
-        str(diagnostico_data.get("impactoDelProblema", "")),
-        str(diagnostico_data.get("principalPrioridad", ""))
-    ]
-    texto_completo = " ".join(textos).lower()
-    
-    patrones_detectados = []
-    riesgo_adicional = 0
+def _detectar_patrones_riesgo(texto: Normalizado) -> Dict[str, Any]:
+    hits = _RIESGOS.categorias(texto)
     
-    for patron_key, keywords in RISK_PATTERNS.items():
-        if any(kw in texto_completo for kw in keywords):
-            patrones_detectados.append(patron_key)
-            riesgo_adicional += 1
+    patrones_detectados = [patron_key for patron_key in RISK_PATTERNS if patron_key in hits]
+    riesgo_adicional = len(patrones_detectados)
     
     return {
         "patrones_criticos": patrones_detectados,
@@ -180,18 +179,20 @@ def _calcular_riesgo(diagnostico_data: Dict[str, Any], analisis_sentimiento: Dic
         return "moderado"
     return "bajo"
 
-def _respuesta_fallback(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Genera respuesta de fallback sin OpenAI"""
-    textos = [
-        str(diagnostico_data.get("problematicaEspecifica", "")),
-        str(diagnostico_data.get("problemaMasUrgente", "")),
-        str(diagnostico_data.get("impactoDelProblema", ""))
-    ]
-    texto_completo = " ".join(txt for txt in textos if txt)
-    
-    analisis_sentimiento = _analizar_sentimiento(texto_completo)
-    patrones_riesgo = _detectar_patrones_riesgo(diagnostico_data)
+def _analisis_local(diagnostico_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+    """Sentimiento, patrones de riesgo y riesgo calculado sobre los textos normalizados una vez."""
+    textos = normalizar_campos(diagnostico_data, _CAMPOS_RIESGO)
+    analisis_sentimiento = _analizar_sentimiento(unir(textos[c] for c in _CAMPOS_SENTIMIENTO))
+    patrones_riesgo = _detectar_patrones_riesgo(unir(textos.values()))
     riesgo = _calcular_riesgo(diagnostico_data, analisis_sentimiento, patrones_riesgo)
+    return analisis_sentimiento, patrones_riesgo, riesgo
+
+def _respuesta_fallback(
+    diagnostico_data: Dict[str, Any],
+    local: Optional[Tuple[Dict[str, Any], Dict[str, Any], str]] = None,
+) -> Dict[str, Any]:
+    """Genera respuesta de fallback sin OpenAI"""
+    analisis_sentimiento, patrones_riesgo, riesgo = local or _analisis_local(diagnostico_data)
     
     nombre = diagnostico_data.get("nombreSolicitante", "").split()[0] if diagnostico_data.get("nombreSolicitante") else ""
     
@@ -240,6 +241,10 @@ def _respuesta_fallback(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
         "patrones_detectados": patrones_riesgo,
     }
 
+def analizar_diagnostico_emergencia_fast(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Reporte por reglas, sin modelo (``mode=fast``)."""
+    return _respuesta_fallback(diagnostico_data)
+
 # =====================================================
 # Analizador principal
 # =====================================================
@@ -249,20 +254,13 @@ async def analizar_diagnostico_emergencia(diagnostico_data: Dict[str, Any]) -> D
     """
     
     # Análisis local
-    textos = [
-        str(diagnostico_data.get("problematicaEspecifica", "")),
-        str(diagnostico_data.get("problemaMasUrgente", "")),
-        str(diagnostico_data.get("impactoDelProblema", ""))
-    ]
-    texto_completo = " ".join(txt for txt in textos if txt)
-    
-    analisis_sentimiento = _analizar_sentimiento(texto_completo)
-    patrones_riesgo = _detectar_patrones_riesgo(diagnostico_data)
-    riesgo_calculado = _calcular_riesgo(diagnostico_data, analisis_sentimiento, patrones_riesgo)
+    local = _analisis_local(diagnostico_data)
+    analisis_sentimiento, patrones_riesgo, riesgo_calculado = local
     
     # Fallback si no hay API key
+    client = get_clients().openai()
     if not OPENAI_API_KEY or not client:
-        return _respuesta_fallback(diagnostico_data)
+        return _respuesta_fallback(diagnostico_data, local)
 
     # Contexto para el LLM
     contexto_analisis = ""
@@ -272,21 +270,24 @@ async def analizar_diagnostico_emergencia(diagnostico_data: Dict[str, Any]) -> D
         contexto_analisis += f"\n🚨 MÚLTIPLES PATRONES CRÍTICOS DETECTADOS: {', '.join(patrones_riesgo.get('patrones_criticos', []))}. "
     contexto_analisis += f"\nRiesgo calculado automáticamente: {riesgo_calculado}."
 
+    datos = compactar(diagnostico_data)
+    registrar_ahorro("emergencia", json.dumps(diagnostico_data, ensure_ascii=False, indent=2), datos)
+
     user_prompt = f"""Analiza este diagnóstico de emergencia empresarial.
 
 CONTEXTO PRE-ANALIZADO:
 {contexto_analisis}
 
 DATOS DEL DIAGNÓSTICO:
-{json.dumps(diagnostico_data, ensure_ascii=False, indent=2)}
+{datos}
 
 Genera el diagnóstico de crisis siguiendo la estructura JSON especificada.
 Sé directo, táctico y enfocado en acciones inmediatas.
 Priorización brutal: lo que salva la empresa primero."""
 
     try:
-        def _call():
-            completion = client.chat.completions.create(
+        async with guard(openai_breaker()):
+            completion = await client.chat.completions.create(
                 model=MODEL_NAME,
                 messages=[
                     {"role": "system", "content": MENTHIA_CRISIS_SYSTEM_PROMPT},
@@ -295,9 +296,7 @@ Priorización brutal: lo que salva la empresa primero."""
                 response_format={"type": "json_object"},
                 temperature=0.25,
             )
-            return completion.choices[0].message.content
-
-        result = await asyncio.to_thread(_call)
+        result = completion.choices[0].message.content
         parsed = json.loads(result)
         
         # Enriquecer con análisis local
@@ -318,6 +317,6 @@ Priorización brutal: lo que salva la empresa primero."""
         return parsed
 
     except Exception as e:
-        fallback = _respuesta_fallback(diagnostico_data)
+        fallback = _respuesta_fallback(diagnostico_data, local)
         fallback["diagnostico_rapido"] = f"Error al analizar con OpenAI ({MODEL_NAME}): {str(e)}. " + fallback["diagnostico_rapido"]
         return fallback
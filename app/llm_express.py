@@ -1,24 +1,23 @@
 # app/llm_express.py
 # MENTHIA Express — 12 preguntas cerradas + 3 textos | 7 áreas | 2 capas | Anthropic
 
-import json
-import os
+import asyncio
 from datetime import datetime
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-from anthropic import Anthropic
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
 from app.area_interpretations import enrich_recomendaciones_por_area
+from app.json_stream import JsonStreamParser, parse_json_object
+from app.llm_anthropic import anthropic_configured, call_claude_text, resolve_model, stream_claude_text
+from app.llm_cache import cache_key, get_cache, get_flight
+from app.llm_limits import LLMOverloaded
+from app.percentiles import SECTORES, banda
+from app.streaming import error_payload
 
 load_dotenv()
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
-MODEL_NAME = os.getenv("ANTHROPIC_MODEL_NAME", "claude-sonnet-4-20250514").strip().strip('"').strip("'")
-
-client = Anthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
-
 S15 = [0, 25, 50, 75, 100]
 L15 = list("ABCDE")
 AREA_ORDER = ["es", "fi", "mk", "op", "ta", "te", "ec"]
@@ -48,30 +47,6 @@ QUESTION_MC: List[Tuple[str, str]] = [
     ("q12", "ec"),
 ]
 
-PCTL: Dict[str, List[int]] = {
-    "Servicios|Micro": [36, 50, 70],
-    "Servicios|Pequeña": [40, 55, 75],
-    "Servicios|Mediana": [45, 60, 78],
-    "Servicios|Grande": [50, 65, 80],
-    "Comercio|Micro": [34, 49, 69],
-    "Comercio|Pequeña": [38, 52, 72],
-    "Comercio|Mediana": [42, 58, 76],
-    "Comercio|Grande": [48, 64, 82],
-    "Tecnología|Micro": [40, 54, 72],
-    "Tecnología|Pequeña": [42, 56, 74],
-    "Tecnología|Mediana": [46, 62, 79],
-    "Tecnología|Grande": [50, 66, 82],
-    "Agroindustria|Micro": [35, 50, 70],
-    "Agroindustria|Pequeña": [38, 53, 72],
-    "Agroindustria|Mediana": [42, 58, 76],
-    "Agroindustria|Grande": [48, 64, 80],
-    "Industria|Micro": [38, 53, 73],
-    "Industria|Pequeña": [40, 55, 74],
-    "Industria|Mediana": [44, 60, 78],
-    "Industria|Grande": [50, 65, 82],
-}
-
-
 def _tamano_empresa(n_emp: Any) -> str:
     if n_emp is None:
         return "Micro"
@@ -122,13 +97,7 @@ def _mc_index(raw: Any) -> int:
 
 def calcular_express(data: Dict[str, Any]) -> Dict[str, Any]:
     sector = str(data.get("sector") or "Servicios").strip()
-    if sector not in (
-        "Servicios",
-        "Comercio",
-        "Tecnología",
-        "Agroindustria",
-        "Industria",
-    ):
+    if sector not in SECTORES:
         sector = "Servicios"
 
     empresa = str(data.get("nombreEmpresa") or data.get("empresa") or "Mi Empresa").strip() or "Mi Empresa"
@@ -180,15 +149,7 @@ def calcular_express(data: Dict[str, Any]) -> Dict[str, Any]:
             }
 
     idx = round(sum(d["calificacion"] for d in det) / len(det), 2)
-    pt = PCTL.get(f"{sector}|{tam}") or [36, 50, 70]
-    if idx <= pt[0]:
-        c1 = "Deficiente"
-    elif idx <= pt[1]:
-        c1 = "Promedio"
-    elif idx <= pt[2]:
-        c1 = "Bueno"
-    else:
-        c1 = "Líder"
+    c1 = banda(idx, sector, tam)
 
     vn = [d["valor_numerico"] for d in det]
     c2i = round(sum(vn) / len(vn), 2) if vn else 0.0
@@ -413,51 +374,33 @@ def _fallback_ai(calc: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _parse_json_text(txt: str) -> Dict[str, Any]:
-    t = (txt or "").strip()
-    if t.startswith("```json"):
-        t = t[7:]
-    if t.startswith("```"):
-        t = t[3:]
-    if t.endswith("```"):
-        t = t[:-3]
-    return json.loads(t.strip())
+def _clave_cache(calc: Dict[str, Any]) -> str:
+    # calc ya trae respuestas normalizadas, textos y fecha: todo lo que ve el prompt.
+    return cache_key("express", calc, model=resolve_model(), system_prompt=EXPRESS_SYSTEM)
 
 
-async def analizar_diagnostico_express(data: Dict[str, Any]) -> Dict[str, Any]:
-    if not isinstance(data, dict):
-        raise HTTPException(400, "Body inválido")
+def _salida_fallback(calc: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+    print(f"[llm_express] ERROR: {e}")
+    out = dict(calc)
+    fb = _fallback_ai(calc)
+    fb["resumen_ejecutivo"] = f"(Fallback por error LLM: {e}) " + fb["resumen_ejecutivo"]
+    out.update(fb)
+    out["llm_mode"] = "fallback_error"
+    return out
 
-    calc = calcular_express(data)
-    resp = data.get("respuestas") or {}
 
-    if not ANTHROPIC_API_KEY or not client:
-        out = dict(calc)
-        out.update(_fallback_ai(calc))
-        out["llm_mode"] = "fallback_sin_anthropic"
-        return out
+def _salida_reglas(calc: Dict[str, Any], llm_mode: str) -> Dict[str, Any]:
+    out = dict(calc)
+    out.update(_fallback_ai(calc))
+    out["llm_mode"] = llm_mode
+    return out
+
 
-    user_msg = _build_user_context(calc, resp)
+def _salida_sin_anthropic(calc: Dict[str, Any]) -> Dict[str, Any]:
+    return _salida_reglas(calc, "fallback_sin_anthropic")
 
-    try:
-        response = client.messages.create(
-            model=MODEL_NAME,
-            system=EXPRESS_SYSTEM,
-            max_tokens=3500,
-            temperature=0.4,
-            messages=[{"role": "user", "content": user_msg}],
-        )
-        content = (response.content[0].text or "{}").strip()
-        parsed = _parse_json_text(content)
-    except Exception as e:
-        print(f"[llm_express] ERROR: {e}")
-        out = dict(calc)
-        fb = _fallback_ai(calc)
-        fb["resumen_ejecutivo"] = f"(Fallback por error LLM: {e}) " + fb["resumen_ejecutivo"]
-        out.update(fb)
-        out["llm_mode"] = "fallback_error"
-        return out
 
+def _fusionar_resultado(calc: Dict[str, Any], parsed: Dict[str, Any]) -> Dict[str, Any]:
     acc = parsed.get("acciones_prioritarias") or []
     if isinstance(acc, list) and len(acc) > 4:
         parsed["acciones_prioritarias"] = acc[:4]
@@ -482,3 +425,119 @@ async def analizar_diagnostico_express(data: Dict[str, Any]) -> Dict[str, Any]:
         }
     )
     return out
+
+
+async def _analizar_con_modelo(calc: Dict[str, Any], resp: Dict[str, Any], key: str) -> Dict[str, Any]:
+    user_msg = _build_user_context(calc, resp)
+
+    try:
+        content = await call_claude_text(
+            EXPRESS_SYSTEM,
+            [{"role": "user", "content": user_msg}],
+            max_tokens=3500,
+            temperature=0.4,
+            tag="express",
+        )
+        if content is None:
+            raise RuntimeError("Anthropic no respondió")
+        parsed = parse_json_object(content)
+        if parsed is None:
+            raise ValueError("el modelo no devolvió JSON válido")
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        return _salida_fallback(calc, e)
+
+    out = _fusionar_resultado(calc, parsed)
+    get_cache().set(key, out)
+    return out
+
+
+async def analizar_diagnostico_express(data: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Body inválido")
+
+    calc = calcular_express(data)
+    resp = data.get("respuestas") or {}
+
+    if not anthropic_configured():
+        return _salida_sin_anthropic(calc)
+
+    key = _clave_cache(calc)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
+
+    return await get_flight().do(key, lambda: _analizar_con_modelo(calc, resp, key))
+
+
+def analizar_diagnostico_express_fast(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Reporte por reglas, sin modelo (``mode=fast``)."""
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Body inválido")
+    return _salida_reglas(calcular_express(data), "fast")
+
+
+def analizar_diagnostico_express_stream(data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """Versión SSE. Valida y calcula antes de abrir el flujo para que un body
+    inválido siga respondiendo 400 en lugar de un evento de error."""
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Body inválido")
+
+    calc = calcular_express(data)
+    resp = data.get("respuestas") or {}
+
+    async def _events() -> AsyncIterator[Tuple[str, Any]]:
+        yield "scores", calc
+
+        if not anthropic_configured():
+            yield "result", _salida_sin_anthropic(calc)
+            return
+
+        cache = get_cache()
+        key = _clave_cache(calc)
+        cached = cache.get(key)
+        if cached is not None:
+            yield "result", cached
+            return
+
+        flight = get_flight()
+        shared = await flight.follow(key)
+        if shared is not None:
+            yield "result", shared
+            return
+
+        user_msg = _build_user_context(calc, resp)
+        fut = flight.begin(key)
+        out = None
+        try:
+            parser = JsonStreamParser()
+            async for chunk in stream_claude_text(
+                EXPRESS_SYSTEM,
+                [{"role": "user", "content": user_msg}],
+                max_tokens=3500,
+                temperature=0.4,
+                tag="express",
+            ):
+                yield "delta", {"text": chunk}
+                for path, value in parser.feed(chunk):
+                    yield "field", {"path": path, "value": value}
+            parsed = parser.close()
+            if parsed is None:
+                raise ValueError("el modelo no devolvió JSON válido")
+            out = _fusionar_resultado(calc, parsed)
+            cache.set(key, out)
+        except LLMOverloaded as e:
+            yield "error", error_payload(e)
+            return
+        except Exception as e:
+            yield "error", error_payload(e)
+            out = _salida_fallback(calc, e)
+        finally:
+            if out is None:
+                flight.finish(key, fut, error=asyncio.CancelledError())
+            else:
+                flight.finish(key, fut, out)
+        yield "result", out
+
+    return _events()
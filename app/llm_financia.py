@@ -1,16 +1,23 @@
-import os
+import asyncio
 import json
-from typing import Dict, Any
+from typing import Any, AsyncIterator, Dict, Tuple
 from fastapi import HTTPException
-from anthropic import Anthropic
 from dotenv import load_dotenv
 
-load_dotenv()
-
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
-MODEL_NAME = os.getenv("ANTHROPIC_MODEL_NAME", "claude-sonnet-4-5").strip().strip('"').strip("'")
+from app.financia_ratios import calcular_series, matriz_estados, ratios_por_periodo, ultimo_periodo
+from app.json_stream import JsonStreamParser, parse_json_object
+from app.llm_cache import cache_key, get_cache, get_flight
+from app.llm_limits import LLMOverloaded
+from app.prompt_compact import a_json, compactar, limpiar, registrar_ahorro
+from app.streaming import error_payload
+from app.llm_anthropic import (
+    anthropic_configured,
+    call_claude_text,
+    resolve_model,
+    stream_claude_text,
+)
 
-client = Anthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
+load_dotenv()
 
 # Legacy full F.I.N.A.N.C.I.A. agent (kept for backwards compatibility)
 SYSTEM_PROMPT = """Eres el Agente F.I.N.A.N.C.I.A.™ de MentHIA, un mentor financiero virtual especializado en transformar PyMEs mexicanas desordenadas en empresas estructuradas, confiables y financiables. Combinas el rigor de un analista de crédito bancario con la cercanía de un mentor que entiende el desorden real de los negocios mexicanos.
@@ -74,73 +81,14 @@ def safe_float(val, default=0.0):
 
 
 def calcular_ratios_locales(datos_financieros: Dict[str, Any]) -> Dict[str, Any]:
+    """Ratios del periodo más reciente (la serie completa está en ``calcular_series``)."""
     estados = datos_financieros.get("estados_financieros", [])
     if not estados:
         return {}
-    ultimo = estados[-1]
-    ingresos = safe_float(ultimo.get("ingresos", 0))
-    costo_ventas = safe_float(ultimo.get("costo_ventas", 0))
-    utilidad_neta = safe_float(ultimo.get("utilidad_neta", 0))
-    ebitda = safe_float(ultimo.get("ebitda", 0))
-    activo_circulante = safe_float(ultimo.get("activo_circulante", 0))
-    activo_total = safe_float(ultimo.get("activo_total", 0))
-    pasivo_circulante = safe_float(ultimo.get("pasivo_circulante", 0))
-    pasivo_total = safe_float(ultimo.get("pasivo_total", 0))
-    capital_contable = safe_float(ultimo.get("capital_contable", 0))
-    inventarios = safe_float(ultimo.get("inventarios", 0))
-    cuentas_por_cobrar = safe_float(ultimo.get("cuentas_por_cobrar", 0))
-    cuentas_por_pagar = safe_float(ultimo.get("cuentas_por_pagar", 0))
-    gastos_financieros = safe_float(ultimo.get("gastos_financieros", 0))
-    deuda_cp = safe_float(ultimo.get("deuda_bancaria_corto_plazo", 0))
-    deuda_lp = safe_float(ultimo.get("deuda_bancaria_largo_plazo", 0))
-
-    ratios: Dict[str, Any] = {}
-    ratios["liquidez_corriente"] = (activo_circulante / pasivo_circulante) if pasivo_circulante > 0 else 0
-    ratios["prueba_acida"] = ((activo_circulante - inventarios) / pasivo_circulante) if pasivo_circulante > 0 else 0
-    ratios["apalancamiento"] = (pasivo_total / capital_contable) if capital_contable > 0 else 0
-    ratios["endeudamiento"] = (pasivo_total / activo_total) if activo_total > 0 else 0
-    ratios["margen_bruto"] = ((ingresos - costo_ventas) / ingresos) if ingresos > 0 else 0
-    ratios["margen_ebitda"] = (ebitda / ingresos) if ingresos > 0 else 0
-    ratios["margen_neto"] = (utilidad_neta / ingresos) if ingresos > 0 else 0
-    ratios["ROA"] = (utilidad_neta / activo_total) if activo_total > 0 else 0
-    ratios["ROE"] = (utilidad_neta / capital_contable) if capital_contable > 0 else 0
-    ratios["DSO"] = (cuentas_por_cobrar / ingresos * 365) if ingresos > 0 else 0
-    ratios["DIO"] = (inventarios / costo_ventas * 365) if costo_ventas > 0 else 0
-    ratios["DPO"] = (cuentas_por_pagar / costo_ventas * 365) if costo_ventas > 0 else 0
-    ratios["ciclo_conversion_efectivo"] = ratios["DSO"] + ratios["DIO"] - ratios["DPO"]
-    amortizacion_estimada = (deuda_cp + deuda_lp) / 3
-    denominador_dscr = gastos_financieros + amortizacion_estimada
-    ratios["DSCR"] = (ebitda / denominador_dscr) if denominador_dscr > 0 else 0
-    ratios["cobertura_intereses"] = (ebitda / gastos_financieros) if gastos_financieros > 0 else 0
-    utilidades_retenidas = capital_contable
-    X1 = (activo_circulante - pasivo_circulante) / activo_total if activo_total > 0 else 0
-    X2 = utilidades_retenidas / activo_total if activo_total > 0 else 0
-    X3 = ebitda / activo_total if activo_total > 0 else 0
-    X4 = capital_contable / pasivo_total if pasivo_total > 0 else 0
-    X5 = ingresos / activo_total if activo_total > 0 else 0
-    z_score = 0.717 * X1 + 0.847 * X2 + 3.107 * X3 + 0.420 * X4 + 0.998 * X5
-    ratios["altman_z_score_privado"] = z_score
-    ratios["altman_componentes"] = {"X1": X1, "X2": X2, "X3": X3, "X4": X4, "X5": X5}
-    return ratios
-
-
-def _parse_json_text(content: str) -> Dict[str, Any]:
-    t = (content or "").strip()
-    if t.startswith("```json"):
-        t = t[7:]
-    if t.startswith("```"):
-        t = t[3:]
-    if t.endswith("```"):
-        t = t[:-3]
-    return json.loads(t.strip())
-
+    return ultimo_periodo(ratios_por_periodo(matriz_estados(estados)))
 
-async def _analizar_express_radiografia(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Narrativa únicamente; los scores ya vienen calculados (inyectados)."""
-    computed = data.get("computed") or {}
-    if not ANTHROPIC_API_KEY or not client:
-        raise HTTPException(status_code=500, detail="API Key de Anthropic no configurada.")
 
+def _prompt_radiografia(computed: Dict[str, Any]) -> str:
     index = computed.get("index")
     tier = computed.get("tier") or {}
     sub = computed.get("subindices") or {}
@@ -171,53 +119,207 @@ Riesgos críticos (respuestas en rojo):
 {red_list}
 """
     user_msg += "\nRedacta el JSON."
+    return user_msg
 
-    response = client.messages.create(
-        model=MODEL_NAME,
-        system=EXPRESS_NARRATIVE_SYSTEM,
-        max_tokens=1200,
-        temperature=0.4,
-        messages=[{"role": "user", "content": user_msg}],
-    )
-    content = (response.content[0].text or "{}").strip()
-    parsed = _parse_json_text(content)
+
+def _validar_radiografia(parsed: Dict[str, Any]) -> Dict[str, Any]:
     if not parsed.get("diagnostico") or not isinstance(parsed.get("recomendaciones"), list):
         raise HTTPException(status_code=500, detail="Narrativa Express inválida")
     return parsed
 
 
-async def analizar_diagnostico_financia(data: Dict[str, Any]) -> Dict[str, Any]:
-    if data.get("mode") == "financia_express_radiografia" or data.get("scores_inyectados"):
-        return await _analizar_express_radiografia(data)
+def _datos_sin_estados(data: Dict[str, Any]) -> Dict[str, Any]:
+    """``data`` sin los estados financieros crudos (van resumidos en la serie)."""
+    datos_financieros = data.get("datos_financieros")
+    if not isinstance(datos_financieros, dict) or "estados_financieros" not in datos_financieros:
+        return data
+    resto = {k: v for k, v in datos_financieros.items() if k != "estados_financieros"}
+    return {**data, "datos_financieros": resto}
+
 
-    if not ANTHROPIC_API_KEY or not client:
+def _prompt_completo(
+    data: Dict[str, Any], ratios_precalculados: Dict[str, Any], series: Dict[str, Any]
+) -> str:
+    datos = compactar(_datos_sin_estados(data))
+    registrar_ahorro("financia", json.dumps(data, indent=2, ensure_ascii=False), datos)
+    return f"""A continuación se presentan los datos recolectados del usuario (los estados financieros van resumidos en la serie de abajo):
+{datos}
+
+Ratios financieros calculados pre-procesados (periodo más reciente):
+{a_json(ratios_precalculados)}
+
+Serie financiera por periodo (del más antiguo al más reciente; montos clave, ratios, variaciones interanuales, CAGR y pendiente de tendencia):
+{a_json(series)}
+
+Con base en la instrucción principal del Agente F.I.N.A.N.C.I.A., las reglas de decisión, y la base de conocimiento, genera el JSON del diagnóstico."""
+
+
+def _es_radiografia(data: Dict[str, Any]) -> bool:
+    return data.get("mode") == "financia_express_radiografia" or bool(data.get("scores_inyectados"))
+
+
+def _clave_cache(data: Dict[str, Any]) -> str:
+    if _es_radiografia(data):
+        return cache_key(
+            "financia_express", data.get("computed") or {},
+            model=resolve_model(), system_prompt=EXPRESS_NARRATIVE_SYSTEM,
+        )
+    # Misma limpieza que el prompt (sin userId/createdAt ni vacíos); los estados
+    # financieros se quedan porque de ellos salen los ratios y la serie.
+    return cache_key("financia", limpiar(data), model=resolve_model(), system_prompt=SYSTEM_PROMPT)
+
+
+async def _radiografia_con_modelo(computed: Dict[str, Any], key: str) -> Dict[str, Any]:
+    content = await call_claude_text(
+        EXPRESS_NARRATIVE_SYSTEM,
+        [{"role": "user", "content": _prompt_radiografia(computed)}],
+        max_tokens=1200,
+        temperature=0.4,
+        tag="financia_express",
+    )
+    if content is None:
+        raise HTTPException(status_code=502, detail="Anthropic no respondió")
+    parsed = _validar_radiografia(parse_json_object(content) or {})
+    get_cache().set(key, parsed)
+    return parsed
+
+
+async def _analizar_express_radiografia(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Narrativa únicamente; los scores ya vienen calculados (inyectados)."""
+    computed = data.get("computed") or {}
+    if not anthropic_configured():
         raise HTTPException(status_code=500, detail="API Key de Anthropic no configurada.")
 
-    print(f"[llm_financia] Analizando empresa con {MODEL_NAME}")
+    key = _clave_cache(data)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
 
-    datos_financieros = data.get("datos_financieros", {})
-    ratios_precalculados = calcular_ratios_locales(datos_financieros)
+    return await get_flight().do(key, lambda: _radiografia_con_modelo(computed, key))
 
-    user_msg = f"""A continuación se presentan los datos crudos recolectados del usuario:
-{json.dumps(data, indent=2, ensure_ascii=False)}
 
-Ratios financieros calculados pre-procesados:
-{json.dumps(ratios_precalculados, indent=2, ensure_ascii=False)}
+async def _financia_con_modelo(data: Dict[str, Any], key: str) -> Dict[str, Any]:
+    print(f"[llm_financia] Analizando empresa con {resolve_model()}")
 
-Con base en la instrucción principal del Agente F.I.N.A.N.C.I.A., las reglas de decisión, y la base de conocimiento, genera el JSON del diagnóstico."""
+    datos_financieros = data.get("datos_financieros", {})
+    ratios_precalculados = calcular_ratios_locales(datos_financieros)
+    user_msg = _prompt_completo(data, ratios_precalculados, calcular_series(datos_financieros))
 
     try:
-        response = client.messages.create(
-            model=MODEL_NAME,
-            system=SYSTEM_PROMPT,
+        content = await call_claude_text(
+            SYSTEM_PROMPT,
+            [{"role": "user", "content": user_msg}],
             max_tokens=8000,
             temperature=0.3,
-            messages=[{"role": "user", "content": user_msg}],
+            tag="financia",
         )
-
-        content = (response.content[0].text or "{}").strip()
-        return _parse_json_text(content)
-
+        if content is None:
+            raise RuntimeError("Anthropic no respondió")
+        parsed = parse_json_object(content)
+        if parsed is None:
+            raise ValueError("el modelo no devolvió JSON válido")
+        get_cache().set(key, parsed)
+        return parsed
+
+    except LLMOverloaded:
+        raise
     except Exception as e:
         print(f"[llm_financia] ERROR: {e}")
         raise HTTPException(status_code=500, detail=f"Error al procesar el diagnóstico F.I.N.A.N.C.I.A.: {e}")
+
+
+async def analizar_diagnostico_financia(data: Dict[str, Any]) -> Dict[str, Any]:
+    if _es_radiografia(data):
+        return await _analizar_express_radiografia(data)
+
+    if not anthropic_configured():
+        raise HTTPException(status_code=500, detail="API Key de Anthropic no configurada.")
+
+    key = _clave_cache(data)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
+
+    return await get_flight().do(key, lambda: _financia_con_modelo(data, key))
+
+
+def analizar_diagnostico_financia_stream(data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """Versión SSE: ``scores`` con los ratios locales (o los índices inyectados),
+    luego el texto del modelo y el JSON final. F.I.N.A.N.C.I.A. no tiene
+    respaldo local, así que un fallo del modelo termina en un evento ``error``."""
+    if not anthropic_configured():
+        raise HTTPException(status_code=500, detail="API Key de Anthropic no configurada.")
+
+    if _es_radiografia(data):
+        scores = data.get("computed") or {}
+        system, user_msg, max_tokens, temperature = (
+            EXPRESS_NARRATIVE_SYSTEM, _prompt_radiografia(scores), 1200, 0.4,
+        )
+    else:
+        print(f"[llm_financia] Analizando empresa con {resolve_model()} (stream)")
+        datos_financieros = data.get("datos_financieros", {})
+        scores = calcular_ratios_locales(datos_financieros)
+        system, user_msg, max_tokens, temperature = (
+            SYSTEM_PROMPT,
+            _prompt_completo(data, scores, calcular_series(datos_financieros)),
+            8000,
+            0.3,
+        )
+
+    cache = get_cache()
+    flight = get_flight()
+    key = _clave_cache(data)
+
+    async def _events() -> AsyncIterator[Tuple[str, Any]]:
+        yield "scores", scores
+        cached = cache.get(key)
+        if cached is not None:
+            yield "result", cached
+            return
+        try:
+            shared = await flight.follow(key)
+        except HTTPException as e:
+            yield "error", error_payload(e)
+            return
+        if shared is not None:
+            yield "result", shared
+            return
+
+        fut = flight.begin(key)
+        parsed = None
+        error: BaseException = asyncio.CancelledError()
+        try:
+            parser = JsonStreamParser()
+            async for chunk in stream_claude_text(
+                system,
+                [{"role": "user", "content": user_msg}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                tag="financia_express" if _es_radiografia(data) else "financia",
+            ):
+                yield "delta", {"text": chunk}
+                for path, value in parser.feed(chunk):
+                    yield "field", {"path": path, "value": value}
+            parsed = parser.close()
+            if _es_radiografia(data):
+                parsed = _validar_radiografia(parsed or {})
+            elif parsed is None:
+                raise ValueError("el modelo no devolvió JSON válido")
+            cache.set(key, parsed)
+        except HTTPException as e:
+            parsed, error = None, e
+        except Exception as e:
+            print(f"[llm_financia] ERROR: {e}")
+            parsed = None
+            error = HTTPException(status_code=500, detail=f"Error al procesar el diagnóstico F.I.N.A.N.C.I.A.: {e}")
+        finally:
+            if parsed is None:
+                flight.finish(key, fut, error=error)
+            else:
+                flight.finish(key, fut, parsed)
+        if parsed is None:
+            yield "error", error_payload(error)
+            return
+        yield "result", parsed
+
+    return _events()
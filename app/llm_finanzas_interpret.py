@@ -2,19 +2,15 @@
 # Interpretación narrativa del módulo Análisis financiero (MentHIA web) — Anthropic, misma credencial que express/general.
 
 import json
-import os
 from typing import Any, Dict
 
-from anthropic import Anthropic
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
-load_dotenv()
-
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
-MODEL_NAME = os.getenv("ANTHROPIC_MODEL_NAME", "claude-sonnet-4-20250514").strip().strip('"').strip("'")
+from app.llm_anthropic import anthropic_configured, call_claude_text, resolve_model
+from app.llm_limits import LLMOverloaded
 
-client = Anthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
+load_dotenv()
 
 SYSTEM = """Eres un analista financiero senior para PYME en español (México/LATAM), integrado en MentHIA.
 
@@ -39,7 +35,7 @@ async def interpretar_finanzas_narrativa(payload: Dict[str, Any]) -> Dict[str, A
     if len(raw) > 48_000:
         raise HTTPException(400, "payload demasiado grande")
 
-    if not client:
+    if not anthropic_configured():
         return {
             "ok": True,
             "interpretacion": (
@@ -51,30 +47,34 @@ async def interpretar_finanzas_narrativa(payload: Dict[str, Any]) -> Dict[str, A
         }
 
     user_msg = f"Datos calculados en la app (JSON). Interpreta:\n\n{raw}"
+    model_name = resolve_model()
 
     try:
-        response = client.messages.create(
-            model=MODEL_NAME,
-            system=SYSTEM,
+        reply = await call_claude_text(
+            SYSTEM,
+            [{"role": "user", "content": user_msg}],
             max_tokens=2048,
             temperature=0.35,
-            messages=[{"role": "user", "content": user_msg}],
+            tag="finanzas_interpret",
         )
-        block = response.content[0]
-        text = (getattr(block, "text", None) or "").strip()
+        if reply is None:
+            raise RuntimeError("ningún modelo Claude respondió")
+        text = reply.strip()
         if not text:
             return {
                 "ok": True,
                 "interpretacion": "Claude devolvió una respuesta vacía. Intenta de nuevo más tarde.",
-                "modelo": MODEL_NAME,
+                "modelo": model_name,
                 "fallback": True,
             }
         return {
             "ok": True,
             "interpretacion": text,
-            "modelo": MODEL_NAME,
+            "modelo": model_name,
             "fallback": False,
         }
+    except LLMOverloaded:
+        raise
     except Exception as e:
         print(f"[llm_finanzas_interpret] ERROR: {e}")
         return {
@@ -83,6 +83,6 @@ async def interpretar_finanzas_narrativa(payload: Dict[str, Any]) -> Dict[str, A
                 f"No se pudo generar la interpretación con Claude. Revisa ANTHROPIC_API_KEY, modelo y cuotas. "
                 f"Detalle: {e}"
             ),
-            "modelo": MODEL_NAME,
+            "modelo": model_name,
             "fallback": True,
         }
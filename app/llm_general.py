@@ -5,19 +5,25 @@
 # Capa 1: Percentiles LATAM por sector/tamaño
 # Capa 2: Índice global por sección (0.00–3.00)
 
-import os
-import json
-from typing import Dict, Any, List, Tuple
+import asyncio
+from typing import Dict, Any, AsyncIterator, List, Tuple
 from fastapi import HTTPException
-from anthropic import Anthropic
 from dotenv import load_dotenv
 
-load_dotenv()
-
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "").strip().strip('"').strip("'")
-MODEL_NAME = os.getenv("ANTHROPIC_MODEL_NAME", "claude-sonnet-4-20250514").strip().strip('"').strip("'")
+from app.json_stream import JsonStreamParser
+from app.llm_cache import cache_key, get_cache, get_flight
+from app.llm_limits import LLMOverloaded
+from app.percentiles import PERCENTILES_POR_SECTOR, SECTOR_DEFAULT, banda
+from app.prompt_compact import compactar, registrar_ahorro
+from app.streaming import error_payload
+from app.llm_anthropic import (
+    anthropic_configured,
+    call_claude_json,
+    resolve_model,
+    stream_claude_text,
+)
 
-client = Anthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
+load_dotenv()
 
 
 # =====================================================
@@ -38,38 +44,7 @@ NUMERO_A_PUNTOS_Q15 = {"1": 0, "2": 25, "3": 50, "4": 75, "5": 100}
 NUMERO_A_PUNTOS_Q6 = {"1": 0, "2": 5, "3": 10}
 MAX_INTERNO = 110  # 100 + 10
 
-PERCENTILES_POR_SECTOR = {
-    "Servicios": {
-        "Micro":   [(0, 36, "Deficiente"), (37, 50, "Promedio"), (51, 70, "Bueno"), (71, 100, "Líder")],
-        "Pequeña": [(0, 40, "Deficiente"), (41, 55, "Promedio"), (56, 75, "Bueno"), (76, 100, "Líder")],
-        "Mediana": [(0, 45, "Deficiente"), (46, 60, "Promedio"), (61, 78, "Bueno"), (79, 100, "Líder")],
-        "Grande":  [(0, 50, "Deficiente"), (51, 65, "Promedio"), (66, 80, "Bueno"), (81, 100, "Líder")],
-    },
-    "Comercio": {
-        "Micro":   [(0, 34, "Deficiente"), (35, 49, "Promedio"), (50, 69, "Bueno"), (70, 100, "Líder")],
-        "Pequeña": [(0, 38, "Deficiente"), (39, 52, "Promedio"), (53, 72, "Bueno"), (73, 100, "Líder")],
-        "Mediana": [(0, 42, "Deficiente"), (43, 58, "Promedio"), (59, 76, "Bueno"), (77, 100, "Líder")],
-        "Grande":  [(0, 48, "Deficiente"), (49, 64, "Promedio"), (65, 82, "Bueno"), (83, 100, "Líder")],
-    },
-    "Tecnología": {
-        "Micro":   [(0, 40, "Deficiente"), (41, 54, "Promedio"), (55, 72, "Bueno"), (73, 100, "Líder")],
-        "Pequeña": [(0, 42, "Deficiente"), (43, 56, "Promedio"), (57, 74, "Bueno"), (75, 100, "Líder")],
-        "Mediana": [(0, 46, "Deficiente"), (47, 62, "Promedio"), (63, 79, "Bueno"), (80, 100, "Líder")],
-        "Grande":  [(0, 50, "Deficiente"), (51, 66, "Promedio"), (67, 82, "Bueno"), (83, 100, "Líder")],
-    },
-    "Agroindustria": {
-        "Micro":   [(0, 35, "Deficiente"), (36, 50, "Promedio"), (51, 70, "Bueno"), (71, 100, "Líder")],
-        "Pequeña": [(0, 38, "Deficiente"), (39, 53, "Promedio"), (54, 72, "Bueno"), (73, 100, "Líder")],
-        "Mediana": [(0, 42, "Deficiente"), (43, 58, "Promedio"), (59, 76, "Bueno"), (77, 100, "Líder")],
-        "Grande":  [(0, 48, "Deficiente"), (49, 64, "Promedio"), (65, 80, "Bueno"), (81, 100, "Líder")],
-    },
-    "Industria": {
-        "Micro":   [(0, 38, "Deficiente"), (39, 53, "Promedio"), (54, 73, "Bueno"), (74, 100, "Líder")],
-        "Pequeña": [(0, 40, "Deficiente"), (41, 55, "Promedio"), (56, 74, "Bueno"), (75, 100, "Líder")],
-        "Mediana": [(0, 44, "Deficiente"), (45, 60, "Promedio"), (61, 78, "Bueno"), (79, 100, "Líder")],
-        "Grande":  [(0, 50, "Deficiente"), (51, 65, "Promedio"), (66, 82, "Bueno"), (83, 100, "Líder")],
-    },
-}
+# Percentiles LATAM por sector/tamaño (Capa 1): índice compartido en app/percentiles.py.
 
 SECCION_VALOR = {"Deficiente": 0, "Promedio": 1, "Bueno": 2, "Líder": 3}
 
@@ -99,18 +74,13 @@ def _clasificar_seccion(calificacion_100: float) -> str:
     return "Líder"
 
 
+def _sector_percentil(sector: str) -> str:
+    sector_n = (sector or SECTOR_DEFAULT).strip().capitalize()
+    return sector_n if sector_n in PERCENTILES_POR_SECTOR else SECTOR_DEFAULT
+
+
 def _diagnostico_percentil(indice: float, sector: str, tamano: str) -> str:
-    sector_n = (sector or "Servicios").strip().capitalize()
-    if sector_n not in PERCENTILES_POR_SECTOR:
-        sector_n = "Servicios"
-    tabla = PERCENTILES_POR_SECTOR.get(sector_n, {})
-    pctls = tabla.get(tamano) or tabla.get("Micro")
-    if not pctls:
-        return "Sin referencia"
-    for inicio, fin, clasif in pctls:
-        if inicio <= indice <= fin:
-            return clasif
-    return "Sin clasificar"
+    return banda(indice, _sector_percentil(sector), tamano)
 
 
 def _diagnostico_global(clasificaciones: List[str]) -> Tuple[float, str]:
@@ -366,8 +336,13 @@ Para CADA UNA de las 7 secciones:
 # UTILIDADES
 # =====================================================
 
+# Ya van en el encabezado del prompt o codificadas en las calificaciones por sección.
+_CLAVES_EN_PUNTAJES = {"respuestas", "nombreEmpresa", "sector", "sectorNormalizado", "numeroEmpleados"}
+
+
 def _fmt_datos(d: Dict[str, Any]) -> str:
-    return "\n".join(f"- {k}: {v}" for k, v in d.items() if k not in {"userId","createdAt"} and v not in ("", None))
+    """Datos del cuestionario que no están ya en los puntajes (textos, contexto)."""
+    return compactar(d, excluir=_CLAVES_EN_PUNTAJES, prefijos_excluir=PREFIJOS)
 
 
 def _fallback(d: Dict[str, Any]) -> Dict[str, Any]:
@@ -529,21 +504,15 @@ def _convertir_formato(data: Dict[str, Any]) -> Dict[str, Any]:
 # ANALIZADOR PRINCIPAL
 # =====================================================
 
-async def analizar_diagnostico_general(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
+def _normalizar_entrada(diagnostico_data: Any) -> Dict[str, Any]:
     if not isinstance(diagnostico_data, dict):
         diagnostico_data = {}
-
     try: diagnostico_data = _convertir_formato(diagnostico_data)
     except: pass
+    return diagnostico_data
 
-    if not ANTHROPIC_API_KEY or not client:
-        return _fallback(diagnostico_data)
-
-    print(f"[llm_general] Análisis con {MODEL_NAME} (7 secciones)")
 
-    calc = _calcular_modelo(diagnostico_data)
-    try: corrs = _correlaciones(diagnostico_data)
-    except: corrs = {}
+def _construir_prompt(diagnostico_data: Dict[str, Any], calc: Dict[str, Any], corrs: Dict[str, Any]) -> str:
     try: datos_fmt = _fmt_datos(diagnostico_data)
     except: datos_fmt = str(diagnostico_data)
 
@@ -573,71 +542,180 @@ Calificaciones por sección (0–100):"""
     if corrs.get("brecha_maxima", 0) > 0:
         ctx_corr += f"\nBrecha máxima: {corrs['brecha_maxima']}"
 
-    user_msg = f"""Analiza este diagnóstico empresarial.
+    registrar_ahorro(
+        "general",
+        "\n".join(
+            f"- {k}: {v}" for k, v in diagnostico_data.items()
+            if k not in {"userId", "createdAt"} and v not in ("", None)
+        ),
+        datos_fmt,
+    )
+    return f"""Analiza este diagnóstico empresarial.
 {ctx}{ctx_corr}
 
-=== DATOS CRUDOS ===
+=== DATOS ADICIONALES DEL CUESTIONARIO ===
 {datos_fmt}
 
 Genera diagnóstico completo: recomendación general potente + recomendación por cada una de las 7 secciones.
 Responde SOLO con JSON."""
 
+
+def _fusionar_resultado(parsed: Dict[str, Any], calc: Dict[str, Any], corrs: Dict[str, Any]) -> Dict[str, Any]:
+    # Validaciones
+    def _lst(x): return x[:15] if isinstance(x, list) else []
+    parsed["recomendaciones_por_seccion"] = _lst(parsed.get("recomendaciones_por_seccion", []))
+    parsed["plan_30_dias"] = _lst(parsed.get("plan_30_dias", []))
+    parsed["riesgos_sistemicos"] = _lst(parsed.get("riesgos_sistemicos", []))
+    parsed["recomendaciones_innovadoras"] = _lst(parsed.get("recomendaciones_innovadoras", []))
+
+    # Forzar datos algorítmicos en recomendaciones por sección
+    recs_dict = {r.get("seccion", ""): r for r in parsed.get("recomendaciones_por_seccion", [])}
+    recs_final = []
+    for det in calc.get("detalle_secciones", []):
+        rec = recs_dict.get(det["nombre"], {})
+        rec["seccion"] = det["nombre"]
+        rec["calificacion"] = det["calificacion"]
+        rec["clasificacion"] = det["clasificacion"]
+        rec.setdefault("diagnostico_seccion", f"Área con nivel {det['clasificacion'].lower()}.")
+        rec.setdefault("recomendacion", "Implementar medición y control.")
+        rec.setdefault("prioridad", "Crítica" if det["calificacion"] < 25 else ("Alta" if det["calificacion"] < 50 else "Media"))
+        rec.setdefault("quick_win", "Definir 3 métricas clave.")
+        recs_final.append(rec)
+    parsed["recomendaciones_por_seccion"] = recs_final
+
+    # Fusionar cálculos algorítmicos
+    parsed.update({
+        "puntuacion_madurez_promedio": calc["indice_menthia_0_100"],
+        "nivel_madurez_general": calc["nivel_madurez"],
+        "indice_menthia_0_100": calc["indice_menthia_0_100"],
+        "diagnostico_capa1_percentil": calc["capa1_percentil"],
+        "diagnostico_capa2_indice": calc["capa2_indice"],
+        "diagnostico_capa2_diagnostico": calc["capa2_diagnostico"],
+        "calificaciones_por_seccion": calc["calificaciones"],
+        "clasificacion_por_seccion": calc["clasificaciones"],
+        "detalle_secciones": calc["detalle_secciones"],
+        "estado_madurez": calc["estado_madurez"],
+        "sector": calc["sector"], "tamano": calc["tamano"],
+    })
+    if corrs.get("correlaciones"):
+        parsed["correlaciones_detectadas"] = corrs["correlaciones"]
+    return parsed
+
+
+def _clave_cache(diagnostico_data: Dict[str, Any], model_name: str) -> str:
+    # userId/createdAt no llegan al prompt; el resto sí (directamente o vía puntajes).
+    entrada = {k: v for k, v in diagnostico_data.items() if k not in {"userId", "createdAt"}}
+    return cache_key("general", entrada, model=model_name, system_prompt=MENTHIA_SYSTEM_PROMPT)
+
+
+def _fallback_por_error(diagnostico_data: Dict[str, Any], model_name: str, e: Exception) -> Dict[str, Any]:
+    print(f"[llm_general] ERROR: {e}")
+    fb = _fallback(diagnostico_data)
+    fb["resumen_ejecutivo"] = f"Error LLM ({model_name}): {e}. " + fb["resumen_ejecutivo"]
+    return fb
+
+
+async def _analizar_con_modelo(diagnostico_data: Dict[str, Any], model_name: str, key: str) -> Dict[str, Any]:
+    print(f"[llm_general] Análisis con {model_name} (7 secciones)")
+
+    calc = _calcular_modelo(diagnostico_data)
+    try: corrs = _correlaciones(diagnostico_data)
+    except: corrs = {}
+    user_msg = _construir_prompt(diagnostico_data, calc, corrs)
+
     try:
-        response = client.messages.create(
-            model=MODEL_NAME, system=MENTHIA_SYSTEM_PROMPT,
-            max_tokens=6000, temperature=0.35,
-            messages=[{"role": "user", "content": user_msg}],
+        parsed = await call_claude_json(
+            MENTHIA_SYSTEM_PROMPT, user_msg, max_tokens=6000, temperature=0.35, tag="general",
         )
-        content = (response.content[0].text or "{}").strip()
-        if content.startswith("```json"): content = content[7:]
-        if content.startswith("```"): content = content[3:]
-        if content.endswith("```"): content = content[:-3]
-
-        parsed = json.loads(content.strip())
-
-        # Validaciones
-        def _lst(x): return x[:15] if isinstance(x, list) else []
-        parsed["recomendaciones_por_seccion"] = _lst(parsed.get("recomendaciones_por_seccion", []))
-        parsed["plan_30_dias"] = _lst(parsed.get("plan_30_dias", []))
-        parsed["riesgos_sistemicos"] = _lst(parsed.get("riesgos_sistemicos", []))
-        parsed["recomendaciones_innovadoras"] = _lst(parsed.get("recomendaciones_innovadoras", []))
-
-        # Forzar datos algorítmicos en recomendaciones por sección
-        recs_dict = {r.get("seccion", ""): r for r in parsed.get("recomendaciones_por_seccion", [])}
-        recs_final = []
-        for det in calc.get("detalle_secciones", []):
-            rec = recs_dict.get(det["nombre"], {})
-            rec["seccion"] = det["nombre"]
-            rec["calificacion"] = det["calificacion"]
-            rec["clasificacion"] = det["clasificacion"]
-            rec.setdefault("diagnostico_seccion", f"Área con nivel {det['clasificacion'].lower()}.")
-            rec.setdefault("recomendacion", "Implementar medición y control.")
-            rec.setdefault("prioridad", "Crítica" if det["calificacion"] < 25 else ("Alta" if det["calificacion"] < 50 else "Media"))
-            rec.setdefault("quick_win", "Definir 3 métricas clave.")
-            recs_final.append(rec)
-        parsed["recomendaciones_por_seccion"] = recs_final
-
-        # Fusionar cálculos algorítmicos
-        parsed.update({
-            "puntuacion_madurez_promedio": calc["indice_menthia_0_100"],
-            "nivel_madurez_general": calc["nivel_madurez"],
-            "indice_menthia_0_100": calc["indice_menthia_0_100"],
-            "diagnostico_capa1_percentil": calc["capa1_percentil"],
-            "diagnostico_capa2_indice": calc["capa2_indice"],
-            "diagnostico_capa2_diagnostico": calc["capa2_diagnostico"],
-            "calificaciones_por_seccion": calc["calificaciones"],
-            "clasificacion_por_seccion": calc["clasificaciones"],
-            "detalle_secciones": calc["detalle_secciones"],
-            "estado_madurez": calc["estado_madurez"],
-            "sector": calc["sector"], "tamano": calc["tamano"],
-        })
-        if corrs.get("correlaciones"):
-            parsed["correlaciones_detectadas"] = corrs["correlaciones"]
+        if parsed is None:
+            raise ValueError("el modelo no devolvió JSON válido")
+        result = _fusionar_resultado(parsed, calc, corrs)
+        get_cache().set(key, result)
+        return result
+
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        return _fallback_por_error(diagnostico_data, model_name, e)
+
+
+async def analizar_diagnostico_general(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
+    diagnostico_data = _normalizar_entrada(diagnostico_data)
+
+    if not anthropic_configured():
+        return _fallback(diagnostico_data)
+
+    model_name = resolve_model()
+    key = _clave_cache(diagnostico_data, model_name)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
+
+    # Doble submit / dos pestañas: una sola llamada al modelo por clave.
+    return await get_flight().do(
+        key, lambda: _analizar_con_modelo(diagnostico_data, model_name, key)
+    )
+
+
+def analizar_diagnostico_general_fast(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Reporte por reglas, sin modelo (``mode=fast``)."""
+    return _fallback(_normalizar_entrada(diagnostico_data))
 
-        return parsed
 
+async def analizar_diagnostico_general_stream(diagnostico_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """Versión SSE: primero los puntajes precalculados, luego el texto y los campos
+    del modelo conforme se cierran, y al final el reporte fusionado."""
+    diagnostico_data = _normalizar_entrada(diagnostico_data)
+    calc = _calcular_modelo(diagnostico_data)
+    yield "scores", calc
+
+    if not anthropic_configured():
+        yield "result", _fallback(diagnostico_data)
+        return
+
+    model_name = resolve_model()
+    cache = get_cache()
+    key = _clave_cache(diagnostico_data, model_name)
+    cached = cache.get(key)
+    if cached is not None:
+        yield "result", cached
+        return
+
+    flight = get_flight()
+    shared = await flight.follow(key)
+    if shared is not None:
+        yield "result", shared
+        return
+
+    try: corrs = _correlaciones(diagnostico_data)
+    except: corrs = {}
+    user_msg = _construir_prompt(diagnostico_data, calc, corrs)
+
+    fut = flight.begin(key)
+    result = None
+    try:
+        parser = JsonStreamParser()
+        async for chunk in stream_claude_text(
+            MENTHIA_SYSTEM_PROMPT, [{"role": "user", "content": user_msg}],
+            max_tokens=6000, temperature=0.35, tag="general",
+        ):
+            yield "delta", {"text": chunk}
+            for path, value in parser.feed(chunk):
+                yield "field", {"path": path, "value": value}
+        parsed = parser.close()
+        if parsed is None:
+            raise ValueError("el modelo no devolvió JSON válido")
+        result = _fusionar_resultado(parsed, calc, corrs)
+        cache.set(key, result)
+    except LLMOverloaded as e:
+        yield "error", error_payload(e)
+        return
     except Exception as e:
-        print(f"[llm_general] ERROR: {e}")
-        fb = _fallback(diagnostico_data)
-        fb["resumen_ejecutivo"] = f"Error LLM ({MODEL_NAME}): {e}. " + fb["resumen_ejecutivo"]
-        return fb
+        yield "error", error_payload(e)
+        result = _fallback_por_error(diagnostico_data, model_name, e)
+    finally:
+        if result is None:
+            flight.finish(key, fut, error=asyncio.CancelledError())
+        else:
+            flight.finish(key, fut, result)
+    yield "result", result
@@ -1,7 +1,11 @@
 import os
-import httpx
 from dotenv import load_dotenv
 
+from app.chat_faq import faq_enabled, get_semantic_cache, namespace, record_tier
+from app.llm_circuit import counts_as_failure, get_breaker, models_probe
+from app.llm_clients import OPENAI_BASE_URL, XAI_BASE_URL, get_clients
+from app.text_match import KeywordMatcher
+
 # Carga variables de entorno
 load_dotenv()
 
@@ -126,17 +130,20 @@ QUICK_RESPONSES = {
 }
 
 
+_NAMESPACE = namespace("grok", SYSTEM_PROMPT)
+
+# La primera clave de QUICK_RESPONSES presente en el mensaje gana.
+_QUICK_MATCHER = KeywordMatcher((key, key) for key in QUICK_RESPONSES)
+
+
 def get_quick_response(message: str) -> str | None:
     """Busca respuesta rápida para preguntas frecuentes"""
-    msg = message.lower().strip()
-    for key, value in QUICK_RESPONSES.items():
-        if key in msg:
-            return value
-    return None
+    key = _QUICK_MATCHER.primero(message)
+    return QUICK_RESPONSES[key] if key else None
 
 
 # xAI (Grok) usa el mismo formato que OpenAI: chat/completions
-XAI_CHAT_URL = "https://api.x.ai/v1/chat/completions"
+XAI_CHAT_URL = f"{XAI_BASE_URL}/chat/completions"
 
 
 async def _chat_xai(message: str) -> str | None:
@@ -144,31 +151,40 @@ async def _chat_xai(message: str) -> str | None:
     api_key = os.getenv("XAI_API_KEY", "").strip().strip('"').strip("'")
     if not api_key:
         return None
+    breaker = get_breaker("xai", probe=models_probe("xai", XAI_BASE_URL, "XAI_API_KEY"))
+    if not breaker.allow():
+        return None
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.post(
-                XAI_CHAT_URL,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}",
-                },
-                json={
-                    "model": os.getenv("XAI_MODEL_NAME", "grok-2").strip().strip('"').strip("'"),
-                    "temperature": 0.7,
-                    "max_tokens": 400,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": message},
-                    ],
-                },
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
-            print(f"xAI/Grok error: {response.status_code} {response.text[:200]}")
-            return None
+        response = await get_clients().xai().post(
+            XAI_CHAT_URL,
+            timeout=20.0,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}",
+            },
+            json={
+                "model": os.getenv("XAI_MODEL_NAME", "grok-2").strip().strip('"').strip("'"),
+                "temperature": 0.7,
+                "max_tokens": 400,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": message},
+                ],
+            },
+        )
+        if response.status_code == 200:
+            data = response.json()
+            breaker.record_success()
+            return data["choices"][0]["message"]["content"].strip()
+        print(f"xAI/Grok error: {response.status_code} {response.text[:200]}")
+        if counts_as_failure(response.status_code):
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.release()
+        return None
     except Exception as e:
         print(f"xAI/Grok chat error: {e}")
+        breaker.record_failure(f"{type(e).__name__}: {e}")
         return None
 
 
@@ -177,31 +193,40 @@ async def _chat_openai(message: str) -> str | None:
     api_key = os.getenv("OPENAI_API_KEY", "").strip().strip('"').strip("'")
     if not api_key:
         return None
+    breaker = get_breaker("openai", probe=models_probe("openai", OPENAI_BASE_URL, "OPENAI_API_KEY"))
+    if not breaker.allow():
+        return None
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}",
-                },
-                json={
-                    "model": os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini").strip().strip('"').strip("'"),
-                    "temperature": 0.7,
-                    "max_tokens": 400,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": message},
-                    ],
-                },
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
-            print(f"OpenAI error: {response.status_code}")
-            return None
+        response = await get_clients().http("openai").post(
+            f"{OPENAI_BASE_URL}/chat/completions",
+            timeout=15.0,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}",
+            },
+            json={
+                "model": os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini").strip().strip('"').strip("'"),
+                "temperature": 0.7,
+                "max_tokens": 400,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": message},
+                ],
+            },
+        )
+        if response.status_code == 200:
+            data = response.json()
+            breaker.record_success()
+            return data["choices"][0]["message"]["content"].strip()
+        print(f"OpenAI error: {response.status_code}")
+        if counts_as_failure(response.status_code):
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.release()
+        return None
     except Exception as e:
         print(f"OpenAI chat error: {e}")
+        breaker.record_failure(f"{type(e).__name__}: {e}")
         return None
 
 
@@ -210,23 +235,33 @@ async def chat_grok(message: str) -> str:
     # 1. Respuesta rápida (instantánea)
     quick = get_quick_response(message)
     if quick:
+        record_tier("grok", "rapida")
         return quick
 
-    # 2. Preferir Grok (xAI) si hay XAI_API_KEY; si no, OpenAI
+    # 2. Respuesta previa del modelo a una pregunta parecida (app/chat_faq.py)
+    cache = get_semantic_cache() if faq_enabled() else None
+    if cache is not None:
+        cached = cache.get(_NAMESPACE, message)
+        if cached:
+            record_tier("grok", "aprendida")
+            return cached
+
+    # 3. Preferir Grok (xAI) si hay XAI_API_KEY; si no, OpenAI
     xai_key = os.getenv("XAI_API_KEY", "").strip().strip('"').strip("'")
     openai_key = os.getenv("OPENAI_API_KEY", "").strip().strip('"').strip("'")
 
+    reply = None
     if xai_key:
         reply = await _chat_xai(message)
-        if reply:
-            return reply
-        if openai_key:
+        if not reply and openai_key:
             reply = await _chat_openai(message)
-            if reply:
-                return reply
     elif openai_key:
         reply = await _chat_openai(message)
-        if reply:
-            return reply
+    if reply:
+        record_tier("grok", "llm")
+        if cache is not None:
+            cache.set(_NAMESPACE, message, reply)
+        return reply
 
+    record_tier("grok", "fallback")
     return "El asistente no está disponible. Por favor contacta a soporte: contacto@ment-hia.com"
@@ -1,7 +1,11 @@
 import os
-import httpx
 from dotenv import load_dotenv
 
+from app.chat_faq import faq_enabled, get_semantic_cache, namespace, record_tier
+from app.llm_circuit import counts_as_failure, get_breaker, models_probe
+from app.llm_clients import OPENAI_BASE_URL, get_clients
+from app.text_match import KeywordMatcher
+
 # Carga variables de entorno
 load_dotenv()
 
@@ -159,16 +163,16 @@ LOCAL_RESPONSES = {
 }
 
 
+_NAMESPACE = namespace("grok_ayuda", SYSTEM_PROMPT_AYUDA)
+
+# Las claves más largas (más específicas) tienen prioridad.
+_LOCAL_MATCHER = KeywordMatcher((key, key) for key in sorted(LOCAL_RESPONSES, key=len, reverse=True))
+
+
 def get_local_response(message: str) -> str | None:
     """Busca respuesta local instantánea"""
-    msg = message.lower().strip()
-    
-    # Buscar coincidencias exactas primero
-    for key in sorted(LOCAL_RESPONSES.keys(), key=len, reverse=True):
-        if key in msg:
-            return LOCAL_RESPONSES[key]
-    
-    return None
+    key = _LOCAL_MATCHER.primero(message)
+    return LOCAL_RESPONSES[key] if key else None
 
 
 async def chat_grok_ayuda(message: str) -> str:
@@ -177,34 +181,55 @@ async def chat_grok_ayuda(message: str) -> str:
     # 1. Intentar respuesta local (instantánea)
     local = get_local_response(message)
     if local:
+        record_tier("grok_ayuda", "local")
         return local
-    
-    # 2. Intentar OpenAI para respuestas más complejas
+
+    # 2. Respuesta previa del modelo a una pregunta parecida (app/chat_faq.py)
+    cache = get_semantic_cache() if faq_enabled() else None
+    if cache is not None:
+        cached = cache.get(_NAMESPACE, message)
+        if cached:
+            record_tier("grok_ayuda", "aprendida")
+            return cached
+
+    # 3. Intentar OpenAI para respuestas más complejas
     api_key = os.getenv("OPENAI_API_KEY", "").strip().strip('"').strip("'")
-    if api_key:
+    breaker = get_breaker("openai", probe=models_probe("openai", OPENAI_BASE_URL, "OPENAI_API_KEY"))
+    if api_key and breaker.allow():
         try:
-            async with httpx.AsyncClient(timeout=12.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {api_key}"
-                    },
-                    json={
-                        "model": os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini").strip().strip('"').strip("'"),
-                        "temperature": 0.5,
-                        "max_tokens": 200,
-                        "messages": [
-                            {"role": "system", "content": SYSTEM_PROMPT_AYUDA},
-                            {"role": "user", "content": message}
-                        ]
-                    }
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    return data["choices"][0]["message"]["content"].strip()
+            response = await get_clients().http("openai").post(
+                f"{OPENAI_BASE_URL}/chat/completions",
+                timeout=12.0,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {api_key}"
+                },
+                json={
+                    "model": os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini").strip().strip('"').strip("'"),
+                    "temperature": 0.5,
+                    "max_tokens": 200,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT_AYUDA},
+                        {"role": "user", "content": message}
+                    ]
+                }
+            )
+            if response.status_code == 200:
+                data = response.json()
+                breaker.record_success()
+                reply = data["choices"][0]["message"]["content"].strip()
+                record_tier("grok_ayuda", "llm")
+                if cache is not None and reply:
+                    cache.set(_NAMESPACE, message, reply)
+                return reply
+            if counts_as_failure(response.status_code):
+                breaker.record_failure(f"HTTP {response.status_code}")
+            else:
+                breaker.release()
         except Exception as e:
             print(f"OpenAI error: {e}")
+            breaker.record_failure(f"{type(e).__name__}: {e}")
     
-    # 3. Fallback inteligente
+    # 4. Fallback inteligente
+    record_tier("grok_ayuda", "fallback")
     return "Responde con honestidad para obtener recomendaciones precisas. Si tienes dudas sobre algún término específico, pregúntame y te explico con un ejemplo práctico."
@@ -0,0 +1,235 @@
+"""Control de admisión para las llamadas a proveedores LLM.
+
+Por proveedor: semáforo de concurrencia + token buckets de requests/min y
+tokens/min, con una cola de espera acotada y por prioridad (los diagnósticos
+pagados pasan antes que el chatbot de la landing). Si la cola está llena o la
+espera supera el máximo, se rechaza de inmediato con ``LLMOverloaded`` (503 +
+Retry-After) en lugar de acumular 429 y terminar en contenido de respaldo.
+
+Variables de entorno (PROVIDER = ANTHROPIC, OPENAI, ...):
+- LLM_<PROVIDER>_MAX_CONCURRENCY (16) — llamadas simultáneas.
+- LLM_<PROVIDER>_RPM (0 = sin límite) — requests por minuto.
+- LLM_<PROVIDER>_TPM (0 = sin límite) — tokens (entrada estimada + max_tokens) por minuto.
+- LLM_<PROVIDER>_QUEUE_MAX (64) — solicitudes en espera antes de rechazar.
+- LLM_<PROVIDER>_QUEUE_TIMEOUT_S (30) — espera máxima en cola.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import HTTPException
+
+# Menor número = mayor prioridad.
+PRIORITIES = {"diagnostic": 0, "chat": 1, "landing": 2}
+
+
+class LLMOverloaded(HTTPException):
+    def __init__(self, provider: str, retry_after: float) -> None:
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"Servicio de IA saturado ({provider}); reintenta en {self.retry_after} s.",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class TokenBucket:
+    """Capacidad ``per_minute`` que se rellena continuamente; 0 = ilimitado."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta poder tomar ``amount`` (0 si ya se puede)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+class ProviderLimiter:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        rpm: float = 0,
+        tpm: float = 0,
+        queue_max: int = 64,
+        queue_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = 0
+        self._waiters: list[tuple[int, int, asyncio.Future, int]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _blocked_for(self, tokens: int) -> Optional[float]:
+        """None si hay concurrencia libre; si no, segundos de espera por los buckets."""
+        if self.active >= self.max_concurrency:
+            return None
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _take(self, tokens: int) -> None:
+        self.active += 1
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def _retry_after(self) -> float:
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(1))
+        return max(wait, 2.0 * (len(self._waiters) + 1) / self.max_concurrency)
+
+    def check_admission(self) -> None:
+        """Rechazo rápido (sin esperar) si la cola ya está llena."""
+        if len(self._waiters) >= self.queue_max:
+            self.rejected += 1
+            raise LLMOverloaded(self.name, self._retry_after())
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Toma un lugar solo si no hay que esperar (p. ej. el respaldo en paralelo)."""
+        if self._waiters or self._blocked_for(tokens) != 0:
+            return False
+        self._take(tokens)
+        return True
+
+    async def acquire(self, priority: int, tokens: int) -> None:
+        if self.try_acquire(tokens):
+            return
+        self.check_admission()
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), fut, tokens)
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                return  # admitido justo al vencer
+            self._remove(entry)
+            self.rejected += 1
+            raise LLMOverloaded(self.name, self._retry_after())
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                self._remove(entry)
+            raise
+
+    def release(self) -> None:
+        self.active = max(0, self.active - 1)
+        self._dispatch()
+
+    def _remove(self, entry: tuple) -> None:
+        try:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+        entry[2].cancel()
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            _, _, fut, tokens = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            blocked = self._blocked_for(tokens)
+            if blocked is None:
+                return  # se reintenta en release()
+            if blocked > 0:
+                self._schedule(blocked)
+                return
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            fut.set_result(None)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "diagnostic", tokens: int = 0) -> AsyncIterator[None]:
+        await self.acquire(PRIORITIES.get(priority, 0), tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": len(self._waiters),
+            "queue_max": self.queue_max,
+            "rejected": self.rejected,
+            "rpm": self.requests.capacity or None,
+            "tpm": self.tokens.capacity or None,
+        }
+
+
+_limiters: dict[str, ProviderLimiter] = {}
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        env = f"LLM_{provider.upper()}_"
+        limiter = ProviderLimiter(
+            provider,
+            max_concurrency=int(_env_num(env + "MAX_CONCURRENCY", 16)),
+            rpm=_env_num(env + "RPM", 0),
+            tpm=_env_num(env + "TPM", 0),
+            queue_max=int(_env_num(env + "QUEUE_MAX", 64)),
+            queue_timeout=_env_num(env + "QUEUE_TIMEOUT_S", 30.0),
+        )
+        _limiters[provider] = limiter
+    return limiter
+
+
+def limiters_snapshot() -> dict[str, dict[str, Any]]:
+    return {name: lim.snapshot() for name, lim in sorted(_limiters.items())}
+
+
+def queue_load(provider: str) -> float:
+    """Ocupación de la cola de espera (0 = vacía, 1 = llena); 0 si el proveedor no tiene limitador."""
+    limiter = _limiters.get(provider)
+    if limiter is None or limiter.queue_max <= 0:
+        return 0.0
+    return len(limiter._waiters) / limiter.queue_max
@@ -0,0 +1,168 @@
+"""Métricas en proceso de las llamadas LLM.
+
+Acumula por etiqueta (general, express, agente_financia, ...) los tokens de
+entrada/salida y los de la caché de prompts de Anthropic (escritura y lectura),
+para ver cuánto del system prompt se está sirviendo desde caché.
+
+También guarda por modelo una ventana de tiempos al primer token (TTFT); su p95
+define cuándo app.llm_anthropic lanza en paralelo el modelo de respaldo, y por
+etiqueta los tokens estimados que ahorra la compactación de prompts y una
+ventana de tokens de salida reales, de la que app.llm_tokens deriva el
+``max_tokens`` adaptativo de cada endpoint.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UsageStats:
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+    def add(self, other: "UsageStats") -> None:
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_creation_input_tokens += other.cache_creation_input_tokens
+        self.cache_read_input_tokens += other.cache_read_input_tokens
+
+
+_lock = threading.Lock()
+_usage: dict[str, UsageStats] = {}
+_TTFT_WINDOW = 200
+_ttft: dict[str, deque] = {}
+_compaction: dict[str, dict[str, int]] = {}
+_OUTPUT_WINDOW = 500
+_output: dict[str, deque] = {}
+
+
+def _nearest_rank(samples: list, pct: float) -> Any:
+    rank = max(1, math.ceil(pct / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def _tokens(usage: Any, name: str) -> int:
+    value = getattr(usage, name, None)
+    if value is None and isinstance(usage, dict):
+        value = usage.get(name)
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_usage(tag: str, model: str, usage: Any) -> None:
+    """Registra el ``usage`` de una respuesta de Anthropic (objeto del SDK o dict)."""
+    if usage is None:
+        return
+    call = UsageStats(
+        calls=1,
+        input_tokens=_tokens(usage, "input_tokens"),
+        output_tokens=_tokens(usage, "output_tokens"),
+        cache_creation_input_tokens=_tokens(usage, "cache_creation_input_tokens"),
+        cache_read_input_tokens=_tokens(usage, "cache_read_input_tokens"),
+    )
+    with _lock:
+        _usage.setdefault(tag, UsageStats()).add(call)
+    logger.info(
+        "LLM %s (%s): in=%d out=%d cache_read=%d cache_write=%d",
+        tag,
+        model,
+        call.input_tokens,
+        call.output_tokens,
+        call.cache_read_input_tokens,
+        call.cache_creation_input_tokens,
+    )
+
+
+def usage_snapshot() -> dict[str, dict[str, Any]]:
+    with _lock:
+        out = {tag: asdict(stats) for tag, stats in _usage.items()}
+    for stats in out.values():
+        prompt = (
+            stats["input_tokens"]
+            + stats["cache_creation_input_tokens"]
+            + stats["cache_read_input_tokens"]
+        )
+        stats["cache_hit_ratio"] = round(stats["cache_read_input_tokens"] / prompt, 3) if prompt else 0.0
+    return out
+
+
+def record_ttft(model: str, seconds: float) -> None:
+    with _lock:
+        _ttft.setdefault(model, deque(maxlen=_TTFT_WINDOW)).append(seconds)
+
+
+def ttft_percentile(model: str, pct: float = 95.0, min_samples: int = 20) -> float | None:
+    """Percentil (nearest-rank) del TTFT reciente del modelo; None con pocas muestras."""
+    with _lock:
+        samples = sorted(_ttft.get(model, ()))
+    if len(samples) < min_samples:
+        return None
+    return _nearest_rank(samples, pct)
+
+
+def ttft_snapshot() -> dict[str, dict[str, Any]]:
+    with _lock:
+        models = {m: list(v) for m, v in _ttft.items()}
+    return {
+        m: {
+            "samples": len(v),
+            "p50_s": ttft_percentile(m, 50, min_samples=1),
+            "p95_s": ttft_percentile(m, 95, min_samples=1),
+        }
+        for m, v in models.items()
+    }
+
+
+def record_compaction(tag: str, tokens_before: int, tokens_after: int) -> None:
+    with _lock:
+        stats = _compaction.setdefault(tag, {"prompts": 0, "tokens_before": 0, "tokens_after": 0})
+        stats["prompts"] += 1
+        stats["tokens_before"] += tokens_before
+        stats["tokens_after"] += tokens_after
+
+
+def compaction_snapshot() -> dict[str, dict[str, Any]]:
+    with _lock:
+        out = {tag: dict(stats) for tag, stats in _compaction.items()}
+    for stats in out.values():
+        stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+    return out
+
+
+def record_output(tag: str, output_tokens: int) -> None:
+    """Tokens de salida de una respuesta completa (o el techo, si se truncó)."""
+    with _lock:
+        _output.setdefault(tag, deque(maxlen=_OUTPUT_WINDOW)).append(int(output_tokens))
+
+
+def output_percentile(tag: str, pct: float = 99.0, min_samples: int = 20) -> int | None:
+    """Percentil (nearest-rank) de los tokens de salida recientes; None con pocas muestras."""
+    with _lock:
+        samples = sorted(_output.get(tag, ()))
+    if len(samples) < min_samples:
+        return None
+    return _nearest_rank(samples, pct)
+
+
+def output_samples(tag: str) -> int:
+    with _lock:
+        return len(_output.get(tag, ()))
+
+
+def output_tags() -> list[str]:
+    with _lock:
+        return list(_output)
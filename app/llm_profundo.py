@@ -2,13 +2,17 @@
 # MENTHIA Strategy+ - Módulo de Diagnóstico Profundo y Construcción Estratégica
 import os
 import json
-import asyncio
 import logging
 from typing import Dict, Any, List, Tuple, Optional
 from fastapi import HTTPException
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from app.llm_circuit import guard, openai_breaker
+from app.llm_clients import get_clients
+from app.prompt_compact import a_json, compactar
+from app.text_match import KeywordMatcher
+from app.text_normalize import Normalizado, normalizar_campos
+
 logger = logging.getLogger("diag_profundo")
 
 # Carga variables de entorno (usa .env)
@@ -18,8 +22,6 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip().strip('"').strip("'")
 MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4o").strip().strip('"').strip("'")
 DEMO_ON_ERROR = os.getenv("DIAG_DEMO_ON_ERROR", "1") == "1"
 
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-
 # =====================================================
 # PROMPT SYSTEM DE MENTHIA STRATEGY+
 # =====================================================
@@ -182,6 +184,11 @@ DOMAIN_CONFIG = {
     },
 }
 
+# Palabras clave negativas de todos los dominios, por dominio.
+_DOMAIN_KEYWORDS = KeywordMatcher({k: cfg["keywords"] for k, cfg in DOMAIN_CONFIG.items()})
+# Campos de texto libre de todos los dominios; se normalizan una vez por solicitud.
+_TEXT_FIELDS = [tf for cfg in DOMAIN_CONFIG.values() for tf in cfg["text_fields"]]
+
 # =====================================================
 # Utilidades de scoring
 # =====================================================
@@ -200,10 +207,6 @@ def _likert_to_num(v: Any) -> Optional[float]:
                 return f
     return None
 
-def _text_contains_any(text: str, kws: List[str]) -> bool:
-    t = (text or "").lower()
-    return any(k.lower() in t for k in kws)
-
 def _severity_from_score(score: float) -> str:
     if score <= 2.0: return "Crítico"
     if score <= 2.5: return "Alto"
@@ -213,7 +216,9 @@ def _severity_from_score(score: float) -> str:
 def _priority_from_severity(sev: str) -> str:
     return {"Crítico": "P1", "Alto": "P1", "Medio": "P2"}.get(sev, "P3")
 
-def _compute_domain_score(data: Dict[str, Any], cfg: Dict[str, Any]) -> Tuple[float, List[str], int]:
+def _compute_domain_score(
+    data: Dict[str, Any], cfg: Dict[str, Any], dom_key: str, textos: Dict[str, Normalizado]
+) -> Tuple[float, List[str], int]:
     lik_vals: List[float] = []
     for f in cfg["likert_fields"]:
         val = _likert_to_num(data.get(f))
@@ -226,7 +231,7 @@ def _compute_domain_score(data: Dict[str, Any], cfg: Dict[str, Any]) -> Tuple[fl
         tv = str(data.get(tf) or "")
         if tv:
             evidencias.append(f"{tf}: {tv[:140]}{'…' if len(tv) > 140 else ''}")
-            if not neg_hit and _text_contains_any(tv, cfg["keywords"]):
+            if not neg_hit and dom_key in _DOMAIN_KEYWORDS.categorias(textos[tf]):
                 neg_hit = True
 
     base = (sum(lik_vals) / len(lik_vals)) if lik_vals else 3.0
@@ -237,8 +242,9 @@ def _compute_domain_score(data: Dict[str, Any], cfg: Dict[str, Any]) -> Tuple[fl
 
 def _compute_domains(data: Dict[str, Any]) -> Dict[str, Any]:
     out = {}
+    textos = normalizar_campos(data, _TEXT_FIELDS)
     for dom_key, cfg in DOMAIN_CONFIG.items():
-        score, evid, nlik = _compute_domain_score(data, cfg)
+        score, evid, nlik = _compute_domain_score(data, cfg, dom_key, textos)
         sev = _severity_from_score(score)
         out[dom_key] = {
             "dominio": dom_key,
@@ -376,6 +382,11 @@ def _respuesta_fallback(domains: Dict[str, Any], roadmap: Dict[str, Any]) -> Dic
         "siguiente_paso": f"Inicia con {domains.get(roadmap['orden_implementacion'][0], {}).get('nombre', 'el área crítica')} (Fase 1 - 30 días)." if roadmap.get("orden_implementacion") else "Define prioridades claras.",
     }
 
+def analizar_diagnostico_profundo_fast(diagnostico_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Reporte por reglas, sin modelo (``mode=fast``)."""
+    domains = _compute_domains(diagnostico_data)
+    return _respuesta_fallback(domains, _generar_roadmap_inteligente(domains))
+
 # =====================================================
 # API principal
 # =====================================================
@@ -388,6 +399,7 @@ async def analizar_diagnostico_profundo(diagnostico_data: Dict[str, Any]) -> Dic
     roadmap = _generar_roadmap_inteligente(domains)
     
     # Fallback si no hay API key
+    client = get_clients().openai()
     if not OPENAI_API_KEY or not client:
         return _respuesta_fallback(domains, roadmap)
 
@@ -426,10 +438,10 @@ CONTEXTO PRE-ANALIZADO:
 {contexto_roadmap}
 
 DOMINIOS ACTIVADOS:
-{json.dumps(resumen_tabla, ensure_ascii=False, indent=2)}
+{a_json(resumen_tabla)}
 
 CAMPOS RELEVANTES:
-{json.dumps(subset, ensure_ascii=False, indent=2)}
+{compactar(subset)}
 
 ROADMAP SUGERIDO:
 {json.dumps(roadmap.get('orden_implementacion', [])[:3], ensure_ascii=False)}
@@ -438,8 +450,8 @@ Genera el diagnóstico estratégico completo siguiendo la estructura JSON especi
 Sé directo, estratégico y orientado a resultados. Nada de humo."""
 
     try:
-        def _call():
-            comp = client.chat.completions.create(
+        async with guard(openai_breaker()):
+            completion = await client.chat.completions.create(
                 model=MODEL_NAME,
                 messages=[
                     {"role": "system", "content": MENTHIA_STRATEGY_SYSTEM_PROMPT},
@@ -448,9 +460,6 @@ Sé directo, estratégico y orientado a resultados. Nada de humo."""
                 response_format={"type": "json_object"},
                 temperature=0.3,
             )
-            return comp
-
-        completion = await asyncio.to_thread(_call)
         content = completion.choices[0].message.content or "{}"
         parsed = json.loads(content)
         
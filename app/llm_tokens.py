@@ -0,0 +1,192 @@
+"""Presupuesto de tokens por llamada: entrada estimada y ``max_tokens`` adaptativo.
+
+Cada call site fija un techo de ``max_tokens`` (6000 general, 3500 express,
+8000 financia, ...). Con ese techo la generación más larga posible define la
+latencia de cola aunque casi ninguna respuesta lo alcance. Aquí:
+
+- ``estimar_tokens`` aproxima localmente los tokens de un texto (palabras,
+  números y signos por separado, más fiel que ~4 caracteres por token con JSON
+  y español).
+- La salida real de cada respuesta se registra por etiqueta
+  (app.llm_metrics.record_output); si la respuesta se cortó por ``max_tokens``
+  se registra el techo, para que el presupuesto vuelva a subir.
+- ``max_tokens_adaptativo`` usa el percentil observado más un margen, acotado
+  entre un mínimo y el techo del call site. Sin muestras suficientes, el techo.
+  Las etiquetas de reportes JSON (``TAGS_JSON``) no se adaptan: un JSON cortado
+  por ``max_tokens`` no se puede parsear y el reporte caería en silencio al
+  respaldo por reglas.
+- ``planificar`` comprueba que entrada + salida quepa en el contexto: recorta
+  los turnos más antiguos de una conversación, luego reduce ``max_tokens`` y, si
+  aun así no cabe, rechaza con ``EntradaDemasiadoLarga`` (413) sin llamar al modelo.
+
+Variables de entorno:
+- LLM_ADAPTIVE_MAX_TOKENS (1) — 0 usa siempre el techo del call site.
+- LLM_MAX_TOKENS_PCT (99), LLM_MAX_TOKENS_MARGIN (1.25) — percentil y margen.
+- LLM_MAX_TOKENS_MIN (256) — piso del presupuesto adaptativo.
+- LLM_MAX_TOKENS_MIN_SAMPLES (20) — respuestas observadas antes de adaptar.
+- LLM_CONTEXT_TOKENS (200000) — ventana de contexto del modelo.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.llm_metrics import output_percentile, output_samples, output_tags, record_output
+
+logger = logging.getLogger(__name__)
+
+# Palabras, grupos de dígitos o un signo suelto; los espacios van con la pieza siguiente.
+_PIEZAS = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_")
+# Sobrecarga aproximada de cada mensaje (rol y delimitadores).
+_TOKENS_POR_MENSAJE = 4
+
+# Respuestas que deben ser un objeto JSON completo: siempre con el techo.
+TAGS_JSON = frozenset(
+    {
+        "general",
+        "express",
+        "financia",
+        "financia_express",
+        "recupera_express",
+        "recupera_profesional",
+    }
+)
+
+_lock = threading.Lock()
+_techos: dict[str, int] = {}
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+class EntradaDemasiadoLarga(HTTPException):
+    def __init__(self, tokens: int, limite: int) -> None:
+        self.tokens = tokens
+        self.limite = limite
+        super().__init__(
+            status_code=413,
+            detail=f"La solicitud es demasiado larga (~{tokens} tokens; máximo {limite}).",
+        )
+
+
+def estimar_tokens(texto: str) -> int:
+    """Tokens aproximados: palabras en trozos de ~4 letras, dígitos de 3 en 3, cada signo uno."""
+    total = 0
+    for pieza in _PIEZAS.findall(texto):
+        n = len(pieza)
+        if n == 1:
+            total += 1
+        elif pieza[0].isdigit():
+            total += (n + 2) // 3
+        else:
+            total += (n + 3) // 4
+    return total
+
+
+def _tokens_mensaje(m: dict[str, Any]) -> int:
+    content = m.get("content", "")
+    return _TOKENS_POR_MENSAJE + estimar_tokens(content if isinstance(content, str) else str(content))
+
+
+def estimar_entrada(system: str, messages: list[dict[str, Any]]) -> int:
+    return estimar_tokens(system) + sum(_tokens_mensaje(m) for m in messages)
+
+
+def max_tokens_adaptativo(tag: str, techo: int) -> int:
+    """p``LLM_MAX_TOKENS_PCT`` de la salida observada × margen, entre el piso y ``techo``."""
+    with _lock:
+        _techos[tag] = techo
+    if tag in TAGS_JSON or os.getenv("LLM_ADAPTIVE_MAX_TOKENS", "1").strip() == "0":
+        return techo
+    observado = output_percentile(
+        tag,
+        _env_num("LLM_MAX_TOKENS_PCT", 99),
+        min_samples=int(_env_num("LLM_MAX_TOKENS_MIN_SAMPLES", 20)),
+    )
+    if observado is None:
+        return techo
+    piso = int(_env_num("LLM_MAX_TOKENS_MIN", 256))
+    margen = _env_num("LLM_MAX_TOKENS_MARGIN", 1.25)
+    return min(techo, max(piso, math.ceil(observado * margen)))
+
+
+def registrar_salida(tag: str, final: Any) -> None:
+    """Registra la salida real de ``final`` (Message del SDK); si se truncó, el techo."""
+    usage = getattr(final, "usage", None)
+    try:
+        tokens = int(getattr(usage, "output_tokens", 0) or 0)
+    except (TypeError, ValueError):
+        return
+    if getattr(final, "stop_reason", None) == "max_tokens":
+        with _lock:
+            tokens = max(tokens, _techos.get(tag, tokens))
+    if tokens > 0:
+        record_output(tag, tokens)
+
+
+@dataclass
+class Presupuesto:
+    messages: list[dict[str, Any]]
+    max_tokens: int
+    tokens_entrada: int
+    turnos_recortados: int = 0
+
+
+def _recortar(messages: list[dict[str, Any]], sobrante: int) -> tuple[list[dict[str, Any]], int]:
+    """Quita turnos del inicio hasta liberar ``sobrante`` tokens; la conversación
+    sigue empezando por un turno del usuario y conserva siempre el último."""
+    i = 0
+    liberados = 0
+    while liberados < sobrante and i < len(messages) - 1:
+        liberados += _tokens_mensaje(messages[i])
+        i += 1
+        while i < len(messages) - 1 and messages[i].get("role") != "user":
+            liberados += _tokens_mensaje(messages[i])
+            i += 1
+    return messages[i:], liberados
+
+
+def planificar(tag: str, system: str, messages: list[dict[str, Any]], techo: int) -> Presupuesto:
+    max_tokens = max_tokens_adaptativo(tag, techo)
+    entrada = estimar_entrada(system, messages)
+    limite = int(_env_num("LLM_CONTEXT_TOKENS", 200_000))
+    recortados = 0
+    if entrada + max_tokens > limite and len(messages) > 1:
+        kept, liberados = _recortar(messages, entrada + max_tokens - limite)
+        recortados = len(messages) - len(kept)
+        messages, entrada = kept, entrada - liberados
+        logger.warning("LLM %s: %d turnos antiguos recortados para caber en el contexto", tag, recortados)
+    if entrada + max_tokens > limite:
+        disponible = limite - entrada
+        if disponible < min(techo, int(_env_num("LLM_MAX_TOKENS_MIN", 256))):
+            raise EntradaDemasiadoLarga(entrada, limite)
+        max_tokens = disponible
+    return Presupuesto(messages, max_tokens, entrada, recortados)
+
+
+def presupuestos_snapshot() -> dict[str, dict[str, Any]]:
+    with _lock:
+        techos = dict(_techos)
+    out: dict[str, dict[str, Any]] = {}
+    for tag in sorted(set(techos) | set(output_tags())):
+        techo = techos.get(tag)
+        out[tag] = {
+            "samples": output_samples(tag),
+            "p50_output": output_percentile(tag, 50, min_samples=1),
+            "p99_output": output_percentile(tag, 99, min_samples=1),
+            "techo": techo,
+            "max_tokens": max_tokens_adaptativo(tag, techo) if techo is not None else None,
+        }
+    return out
@@ -7,6 +7,9 @@ import httpx
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+from app.llm_circuit import counts_as_failure, openai_breaker
+from app.llm_clients import OPENAI_BASE_URL, get_clients
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip().strip('"').strip("'")
@@ -170,81 +173,98 @@ CONTEXTO DEL DIAGNÓSTICO:
 Usa este contexto para dar análisis más relevante y específico."""
         system_prompt += context_text
     
+    breaker = openai_breaker()
+    if not breaker.allow():
+        return {
+            "error": "OpenAI no disponible temporalmente (circuito abierto)",
+            "success": False
+        }
+
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {OPENAI_API_KEY}"
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": "Analiza este documento y proporciona el análisis completo en formato JSON."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": image_content,
-                                        "detail": "high"
-                                    }
+        response = await get_clients().http("openai").post(
+            f"{OPENAI_BASE_URL}/chat/completions",
+            timeout=60.0,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {OPENAI_API_KEY}"
+            },
+            json={
+                "model": "gpt-4o",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": "Analiza este documento y proporciona el análisis completo en formato JSON."
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": image_content,
+                                    "detail": "high"
                                 }
-                            ]
-                        }
-                    ],
-                    "response_format": {"type": "json_object"},
-                    "max_tokens": 2500,
-                    "temperature": 0.3
-                }
-            )
-            
-            if response.status_code != 200:
-                return {
-                    "error": f"Error de OpenAI: {response.status_code}",
-                    "detail": response.text,
-                    "success": False
-                }
-            
-            result = response.json()
-            analysis_text = result["choices"][0]["message"]["content"]
-            
-            try:
-                analysis = json.loads(analysis_text)
-            except json.JSONDecodeError:
-                analysis = {
-                    "resumen": analysis_text,
-                    "error_parsing": True,
-                    "confianza": "baja"
-                }
-            
-            # Agregar metadata
-            analysis["_metadata"] = {
-                "modelo": "gpt-4o",
-                "tipo_documento": document_type,
-                "tokens_usados": result.get("usage", {}).get("total_tokens", 0)
+                            }
+                        ]
+                    }
+                ],
+                "response_format": {"type": "json_object"},
+                "max_tokens": 2500,
+                "temperature": 0.3
             }
-            
+        )
+        
+        if response.status_code != 200:
+            if counts_as_failure(response.status_code):
+                breaker.record_failure(f"HTTP {response.status_code}")
+            else:
+                breaker.release()
             return {
-                "success": True,
-                "analysis": analysis
+                "error": f"Error de OpenAI: {response.status_code}",
+                "detail": response.text,
+                "success": False
             }
-            
-    except httpx.TimeoutException:
+        
+        breaker.record_success()
+        result = response.json()
+        analysis_text = result["choices"][0]["message"]["content"]
+        
+        try:
+            analysis = json.loads(analysis_text)
+        except json.JSONDecodeError:
+            analysis = {
+                "resumen": analysis_text,
+                "error_parsing": True,
+                "confianza": "baja"
+            }
+        
+        # Agregar metadata
+        analysis["_metadata"] = {
+            "modelo": "gpt-4o",
+            "tipo_documento": document_type,
+            "tokens_usados": result.get("usage", {}).get("total_tokens", 0)
+        }
+        
+        return {
+            "success": True,
+            "analysis": analysis
+        }
+        
+    except httpx.TimeoutException as e:
+        breaker.record_failure(f"{type(e).__name__}: {e}")
         return {
             "error": "Timeout al analizar documento",
             "success": False
         }
     except Exception as e:
+        if isinstance(e, httpx.HTTPError):
+            breaker.record_failure(f"{type(e).__name__}: {e}")
+        else:
+            breaker.release()
         return {
             "error": str(e),
             "success": False
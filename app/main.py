@@ -4,19 +4,69 @@ mentorapp_api_llm — FastAPI: diagnósticos MentHIA + R.E.C.U.P.E.R.A.™
 
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Any
 
-from fastapi import Body, FastAPI, HTTPException
+from fastapi import Body, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-
-from app.llm_emergencia import analizar_diagnostico_emergencia
-from app.llm_express import analizar_diagnostico_express
+from fastapi.responses import JSONResponse
+
+from app.conversations import purge_loop
+from app.jobs import get_jobs, public_view
+from app.llm_anthropic import check_admission
+from app.llm_clients import get_clients
+from app.llm_emergencia import analizar_diagnostico_emergencia, analizar_diagnostico_emergencia_fast
+from app.llm_express import (
+    analizar_diagnostico_express,
+    analizar_diagnostico_express_fast,
+    analizar_diagnostico_express_stream,
+)
 from app.llm_finanzas_interpret import interpretar_finanzas_narrativa
-from app.llm_general import analizar_diagnostico_general
-from app.llm_profundo import analizar_diagnostico_profundo
-from app.routers import recupera_express, recupera_profesional
+from app.llm_general import (
+    analizar_diagnostico_general,
+    analizar_diagnostico_general_fast,
+    analizar_diagnostico_general_stream,
+)
+from app.llm_profundo import analizar_diagnostico_profundo, analizar_diagnostico_profundo_fast
+from app.report_mode import analizar, analizar_stream, resolver
+from app.routers import admin, jobs, recupera_express, recupera_profesional
+from app.streaming import sse_response, wants_stream
+
+
+async def _financia_job(data: dict) -> Any:
+    from app.llm_financia import analizar_diagnostico_financia
+
+    return await analizar_diagnostico_financia(data)
+
+
+get_jobs().register("general", analizar_diagnostico_general)
+get_jobs().register("financia", _financia_job)
+
+
+def _submit_job(kind: str, data: dict) -> JSONResponse:
+    job = get_jobs().submit(kind, data)
+    body = public_view(job)
+    body["status_url"] = f"/api/jobs/{job['id']}"
+    return JSONResponse(body, status_code=202)
+
 
-app = FastAPI(title="mentorapp_api_llm", version="1.0.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    clients = get_clients()
+    await clients.startup()
+    get_jobs().start()
+    purge = asyncio.create_task(purge_loop())
+    try:
+        yield
+    finally:
+        purge.cancel()
+        await get_jobs().stop()
+        await clients.aclose()
+
+
+app = FastAPI(title="mentorapp_api_llm", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,6 +84,8 @@ app.include_router(
     recupera_express.router,
     prefix="/api/diagnostico/recupera-express",
 )
+app.include_router(admin.router, prefix="/api/admin")
+app.include_router(jobs.router, prefix="/api/jobs")
 
 
 @app.get("/")
@@ -47,29 +99,93 @@ def health() -> dict[str, str]:
 
 
 @app.post("/api/diagnostico/general/analyze")
-async def diagnostico_general_analyze(data: dict = Body(...)) -> dict[str, Any]:
-    return await analizar_diagnostico_general(data)
+async def diagnostico_general_analyze(
+    request: Request,
+    data: dict = Body(...),
+    stream: bool = False,
+    run_async: bool = Query(False, alias="async"),
+    mode: str = "full",
+) -> Any:
+    modo = resolver(mode)
+    if run_async and modo != "fast":
+        return _submit_job("general", data)
+    fast = partial(analizar_diagnostico_general_fast, data)
+    if wants_stream(request, stream):
+        return sse_response(
+            analizar_stream("general", modo, fast, partial(analizar_diagnostico_general_stream, data))
+        )
+    return await analizar("general", modo, fast, partial(analizar_diagnostico_general, data))
+
+
+@app.post("/api/diagnostico/general/batch")
+def diagnostico_general_batch(body: dict = Body(...)) -> dict[str, Any]:
+    """Re-califica N cuestionarios con el modelo de 7 secciones (sin LLM)."""
+    from app.general_batch import calcular_modelo_batch
+
+    diagnosticos = body.get("diagnosticos")
+    if not isinstance(diagnosticos, list):
+        raise HTTPException(status_code=422, detail="diagnosticos debe ser una lista")
+    batch = calcular_modelo_batch(diagnosticos)
+    if body.get("formato") == "columnas":
+        resultados: Any = batch.columns()
+    else:
+        resultados = [batch.row(k) for k in range(len(batch))]
+    return {"n": len(batch), "resultados": resultados, "tipo": "general-batch"}
 
 
 @app.post("/api/diagnostico/express/analyze")
-async def diagnostico_express_analyze(data: dict = Body(...)) -> dict[str, Any]:
-    return await analizar_diagnostico_express(data)
-
-
+async def diagnostico_express_analyze(
+    request: Request, data: dict = Body(...), stream: bool = False, mode: str = "full"
+) -> Any:
+    modo = resolver(mode)
+    fast = partial(analizar_diagnostico_express_fast, data)
+    if wants_stream(request, stream):
+        return sse_response(
+            analizar_stream("express", modo, fast, partial(analizar_diagnostico_express_stream, data))
+        )
+    return await analizar("express", modo, fast, partial(analizar_diagnostico_express, data))
+
+
+# Emergencia y profundo llaman a OpenAI sin limitador: solo ``mode=fast`` explícito.
 @app.post("/api/diagnostico/emergencia/analyze")
-async def diagnostico_emergencia_analyze(data: dict = Body(...)) -> dict[str, Any]:
-    return await analizar_diagnostico_emergencia(data)
+async def diagnostico_emergencia_analyze(data: dict = Body(...), mode: str = "full") -> dict[str, Any]:
+    return await analizar(
+        "emergencia",
+        resolver(mode, provider=None),
+        partial(analizar_diagnostico_emergencia_fast, data),
+        partial(analizar_diagnostico_emergencia, data),
+    )
 
 
 @app.post("/api/diagnostico/profundo/analyze")
-async def diagnostico_profundo_analyze(data: dict = Body(...)) -> dict[str, Any]:
-    return await analizar_diagnostico_profundo(data)
+async def diagnostico_profundo_analyze(data: dict = Body(...), mode: str = "full") -> dict[str, Any]:
+    return await analizar(
+        "profundo",
+        resolver(mode, provider=None),
+        partial(analizar_diagnostico_profundo_fast, data),
+        partial(analizar_diagnostico_profundo, data),
+    )
+
 
 @app.post("/api/diagnostico/financia/analyze")
-async def diagnostico_financia_analyze(data: dict = Body(...)) -> dict[str, Any]:
-    from app.llm_financia import analizar_diagnostico_financia
+async def diagnostico_financia_analyze(
+    request: Request,
+    data: dict = Body(...),
+    stream: bool = False,
+    run_async: bool = Query(False, alias="async"),
+) -> Any:
+    if run_async:
+        return _submit_job("financia", data)
+    from app.llm_financia import (
+        analizar_diagnostico_financia,
+        analizar_diagnostico_financia_stream,
+    )
+    if wants_stream(request, stream):
+        check_admission()
+        return sse_response(analizar_diagnostico_financia_stream(data))
     return await analizar_diagnostico_financia(data)
 
+
 @app.post("/api/finanzas/interpretar")
 async def finanzas_interpretar(body: dict = Body(...)) -> dict[str, Any]:
     payload = body.get("payload")
@@ -77,6 +193,7 @@ async def finanzas_interpretar(body: dict = Body(...)) -> dict[str, Any]:
         raise HTTPException(status_code=400, detail="payload (objeto) es requerido")
     return await interpretar_finanzas_narrativa(payload)
 
+
 @app.post("/api/chatbot/chat")
 async def chatbot_chat(data: dict = Body(...)) -> dict[str, Any]:
     from app.llm_chatbot import handle_chatbot
@@ -87,3 +204,18 @@ async def chatbot_chat(data: dict = Body(...)) -> dict[str, Any]:
 async def agente_financia_chat_endpoint(data: dict = Body(...)) -> dict[str, Any]:
     from app.llm_agente_financia import agente_financia_chat
     return await agente_financia_chat(data)
+
+
+@app.get("/api/diagnostico/agente-financia/chat/{conversation_id}")
+def agente_financia_conversation(conversation_id: str) -> dict[str, Any]:
+    from app.conversations import get_conversations
+    conv = get_conversations().get(conversation_id)
+    if conv is None:
+        raise HTTPException(status_code=404, detail="Conversación no encontrada o expirada")
+    return {"conversationId": conv.id, "messages": conv.messages}
+
+
+@app.delete("/api/diagnostico/agente-financia/chat/{conversation_id}")
+def agente_financia_conversation_delete(conversation_id: str) -> dict[str, Any]:
+    from app.conversations import get_conversations
+    return {"ok": get_conversations().delete(conversation_id)}
@@ -0,0 +1,114 @@
+"""Índice precompilado de percentiles LATAM (Capa 1) para General y Express.
+
+Las bandas por sector × tamaño se definen una vez en ``PERCENTILES_POR_SECTOR``
+(rangos enteros contiguos 0-100) y al importar se compilan a una tabla
+``grupo × puntaje entero (0-100) → banda``. Un índice con decimales se ubica con
+``ceil``: 36.0 sigue en la banda que termina en 36 y 36.2 ya cae en la
+siguiente (antes General devolvía "Sin clasificar" en esos huecos y Express no).
+
+``banda`` resuelve un índice en O(1); ``bandas`` hace lo mismo sobre arreglos
+NumPy para la calificación por lotes.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+BANDAS = ("Deficiente", "Promedio", "Bueno", "Líder")
+SECTORES = ("Servicios", "Comercio", "Tecnología", "Agroindustria", "Industria")
+TAMANOS = ("Micro", "Pequeña", "Mediana", "Grande")
+SECTOR_DEFAULT = "Servicios"
+TAMANO_DEFAULT = "Micro"
+
+PERCENTILES_POR_SECTOR = {
+    "Servicios": {
+        "Micro":   [(0, 36, "Deficiente"), (37, 50, "Promedio"), (51, 70, "Bueno"), (71, 100, "Líder")],
+        "Pequeña": [(0, 40, "Deficiente"), (41, 55, "Promedio"), (56, 75, "Bueno"), (76, 100, "Líder")],
+        "Mediana": [(0, 45, "Deficiente"), (46, 60, "Promedio"), (61, 78, "Bueno"), (79, 100, "Líder")],
+        "Grande":  [(0, 50, "Deficiente"), (51, 65, "Promedio"), (66, 80, "Bueno"), (81, 100, "Líder")],
+    },
+    "Comercio": {
+        "Micro":   [(0, 34, "Deficiente"), (35, 49, "Promedio"), (50, 69, "Bueno"), (70, 100, "Líder")],
+        "Pequeña": [(0, 38, "Deficiente"), (39, 52, "Promedio"), (53, 72, "Bueno"), (73, 100, "Líder")],
+        "Mediana": [(0, 42, "Deficiente"), (43, 58, "Promedio"), (59, 76, "Bueno"), (77, 100, "Líder")],
+        "Grande":  [(0, 48, "Deficiente"), (49, 64, "Promedio"), (65, 82, "Bueno"), (83, 100, "Líder")],
+    },
+    "Tecnología": {
+        "Micro":   [(0, 40, "Deficiente"), (41, 54, "Promedio"), (55, 72, "Bueno"), (73, 100, "Líder")],
+        "Pequeña": [(0, 42, "Deficiente"), (43, 56, "Promedio"), (57, 74, "Bueno"), (75, 100, "Líder")],
+        "Mediana": [(0, 46, "Deficiente"), (47, 62, "Promedio"), (63, 79, "Bueno"), (80, 100, "Líder")],
+        "Grande":  [(0, 50, "Deficiente"), (51, 66, "Promedio"), (67, 82, "Bueno"), (83, 100, "Líder")],
+    },
+    "Agroindustria": {
+        "Micro":   [(0, 35, "Deficiente"), (36, 50, "Promedio"), (51, 70, "Bueno"), (71, 100, "Líder")],
+        "Pequeña": [(0, 38, "Deficiente"), (39, 53, "Promedio"), (54, 72, "Bueno"), (73, 100, "Líder")],
+        "Mediana": [(0, 42, "Deficiente"), (43, 58, "Promedio"), (59, 76, "Bueno"), (77, 100, "Líder")],
+        "Grande":  [(0, 48, "Deficiente"), (49, 64, "Promedio"), (65, 80, "Bueno"), (81, 100, "Líder")],
+    },
+    "Industria": {
+        "Micro":   [(0, 38, "Deficiente"), (39, 53, "Promedio"), (54, 73, "Bueno"), (74, 100, "Líder")],
+        "Pequeña": [(0, 40, "Deficiente"), (41, 55, "Promedio"), (56, 74, "Bueno"), (75, 100, "Líder")],
+        "Mediana": [(0, 44, "Deficiente"), (45, 60, "Promedio"), (61, 78, "Bueno"), (79, 100, "Líder")],
+        "Grande":  [(0, 50, "Deficiente"), (51, 65, "Promedio"), (66, 82, "Bueno"), (83, 100, "Líder")],
+    },
+}
+
+
+def _compilar() -> np.ndarray:
+    """Tabla (grupos × 101) de códigos de banda; valida que los rangos cubran 0-100 sin huecos."""
+    tabla = np.zeros((len(SECTORES) * len(TAMANOS), 101), dtype=np.int8)
+    for s, sector in enumerate(SECTORES):
+        for t, tamano in enumerate(TAMANOS):
+            rangos = PERCENTILES_POR_SECTOR[sector][tamano]
+            siguiente = 0
+            for inicio, fin, clasif in rangos:
+                if inicio != siguiente or fin < inicio:
+                    raise ValueError(f"Percentiles {sector}/{tamano}: rango {inicio}-{fin} no contiguo")
+                tabla[s * len(TAMANOS) + t, inicio:fin + 1] = BANDAS.index(clasif)
+                siguiente = fin + 1
+            if siguiente != 101:
+                raise ValueError(f"Percentiles {sector}/{tamano}: no cubren hasta 100")
+    return tabla
+
+
+_TABLA = _compilar()
+_TABLA_PY: List[List[int]] = _TABLA.tolist()
+_SECTOR_ID = {s: i for i, s in enumerate(SECTORES)}
+_TAMANO_ID = {t: i for i, t in enumerate(TAMANOS)}
+
+
+def grupo(sector: str, tamano: str) -> int:
+    """Fila del índice; sector o tamaño desconocidos caen en Servicios / Micro."""
+    s = _SECTOR_ID.get(sector, _SECTOR_ID[SECTOR_DEFAULT])
+    t = _TAMANO_ID.get(tamano, _TAMANO_ID[TAMANO_DEFAULT])
+    return s * len(TAMANOS) + t
+
+
+def _puntaje(indice: float) -> int:
+    if not math.isfinite(indice):
+        return 0
+    return min(100, max(0, math.ceil(indice)))
+
+
+def banda(indice: float, sector: str, tamano: str) -> str:
+    return BANDAS[_TABLA_PY[grupo(sector, tamano)][_puntaje(indice)]]
+
+
+def umbrales(sector: str, tamano: str) -> Tuple[int, int, int]:
+    """Límite superior (inclusive) de Deficiente, Promedio y Bueno."""
+    fila = _TABLA[grupo(sector, tamano)]
+    return tuple(int(np.flatnonzero(fila <= b)[-1]) for b in range(3))  # type: ignore[return-value]
+
+
+def bandas(indices: np.ndarray, grupos: np.ndarray) -> np.ndarray:
+    """Códigos de banda (índices en ``BANDAS``) para arreglos de índices y grupos."""
+    indices = np.asarray(indices, dtype=float)
+    puntajes = np.clip(np.ceil(np.nan_to_num(indices, nan=0.0)), 0, 100).astype(np.intp)
+    return _TABLA[np.asarray(grupos, dtype=np.intp), puntajes]
+
+
+def grupos(sectores: Sequence[str], tamanos: Sequence[str]) -> np.ndarray:
+    return np.fromiter((grupo(s, t) for s, t in zip(sectores, tamanos)), dtype=np.intp, count=len(sectores))
@@ -0,0 +1,97 @@
+"""Compactación de los datos que se envían al modelo.
+
+Los prompts de diagnóstico incluían el payload completo (``json.dumps`` con
+``indent=2`` o una línea por cada clave cruda). Aquí se deja solo lo que el
+modelo necesita: sin identificadores ni metadatos, sin valores vacíos, con los
+espacios colapsados, sin las respuestas que ya van codificadas en los puntajes
+precalculados y serializado sin sangría.
+
+``registrar_ahorro`` estima (app.llm_tokens) los tokens del volcado anterior contra el compacto
+y los acumula por etiqueta (``GET /api/admin/llm/metrics`` → ``compaction``).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Any, Callable, Iterable, Mapping
+
+from app.llm_metrics import record_compaction
+from app.llm_tokens import estimar_tokens
+
+logger = logging.getLogger(__name__)
+
+# Metadatos e identificadores que nunca aportan al análisis.
+DESCARTAR = frozenset(
+    {
+        "userId",
+        "uid",
+        "id",
+        "_id",
+        "createdAt",
+        "updatedAt",
+        "timestamp",
+        "token",
+        "email",
+        "correo",
+        "correoElectronico",
+        "telefono",
+        "mode",
+    }
+)
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+def _vacio(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def limpiar(value: Any, descartar: Callable[[str], bool] | None = None) -> Any:
+    """Copia sin claves descartadas ni valores vacíos y con el texto normalizado."""
+    if isinstance(value, str):
+        return _ESPACIOS.sub(" ", value).strip()
+    if isinstance(value, Mapping):
+        out = {}
+        for k, v in value.items():
+            if k in DESCARTAR or (descartar is not None and descartar(str(k))):
+                continue
+            v = limpiar(v, descartar)
+            if not _vacio(v):
+                out[k] = v
+        return out
+    if isinstance(value, (list, tuple)):
+        items = (limpiar(v, descartar) for v in value)
+        return [v for v in items if not _vacio(v)]
+    return value
+
+
+def a_json(value: Any) -> str:
+    """JSON sin sangría ni espacios tras separadores."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def compactar(
+    data: Any,
+    *,
+    excluir: Iterable[str] = (),
+    prefijos_excluir: Iterable[str] = (),
+) -> str:
+    """``data`` limpio y en JSON compacto; ``excluir``/``prefijos_excluir`` quitan
+    claves (en cualquier nivel) que los puntajes precalculados ya codifican."""
+    excluir = frozenset(excluir)
+    prefijos = tuple(prefijos_excluir)
+
+    def descartar(k: str) -> bool:
+        return k in excluir or (bool(prefijos) and k.startswith(prefijos))
+
+    return a_json(limpiar(data, descartar))
+
+
+def registrar_ahorro(tag: str, original: str, compacto: str) -> int:
+    """Registra cuántos tokens de entrada se ahorraron; devuelve la diferencia."""
+    antes, despues = estimar_tokens(original), estimar_tokens(compacto)
+    record_compaction(tag, antes, despues)
+    logger.info("Prompt %s compactado: ~%d → ~%d tokens", tag, antes, despues)
+    return antes - despues
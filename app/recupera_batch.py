@@ -0,0 +1,352 @@
+"""Motor R.E.C.U.P.E.R.A.™ Profesional vectorizado (NumPy) para carteras completas.
+
+Misma fórmula que ``recupera_engine.compute_recupera_profesional``, pero sobre
+arreglos: cada métrica, semáforo, ``indice_salud_0_100`` y bandera de alerta se
+calcula en una sola pasada para N empresas. La paridad con la versión escalar es
+exacta (mismas operaciones en el mismo orden); ver test_recupera_batch.py.
+
+Entrada: lista de ``ProfesionalInputs`` o columnas ``{campo: [valores]}``.
+
+``compute_recupera_escenarios`` usa el mismo motor para barrer una rejilla
+what-if sobre una empresa: cada palanca (días de cartera, inventario hacia el
+ideal de 60 días, ...) recibe una lista o rango de valores y se evalúa el
+producto cartesiano completo en una sola pasada.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, fields
+from typing import Any, Iterable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from app.recupera_engine import (
+    ProfesionalInputs,
+    ProfesionalMetrics,
+    _alertas,
+    _letter_control_score,
+)
+
+NUMERIC_FIELDS = (
+    "ventasMensuales",
+    "costoVentasMensual",
+    "gastosOperativos",
+    "depreciacion",
+    "cuentasPorCobrar",
+    "cuentasPorPagar",
+    "inventarioTotal",
+    "efectivoDisponible",
+    "comprasMensuales",
+)
+CONTROL_FIELDS = (
+    "controlPresupuesto",
+    "controlRevision",
+    "controlKpis",
+    "controlFlujoProyectado",
+)
+
+BatchInputs = Union[Sequence[ProfesionalInputs], Mapping[str, Iterable[Any]]]
+
+
+@dataclass
+class ProfesionalBatch:
+    """Métricas de N empresas; cada campo es un arreglo de longitud N."""
+
+    dias_cartera: np.ndarray
+    dias_inventario_flujo: np.ndarray
+    dias_proveedores: np.ndarray
+    ciclo_caja: np.ndarray
+    estado_flujo: np.ndarray
+    rotacion_inventario: np.ndarray
+    dias_inventario_anual: np.ndarray
+    inventario_ideal_60d: np.ndarray
+    exceso_inventario: np.ndarray
+    estado_inventario: np.ndarray
+    utilidad_operativa: np.ndarray
+    margen_bruto: np.ndarray
+    margen_operativo: np.ndarray
+    ebitda: np.ndarray
+    estado_rentabilidad: np.ndarray
+    score_control: np.ndarray
+    estado_control: np.ndarray
+    flujo_atrapado_estimado: np.ndarray
+    margen_mejora_estimado: np.ndarray
+    dinero_recuperable_estimado: np.ndarray
+    indice_salud_0_100: np.ndarray
+    # Banderas de alerta (las mismas condiciones que generan ``alertas``).
+    alerta_flujo: np.ndarray
+    alerta_inventario: np.ndarray
+    alerta_rentabilidad: np.ndarray
+    alerta_control: np.ndarray
+    alerta_efectivo: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.indice_salud_0_100)
+
+    def row(self, k: int) -> ProfesionalMetrics:
+        """Empresa ``k`` como ``ProfesionalMetrics`` (idéntico al cálculo escalar)."""
+        values = {
+            f.name: getattr(self, f.name)[k].item()
+            for f in fields(ProfesionalMetrics)
+            if f.name != "alertas"
+        }
+        values["alertas"] = _alertas(
+            values["estado_flujo"],
+            values["ciclo_caja"],
+            values["estado_inventario"],
+            values["dias_inventario_anual"],
+            values["estado_rentabilidad"],
+            values["margen_bruto"],
+            values["estado_control"],
+            values["score_control"],
+            bool(self.alerta_efectivo[k]),
+        )
+        return ProfesionalMetrics(**values)
+
+    def columns(self) -> dict[str, list[Any]]:
+        return {f.name: getattr(self, f.name).tolist() for f in fields(self)}
+
+
+def _numeric_column(values: Iterable[Any], n: int) -> np.ndarray:
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiub":
+        return values.astype(float)
+    return np.fromiter((float(v or 0) for v in values), dtype=float, count=n)
+
+
+def _control_column(values: Iterable[Any], n: int) -> np.ndarray:
+    return np.fromiter(
+        (_letter_control_score(str(v or "C")) for v in values), dtype=float, count=n
+    )
+
+
+def _columns(inputs: BatchInputs) -> tuple[int, dict[str, np.ndarray]]:
+    if isinstance(inputs, Mapping):
+        n = len(next(iter(inputs.values()), []))
+        for name, col in inputs.items():
+            if len(col) != n:
+                raise ValueError(f"Columna {name} con {len(col)} valores; se esperaban {n}")
+        get = inputs.get
+    else:
+        n = len(inputs)
+        get = lambda name: [row.get(name) for row in inputs]  # noqa: E731
+    cols: dict[str, np.ndarray] = {}
+    for name in NUMERIC_FIELDS:
+        col = get(name)
+        cols[name] = np.zeros(n) if col is None else _numeric_column(col, n)
+    for name in CONTROL_FIELDS:
+        col = get(name)
+        cols[name] = np.full(n, _letter_control_score("C")) if col is None else _control_column(col, n)
+    return n, cols
+
+
+def _safe_div(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    ok = (b != 0) & np.isfinite(a) & np.isfinite(b)
+    return np.divide(a, b, out=np.zeros_like(a), where=ok)
+
+
+def _semaforo(rojo: np.ndarray, amarillo: np.ndarray) -> np.ndarray:
+    return np.where(rojo, "rojo", np.where(amarillo, "amarillo", "verde"))
+
+
+def _cal(estado: np.ndarray) -> np.ndarray:
+    return np.where(estado == "rojo", 28, np.where(estado == "amarillo", 55, 86))
+
+
+def compute_recupera_profesional_batch(inputs: BatchInputs) -> ProfesionalBatch:
+    _, c = _columns(inputs)
+    return _compute(c)
+
+
+def _compute(c: dict[str, np.ndarray]) -> ProfesionalBatch:
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        ventas = np.maximum(c["ventasMensuales"], 0.0)
+        cv = np.maximum(c["costoVentasMensual"], 0.0)
+        compras = np.maximum(c["comprasMensuales"], 0.0)
+        inv = np.maximum(c["inventarioTotal"], 0.0)
+        vb = np.where(ventas > 0, ventas, 1e-9)
+        cvb = np.where(cv > 0, cv, 1e-9)
+        compras_b = np.where(compras > 0, compras, 1e-9)
+
+        dias_cartera = _safe_div(c["cuentasPorCobrar"], vb) * 30
+        dias_inventario_flujo = _safe_div(inv, cvb) * 30
+        dias_proveedores = _safe_div(c["cuentasPorPagar"], compras_b) * 30
+        ciclo = dias_cartera + dias_inventario_flujo - dias_proveedores
+        estado_flujo = _semaforo(ciclo > 90, ciclo > 60)
+
+        rot = _safe_div(cv, np.where(inv > 0, inv, 1e-9))
+        dias_inv_anual = np.where(rot > 0, 365 / np.where(rot > 0, rot, 1.0), 999.0)
+        inv_ideal = (cv / 12) * 2
+        exceso = np.maximum(inv - inv_ideal, 0.0)
+        estado_inv = _semaforo(dias_inv_anual > 120, dias_inv_anual > 90)
+
+        uo = ventas - cv - c["gastosOperativos"]
+        mb = _safe_div(ventas - cv, vb)
+        mo = _safe_div(uo, vb)
+        ebitda = uo + c["depreciacion"]
+        estado_rent = _semaforo(mb < 0.2, mb < 0.3)
+
+        score_ctrl = (
+            c["controlPresupuesto"]
+            + c["controlRevision"]
+            + c["controlKpis"]
+            + c["controlFlujoProyectado"]
+        ) / 4
+        estado_ctrl = _semaforo(score_ctrl < 4, score_ctrl < 7)
+
+        flujo_atrap = np.where(ciclo > 60, vb * 0.1, 0.0)
+        margen_mej = vb * 0.05
+        dinero_rec = exceso + flujo_atrap + margen_mej
+
+        # np.rint redondea al par, igual que round() de Python.
+        idx = np.rint(
+            (_cal(estado_flujo) + _cal(estado_inv) + _cal(estado_rent) + _cal(estado_ctrl)) / 4
+        ).astype(int)
+
+    return ProfesionalBatch(
+        dias_cartera=dias_cartera,
+        dias_inventario_flujo=dias_inventario_flujo,
+        dias_proveedores=dias_proveedores,
+        ciclo_caja=ciclo,
+        estado_flujo=estado_flujo,
+        rotacion_inventario=rot,
+        dias_inventario_anual=dias_inv_anual,
+        inventario_ideal_60d=inv_ideal,
+        exceso_inventario=exceso,
+        estado_inventario=estado_inv,
+        utilidad_operativa=uo,
+        margen_bruto=mb,
+        margen_operativo=mo,
+        ebitda=ebitda,
+        estado_rentabilidad=estado_rent,
+        score_control=score_ctrl,
+        estado_control=estado_ctrl,
+        flujo_atrapado_estimado=flujo_atrap,
+        margen_mejora_estimado=margen_mej,
+        dinero_recuperable_estimado=dinero_rec,
+        indice_salud_0_100=idx,
+        alerta_flujo=estado_flujo != "verde",
+        alerta_inventario=estado_inv == "rojo",
+        alerta_rentabilidad=estado_rent == "rojo",
+        alerta_control=estado_ctrl != "verde",
+        alerta_efectivo=(c["efectivoDisponible"] <= 0) & (ventas > 0),
+    )
+
+
+# --- Escenarios what-if ---------------------------------------------------
+
+# Palancas → cómo modifican las entradas de la empresa base. Los días se
+# convierten a montos con las ventas/compras base (30 días = un mes).
+PALANCAS = {
+    "reduccion_dias_cartera": "días menos de cartera (baja cuentasPorCobrar)",
+    "extension_dias_proveedores": "días más de crédito con proveedores (sube cuentasPorPagar)",
+    "cierre_brecha_inventario": "fracción 0-1 del exceso sobre el ideal de 60 días que se libera",
+    "variacion_ventas": "cambio relativo de ventasMensuales (0.1 = +10%)",
+    "variacion_costo_ventas": "cambio relativo de costoVentasMensual",
+}
+
+METRICAS_ESCENARIO = (
+    "dinero_recuperable_estimado",
+    "ciclo_caja",
+    "estado_flujo",
+    "estado_inventario",
+    "estado_rentabilidad",
+    "indice_salud_0_100",
+)
+
+SEMAFOROS = ("verde", "amarillo", "rojo")
+
+MAX_ESCENARIOS = 500_000
+
+
+def _valores_palanca(spec: Any) -> np.ndarray:
+    """Lista de valores o rango ``{"desde", "hasta", "paso"}`` (incluye ``hasta``)."""
+    if isinstance(spec, Mapping):
+        desde, hasta, paso = float(spec["desde"]), float(spec["hasta"]), float(spec["paso"])
+        if not all(math.isfinite(x) for x in (desde, hasta, paso)):
+            raise ValueError("desde, hasta y paso deben ser finitos")
+        if paso <= 0:
+            raise ValueError("paso debe ser positivo")
+        # Se cuenta antes de asignar: un rango enorme no debe llegar a np.arange.
+        n = math.floor((hasta - desde) / paso + 0.5) + 1
+        if n > MAX_ESCENARIOS:
+            raise ValueError(f"{n} valores en un eje superan el máximo de {MAX_ESCENARIOS}")
+        valores = np.arange(desde, hasta + paso / 2, paso)
+    else:
+        valores = np.asarray(list(spec), dtype=float)
+    if valores.size == 0:
+        raise ValueError("Cada palanca necesita al menos un valor")
+    return valores
+
+
+def _codificar_semaforo(estado: np.ndarray) -> np.ndarray:
+    return np.where(estado == "rojo", 2, np.where(estado == "amarillo", 1, 0)).astype(np.int8)
+
+
+def compute_recupera_escenarios(
+    base: ProfesionalInputs,
+    palancas: Mapping[str, Any],
+    metricas: Optional[Sequence[str]] = None,
+) -> dict[str, Any]:
+    """Evalúa el producto cartesiano de ``palancas`` sobre la empresa ``base``.
+
+    Devuelve ``ejes`` (valores de cada palanca, en orden), ``forma`` de la
+    rejilla y cada métrica como arreglo aplanado en orden C (la última palanca
+    varía más rápido). Los semáforos van codificados 0/1/2 según ``SEMAFOROS``.
+    """
+    desconocidas = set(palancas) - set(PALANCAS)
+    if desconocidas:
+        raise ValueError(f"Palancas desconocidas: {', '.join(sorted(desconocidas))}")
+    metricas = list(metricas or METRICAS_ESCENARIO)
+    validas = {f.name for f in fields(ProfesionalBatch)}
+    invalidas = [m for m in metricas if m not in validas]
+    if invalidas:
+        raise ValueError(f"Métricas desconocidas: {', '.join(invalidas)}")
+
+    ejes = {name: _valores_palanca(spec) for name, spec in palancas.items()}
+    forma = tuple(v.size for v in ejes.values())
+    total = math.prod(forma)
+    if total > MAX_ESCENARIOS:
+        raise ValueError(f"{total} escenarios superan el máximo de {MAX_ESCENARIOS}")
+
+    _, base_cols = _columns([base])
+    c = {name: np.full(total, col[0]) for name, col in base_cols.items()}
+    mallas = dict(zip(ejes, (m.ravel() for m in np.meshgrid(*ejes.values(), indexing="ij"))))
+
+    ventas = np.maximum(base_cols["ventasMensuales"][0], 0.0)
+    vb = ventas if ventas > 0 else 1e-9
+    compras = np.maximum(base_cols["comprasMensuales"][0], 0.0)
+    compras_b = compras if compras > 0 else 1e-9
+    cv = np.maximum(base_cols["costoVentasMensual"][0], 0.0)
+    inv = np.maximum(base_cols["inventarioTotal"][0], 0.0)
+
+    if "reduccion_dias_cartera" in mallas:
+        cxc = c["cuentasPorCobrar"]
+        rebajada = np.maximum(cxc - mallas["reduccion_dias_cartera"] * vb / 30, 0.0)
+        c["cuentasPorCobrar"] = np.where(cxc > 0, rebajada, cxc)
+    if "extension_dias_proveedores" in mallas:
+        cxp = c["cuentasPorPagar"] + mallas["extension_dias_proveedores"] * compras_b / 30
+        c["cuentasPorPagar"] = np.maximum(cxp, 0.0)
+    if "cierre_brecha_inventario" in mallas:
+        exceso = max(inv - (cv / 12) * 2, 0.0)
+        fraccion = np.clip(mallas["cierre_brecha_inventario"], 0.0, 1.0)
+        c["inventarioTotal"] = inv - fraccion * exceso
+    if "variacion_ventas" in mallas:
+        c["ventasMensuales"] = c["ventasMensuales"] * (1 + mallas["variacion_ventas"])
+    if "variacion_costo_ventas" in mallas:
+        c["costoVentasMensual"] = c["costoVentasMensual"] * (1 + mallas["variacion_costo_ventas"])
+
+    batch = _compute(c)
+    salida: dict[str, list[Any]] = {}
+    for name in metricas:
+        arr = getattr(batch, name)
+        if arr.dtype.kind == "U":
+            arr = _codificar_semaforo(arr)
+        salida[name] = arr.tolist()
+    return {
+        "ejes": {name: v.tolist() for name, v in ejes.items()},
+        "forma": list(forma),
+        "n": total,
+        "semaforos": list(SEMAFOROS),
+        "metricas": salida,
+    }
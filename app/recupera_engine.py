@@ -106,6 +106,37 @@ def _score_to_cal(e: Semaforo) -> int:
     return 86
 
 
+def _alertas(
+    estado_flujo: Semaforo,
+    ciclo: float,
+    estado_inv: Semaforo,
+    dias_inv_anual: float,
+    estado_rent: Semaforo,
+    mb: float,
+    estado_ctrl: Semaforo,
+    score_ctrl: float,
+    sin_efectivo: bool,
+) -> list[str]:
+    alertas: list[str] = []
+    if estado_flujo == "rojo":
+        alertas.append(f"Ciclo de caja elevado ({round(ciclo)} días): riesgo alto de liquidez.")
+    elif estado_flujo == "amarillo":
+        alertas.append(f"Ciclo de caja en zona de alerta ({round(ciclo)} días).")
+    if estado_inv == "rojo":
+        alertas.append(
+            f"Inventario con {round(dias_inv_anual)} días de cobertura: capital inmovilizado."
+        )
+    if estado_rent == "rojo":
+        alertas.append(f"Margen bruto {mb * 100:.1f}% por debajo del umbral de referencia (20%).")
+    if estado_ctrl in ("rojo", "amarillo"):
+        alertas.append(
+            f"Madurez de control financiero {score_ctrl:.1f}/10: decisiones y seguimiento pueden mejorar."
+        )
+    if sin_efectivo:
+        alertas.append("Efectivo disponible en cero o negativo: revisar liquidez inmediata.")
+    return alertas
+
+
 def compute_recupera_profesional(i: ProfesionalInputs) -> ProfesionalMetrics:
     ventas = max(float(i.get("ventasMensuales") or 0), 0.0)
     cv = max(float(i.get("costoVentasMensual") or 0), 0.0)
@@ -162,23 +193,17 @@ def compute_recupera_profesional(i: ProfesionalInputs) -> ProfesionalMetrics:
         / 4
     )
 
-    alertas: list[str] = []
-    if estado_flujo == "rojo":
-        alertas.append(f"Ciclo de caja elevado ({round(ciclo)} días): riesgo alto de liquidez.")
-    elif estado_flujo == "amarillo":
-        alertas.append(f"Ciclo de caja en zona de alerta ({round(ciclo)} días).")
-    if estado_inv == "rojo":
-        alertas.append(
-            f"Inventario con {round(dias_inv_anual)} días de cobertura: capital inmovilizado."
-        )
-    if estado_rent == "rojo":
-        alertas.append(f"Margen bruto {mb * 100:.1f}% por debajo del umbral de referencia (20%).")
-    if estado_ctrl in ("rojo", "amarillo"):
-        alertas.append(
-            f"Madurez de control financiero {score_ctrl:.1f}/10: decisiones y seguimiento pueden mejorar."
-        )
-    if efectivo <= 0 and ventas > 0:
-        alertas.append("Efectivo disponible en cero o negativo: revisar liquidez inmediata.")
+    alertas = _alertas(
+        estado_flujo,
+        ciclo,
+        estado_inv,
+        dias_inv_anual,
+        estado_rent,
+        mb,
+        estado_ctrl,
+        score_ctrl,
+        efectivo <= 0 and ventas > 0,
+    )
 
     return ProfesionalMetrics(
         dias_cartera=dias_cartera,
@@ -0,0 +1,163 @@
+"""Modo de calidad de los diagnósticos: ``fast`` (reglas) o ``full`` (modelo).
+
+Cada analizador ya arma un reporte completo sin LLM (su fallback). Con
+``?mode=fast`` ese reporte se devuelve directamente, en milisegundos; ``full``
+(predeterminado) sigue usando el modelo y, en streaming, envía primero el
+reporte rápido como evento ``fast`` para que el cliente lo muestre mientras
+llega la versión del modelo.
+
+Bajo carga, ``full`` se degrada solo a ``fast`` en lugar de esperar en la cola
+del limitador hasta el timeout: cuando la cola del proveedor supera
+LLM_FAST_QUEUE_PCT de su máximo, o cuando el limitador rechaza la llamada
+(``LLMOverloaded``). Los reportes rápidos llevan ``"modo": "fast"`` y, si
+vienen de una degradación, ``"modo_degradado": true``.
+
+Variables de entorno:
+- LLM_FAST_AUTO (1) — 0 desactiva la degradación automática (se vuelve al 503).
+- LLM_FAST_QUEUE_PCT (0.5) — ocupación de la cola a partir de la cual se degrada.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.llm_limits import LLMOverloaded, get_limiter, queue_load
+
+MODES = ("fast", "full")
+DEGRADADO = "degradado"
+
+Event = Tuple[str, Any]
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def auto_enabled() -> bool:
+    return os.getenv("LLM_FAST_AUTO", "1").strip() != "0"
+
+
+_stats_lock = threading.Lock()
+_stats: dict[str, Counter] = {}
+
+
+def _contar(tipo: str, modo: str) -> None:
+    with _stats_lock:
+        _stats.setdefault(tipo, Counter())[modo] += 1
+
+
+def modes_snapshot() -> dict[str, Any]:
+    with _stats_lock:
+        return {tipo: dict(c) for tipo, c in _stats.items()}
+
+
+def resolver(mode: Optional[str], provider: Optional[str] = "anthropic") -> str:
+    """``fast``, ``full`` o ``degradado`` (se pidió ``full`` pero la cola está saturada).
+
+    ``provider=None``: el analizador no pasa por un limitador y nunca se degrada
+    por cola.
+    """
+    modo = (mode or "full").strip().lower()
+    if modo not in MODES:
+        raise HTTPException(status_code=422, detail=f"mode debe ser uno de {', '.join(MODES)}")
+    if (
+        modo == "full"
+        and provider is not None
+        and auto_enabled()
+        and queue_load(provider) >= _env_num("LLM_FAST_QUEUE_PCT", 0.5)
+    ):
+        return DEGRADADO
+    return modo
+
+
+def _marcar(out: dict[str, Any], degradado: bool) -> dict[str, Any]:
+    out["modo"] = "fast"
+    if degradado:
+        out["modo_degradado"] = True
+    return out
+
+
+async def analizar(
+    tipo: str,
+    modo: str,
+    fast: Callable[[], dict[str, Any]],
+    full: Callable[[], Awaitable[dict[str, Any]]],
+) -> dict[str, Any]:
+    """Ejecuta el analizador según ``modo`` (de ``resolver``)."""
+    if modo != "full":
+        _contar(tipo, modo)
+        return _marcar(fast(), modo == DEGRADADO)
+    try:
+        out = await full()
+    except LLMOverloaded:
+        if not auto_enabled():
+            raise
+        _contar(tipo, DEGRADADO)
+        return _marcar(fast(), True)
+    _contar(tipo, "full")
+    return out
+
+
+def analizar_stream(
+    tipo: str,
+    modo: str,
+    fast: Callable[[], dict[str, Any]],
+    full: Callable[[], AsyncIterator[Event]],
+    provider: str = "anthropic",
+) -> AsyncIterator[Event]:
+    """Versión SSE. En ``full`` emite ``fast`` con el reporte por reglas antes de
+    los eventos del modelo; si el limitador rechaza la llamada a mitad del flujo
+    (error 503 emitido o ``LLMOverloaded`` lanzada), el ``result`` es ese mismo
+    reporte degradado.
+
+    La admisión y la validación de ``full()`` ocurren aquí, antes de abrir el
+    flujo, para que un body inválido siga respondiendo 400 (y, sin degradación
+    automática, la cola llena 503)."""
+    eventos = None
+    if modo == "full":
+        try:
+            get_limiter(provider).check_admission()
+        except LLMOverloaded:
+            if not auto_enabled():
+                raise
+            modo = DEGRADADO
+        else:
+            eventos = full()
+    return _eventos(tipo, modo, fast, eventos)
+
+
+async def _eventos(
+    tipo: str,
+    modo: str,
+    fast: Callable[[], dict[str, Any]],
+    eventos: Optional[AsyncIterator[Event]],
+) -> AsyncIterator[Event]:
+    rapido = fast()
+    if eventos is None:
+        _contar(tipo, modo)
+        yield "result", _marcar(rapido, modo == DEGRADADO)
+        return
+    yield "fast", _marcar(dict(rapido), False)
+    try:
+        async for event, data in eventos:
+            yield event, data
+            if event == "error" and isinstance(data, dict) and data.get("status") == 503 and auto_enabled():
+                _contar(tipo, DEGRADADO)
+                yield "result", _marcar(rapido, True)
+                return
+    except LLMOverloaded:
+        # P. ej. ``flight.follow`` en llm_general: el rechazo sube como excepción.
+        if not auto_enabled():
+            raise
+        _contar(tipo, DEGRADADO)
+        yield "result", _marcar(rapido, True)
+        return
+    _contar(tipo, "full")
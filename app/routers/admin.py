@@ -0,0 +1,59 @@
+"""/api/admin — estado operativo de la capa LLM (circuitos, métricas, caché, límites).
+
+Cada llamada debe enviar el header X-Admin-Token igual a ADMIN_TOKEN. Sin
+ADMIN_TOKEN configurado las rutas no existen (404): nunca quedan abiertas.
+"""
+
+from __future__ import annotations
+
+import hmac
+import os
+from typing import Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.chat_faq import get_semantic_cache, tiers_snapshot
+from app.llm_cache import get_cache
+from app.llm_circuit import breakers_snapshot, reset_breaker
+from app.llm_limits import limiters_snapshot
+from app.llm_metrics import compaction_snapshot, ttft_snapshot, usage_snapshot
+from app.llm_tokens import presupuestos_snapshot
+from app.report_mode import modes_snapshot
+
+
+def _require_admin(x_admin_token: str = Header(default="")) -> None:
+    expected = os.getenv("ADMIN_TOKEN", "").strip()
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="X-Admin-Token inválido")
+
+
+router = APIRouter(tags=["admin"], dependencies=[Depends(_require_admin)])
+
+
+@router.get("/llm/circuits")
+def llm_circuits() -> dict[str, Any]:
+    return {"circuits": breakers_snapshot()}
+
+
+@router.post("/llm/circuits/{name}/reset")
+def llm_circuit_reset(name: str) -> dict[str, Any]:
+    if not reset_breaker(name):
+        raise HTTPException(status_code=404, detail=f"Circuito desconocido: {name}")
+    return {"ok": True, "circuit": name}
+
+
+@router.get("/llm/metrics")
+def llm_metrics() -> dict[str, Any]:
+    return {
+        "usage": usage_snapshot(),
+        "ttft": ttft_snapshot(),
+        "compaction": compaction_snapshot(),
+        "token_budgets": presupuestos_snapshot(),
+        "cache": get_cache().stats(),
+        "limits": limiters_snapshot(),
+        "chat_faq": tiers_snapshot(),
+        "semantic_cache": get_semantic_cache().stats(),
+        "report_modes": modes_snapshot(),
+    }
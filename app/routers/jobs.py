@@ -0,0 +1,19 @@
+"""/api/jobs — estado y resultado de los diagnósticos encolados con ``?async=1``."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
+
+from app.jobs import get_jobs, public_view
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.get("/{job_id}")
+def job_status(job_id: str) -> dict[str, Any]:
+    job = get_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    return public_view(job)
@@ -9,6 +9,8 @@ from fastapi import APIRouter
 from pydantic import BaseModel, Field
 
 from app.llm_anthropic import call_claude_json
+from app.report_mode import analizar, resolver
+from app.text_match import KeywordMatcher
 
 router = APIRouter(tags=["recupera-express"])
 
@@ -54,22 +56,27 @@ Inferir nivel_desorden y riesgos_detectados desde el texto. Si no hay montos, di
 Contexto: PyMEs México; menciona contrastar con prácticas sectoriales y datos públicos (INEGI, Economía) solo como recomendación de fuente, sin cifras macro inventadas."""
 
 
+_SENALES = KeywordMatcher(
+    {
+        "crisis": ["quiebra", "crisis", "no alcanza", "no pago", "deuda"],
+        "orden": ["orden", "control", "kpi", "sistema"],
+        "flujo": ["cobrar", "flujo", "caja", "liquidez", "pagar"],
+        "inventario": ["inventario", "stock", "almacén"],
+        "rentabilidad": ["margen", "rentab", "descuento", "cliente"],
+    }
+)
+
+
 def _fallback(body: RecuperaExpressBody) -> dict[str, Any]:
     r = body.respuestas
-    blob = " ".join(str(v) for v in r.values())[:2000].lower()
+    senales = _SENALES.categorias(" ".join(str(v) for v in r.values())[:2000])
     idx = 42
-    if any(x in blob for x in ["quiebra", "crisis", "no alcanza", "no pago", "deuda"]):
+    if "crisis" in senales:
         idx = 28
-    elif any(x in blob for x in ["orden", "control", "kpi", "sistema"]):
+    elif "orden" in senales:
         idx = 68
     nd = "ALTO" if idx < 38 else "MEDIO" if idx < 58 else "BAJO"
-    risks = []
-    if any(x in blob for x in ["cobrar", "flujo", "caja", "liquidez", "pagar"]):
-        risks.append("flujo")
-    if any(x in blob for x in ["inventario", "stock", "almacén"]):
-        risks.append("inventario")
-    if any(x in blob for x in ["margen", "rentab", "descuento", "cliente"]):
-        risks.append("rentabilidad")
+    risks = [k for k in ("flujo", "inventario", "rentabilidad") if k in senales]
     if not risks:
         risks = ["flujo", "control"]
     return {
@@ -108,8 +115,7 @@ def _fallback(body: RecuperaExpressBody) -> dict[str, Any]:
     }
 
 
-@router.post("/analyze")
-def analyze_recupera_express(body: RecuperaExpressBody) -> dict[str, Any]:
+async def _analizar_con_modelo(body: RecuperaExpressBody) -> dict[str, Any]:
     user = json.dumps(
         {
             "empresa": body.nombreEmpresa,
@@ -120,7 +126,7 @@ def analyze_recupera_express(body: RecuperaExpressBody) -> dict[str, Any]:
         },
         ensure_ascii=False,
     )
-    llm = call_claude_json(SYSTEM, user)
+    llm = await call_claude_json(SYSTEM, user, tag="recupera_express")
     if not llm or not (llm.get("resumen_ejecutivo") or llm.get("recomendacion_general")):
         llm = _fallback(body)
     else:
@@ -128,3 +134,10 @@ def analyze_recupera_express(body: RecuperaExpressBody) -> dict[str, Any]:
     if "tipo" not in llm:
         llm["tipo"] = "recupera-express"
     return llm
+
+
+@router.post("/analyze")
+async def analyze_recupera_express(body: RecuperaExpressBody, mode: str = "full") -> dict[str, Any]:
+    return await analizar(
+        "recupera_express", resolver(mode), lambda: _fallback(body), lambda: _analizar_con_modelo(body)
+    )
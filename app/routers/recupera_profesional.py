@@ -1,15 +1,17 @@
-"""POST /api/diagnostico/recupera-profesional/analyze"""
+"""POST /api/diagnostico/recupera-profesional/analyze, /batch y /escenarios (solo motor, sin LLM)"""
 
 from __future__ import annotations
 
 import json
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
 from app.llm_anthropic import call_claude_json
+from app.recupera_batch import compute_recupera_escenarios, compute_recupera_profesional_batch
 from app.recupera_engine import ProfesionalInputs, compute_recupera_profesional, metrics_to_dict
+from app.report_mode import analizar, resolver
 
 router = APIRouter(tags=["recupera-profesional"])
 
@@ -24,6 +26,22 @@ class ProfesionalBody(BaseModel):
     inputs: dict[str, Any] = Field(default_factory=dict)
 
 
+class ProfesionalBatchBody(BaseModel):
+    """Cartera de empresas: lista de ``inputs`` o columnas ``{campo: [valores]}``."""
+
+    inputs: list[dict[str, Any]] = Field(default_factory=list)
+    columnas: dict[str, list[Any]] = Field(default_factory=dict)
+    formato: Literal["filas", "columnas"] = "filas"
+
+
+class EscenariosBody(BaseModel):
+    """Empresa base + palancas what-if (lista de valores o ``{desde, hasta, paso}``)."""
+
+    inputs: dict[str, Any] = Field(default_factory=dict)
+    palancas: dict[str, Any] = Field(default_factory=dict)
+    metricas: Optional[list[str]] = None
+
+
 SYSTEM = """Eres consultor senior en rescate financiero de PyMEs en México (comercio y distribución).
 Recibes métricas ya calculadas del método R.E.C.U.P.E.R.A.™ Profesional.
 Debes responder SOLO un JSON válido (sin markdown) con esta forma exacta:
@@ -147,12 +165,7 @@ def _fallback_llm_payload(metrics: dict, body: ProfesionalBody) -> dict[str, Any
     }
 
 
-@router.post("/analyze")
-def analyze_recupera_profesional(body: ProfesionalBody) -> dict[str, Any]:
-    inputs_cast: ProfesionalInputs = body.inputs  # type: ignore[assignment]
-    met = compute_recupera_profesional(inputs_cast)
-    metrics = metrics_to_dict(met)
-
+async def _analizar_con_modelo(body: ProfesionalBody, metrics: dict) -> dict[str, Any]:
     user = json.dumps(
         {
             "empresa": body.nombreEmpresa,
@@ -163,9 +176,49 @@ def analyze_recupera_profesional(body: ProfesionalBody) -> dict[str, Any]:
         ensure_ascii=False,
     )
 
-    llm = call_claude_json(SYSTEM, user)
+    llm = await call_claude_json(SYSTEM, user, tag="recupera_profesional")
     if not llm or not (llm.get("resumen_ejecutivo") or llm.get("recomendacion_general")):
         llm = _fallback_llm_payload(metrics, body)
 
     out = {**llm, "recupera_metricas": metrics, "tipo": "recupera-profesional"}
     return out
+
+
+@router.post("/analyze")
+async def analyze_recupera_profesional(body: ProfesionalBody, mode: str = "full") -> dict[str, Any]:
+    modo = resolver(mode)
+    inputs_cast: ProfesionalInputs = body.inputs  # type: ignore[assignment]
+    met = compute_recupera_profesional(inputs_cast)
+    metrics = metrics_to_dict(met)
+
+    def fast() -> dict[str, Any]:
+        return {**_fallback_llm_payload(metrics, body), "recupera_metricas": metrics, "tipo": "recupera-profesional"}
+
+    return await analizar("recupera_profesional", modo, fast, lambda: _analizar_con_modelo(body, metrics))
+
+
+@router.post("/batch")
+def batch_recupera_profesional(body: ProfesionalBatchBody) -> dict[str, Any]:
+    """Métricas de toda la cartera en una pasada vectorizada; no llama al modelo."""
+    if body.inputs and body.columnas:
+        raise HTTPException(status_code=422, detail="Envía inputs o columnas, no ambos")
+    try:
+        batch = compute_recupera_profesional_batch(body.columnas or body.inputs)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+    if body.formato == "columnas":
+        resultados: Any = batch.columns()
+    else:
+        resultados = [metrics_to_dict(batch.row(k)) for k in range(len(batch))]
+    return {"n": len(batch), "resultados": resultados, "tipo": "recupera-profesional-batch"}
+
+
+@router.post("/escenarios")
+def escenarios_recupera_profesional(body: EscenariosBody) -> dict[str, Any]:
+    """Rejilla de sensibilidad sobre el motor: todas las combinaciones en una pasada."""
+    try:
+        out = compute_recupera_escenarios(body.inputs, body.palancas, body.metricas)  # type: ignore[arg-type]
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Escenarios inválidos: {e}") from e
+    return {**out, "tipo": "recupera-profesional-escenarios"}
@@ -0,0 +1,76 @@
+"""Server-Sent Events para los diagnósticos largos.
+
+Los analizadores en modo streaming son generadores asíncronos de tuplas
+(evento, datos). Convención de eventos:
+
+- ``fast``: reporte completo por reglas (app/report_mode.py), antes que el del modelo.
+- ``scores``: resultados precalculados localmente (se envían de inmediato).
+- ``delta``: fragmento de texto del modelo (``{"text": "..."}``).
+- ``field``: clave de primer nivel (o elemento de un arreglo de primer nivel)
+  ya cerrada en el JSON del modelo (``{"path": "...", "value": ...}``).
+- ``error``: el modelo falló; le sigue un ``result`` de respaldo, salvo si el
+  limitador rechazó la llamada (``status: 503`` + ``retry_after``) y la
+  degradación automática a ``fast`` está desactivada.
+- ``result``: el reporte final, idéntico al de la respuesta JSON normal.
+- ``done``: fin del flujo.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, AsyncIterator, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Any]
+
+
+def wants_stream(request: Request, stream: bool = False) -> bool:
+    """``?stream=1`` o ``Accept: text/event-stream``."""
+    if stream:
+        return True
+    return "text/event-stream" in request.headers.get("accept", "").lower()
+
+
+def error_payload(e: Exception) -> dict[str, Any]:
+    """Datos del evento ``error``; incluye status y retry_after si el fallo los trae
+    (p. ej. 503 por saturación del limitador LLM)."""
+    if isinstance(e, HTTPException):
+        payload: dict[str, Any] = {"detail": e.detail, "status": e.status_code}
+    else:
+        payload = {"detail": str(e)}
+    retry_after = getattr(e, "retry_after", None)
+    if retry_after is not None:
+        payload["retry_after"] = retry_after
+    return payload
+
+
+def sse_event(event: str, data: Any) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def _encode(events: AsyncIterator[Event]) -> AsyncIterator[str]:
+    try:
+        async for event, data in events:
+            yield sse_event(event, data)
+    except Exception as e:  # noqa: BLE001
+        logger.exception("Error en flujo SSE")
+        yield sse_event("error", error_payload(e))
+    yield sse_event("done", {})
+
+
+def sse_response(events: AsyncIterator[Event]) -> StreamingResponse:
+    return StreamingResponse(
+        _encode(events),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Evita que nginx / el proxy de Railway acumulen la respuesta.
+            "X-Accel-Buffering": "no",
+        },
+    )
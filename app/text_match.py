@@ -0,0 +1,113 @@
+"""Detección de palabras clave en una sola pasada (Aho-Corasick).
+
+Los analizadores heurísticos (sentimiento y patrones de riesgo de emergencia,
+dominios de profundo, respuestas rápidas de los chats, fallback de
+R.E.C.U.P.E.R.A. Express) buscaban sus listas con ``any(kw in texto ...)``: una
+pasada por palabra clave y por llamada. ``KeywordMatcher`` compila todas las
+palabras clave de un analizador, agrupadas por categoría, en un autómata que se
+construye una vez al importar el módulo y recorre el texto una sola vez.
+
+Texto y palabras clave pasan por la misma normalización (app.text_normalize:
+sin acentos, minúsculas, espacios colapsados, raíz de plurales), así que
+"diagnóstico" coincide con "diagnostico" y "sin ventas" con "SIN VENTA". Un
+texto ya ``Normalizado`` no se vuelve a procesar. Sobre el texto normalizado, la
+semántica es la de ``kw in texto``: subcadena, sin límites de palabra.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+
+from app.text_normalize import normalizar
+
+
+@dataclass(frozen=True)
+class Coincidencia:
+    inicio: int  # posiciones en el texto normalizado
+    fin: int
+    patron: str
+    categoria: str
+    orden: int  # posición del patrón al construir el matcher (prioridad)
+
+
+class KeywordMatcher:
+    def __init__(self, patrones: Mapping[str, Iterable[str]] | Iterable[tuple[str, str]]) -> None:
+        """``patrones``: ``{categoria: [palabras...]}`` o pares ``(categoria, palabra)``.
+
+        Una palabra puede pertenecer a varias categorías; ``orden`` sigue el
+        orden de entrada y decide ``primero``.
+        """
+        pares = (
+            [(cat, kw) for cat, kws in patrones.items() for kw in kws]
+            if isinstance(patrones, Mapping)
+            else list(patrones)
+        )
+        self._patrones: list[tuple[str, str, int]] = []  # (patrón normalizado, categoría, orden)
+        self._goto: list[dict[str, int]] = [{}]
+        self._salida: list[tuple[int, ...]] = [()]
+        for orden, (categoria, kw) in enumerate(pares):
+            patron = normalizar(kw)
+            if not patron:
+                continue
+            estado = 0
+            for ch in patron:
+                siguiente = self._goto[estado].get(ch)
+                if siguiente is None:
+                    siguiente = len(self._goto)
+                    self._goto[estado][ch] = siguiente
+                    self._goto.append({})
+                    self._salida.append(())
+                estado = siguiente
+            self._salida[estado] += (len(self._patrones),)
+            self._patrones.append((patron, categoria, orden))
+        self._fallo = [0] * len(self._goto)
+        self._enlazar()
+
+    def _enlazar(self) -> None:
+        """Enlaces de fallo por BFS; cada estado hereda las salidas de su sufijo."""
+        cola = deque(self._goto[0].values())
+        while cola:
+            estado = cola.popleft()
+            for ch, hijo in self._goto[estado].items():
+                f = self._fallo[estado]
+                while f and ch not in self._goto[f]:
+                    f = self._fallo[f]
+                destino = self._goto[f].get(ch, 0)
+                self._fallo[hijo] = destino if destino != hijo else 0
+                self._salida[hijo] += self._salida[self._fallo[hijo]]
+                cola.append(hijo)
+
+    def _ids(self, texto: str) -> Iterable[tuple[int, int]]:
+        goto, fallo, salida = self._goto, self._fallo, self._salida
+        estado = 0
+        for i, ch in enumerate(normalizar(texto)):
+            while estado and ch not in goto[estado]:
+                estado = fallo[estado]
+            estado = goto[estado].get(ch, 0)
+            for pid in salida[estado]:
+                yield i + 1, pid
+
+    def buscar(self, texto: str) -> list[Coincidencia]:
+        """Todas las coincidencias (incluidas las solapadas), en orden de aparición."""
+        out = []
+        for fin, pid in self._ids(texto):
+            patron, categoria, orden = self._patrones[pid]
+            out.append(Coincidencia(fin - len(patron), fin, patron, categoria, orden))
+        return out
+
+    def categorias(self, texto: str) -> dict[str, set[str]]:
+        """Categoría → palabras clave distintas encontradas."""
+        out: dict[str, set[str]] = {}
+        for pid in {pid for _, pid in self._ids(texto)}:
+            patron, categoria, _ = self._patrones[pid]
+            out.setdefault(categoria, set()).add(patron)
+        return out
+
+    def primero(self, texto: str) -> str | None:
+        """Categoría de la palabra clave encontrada con menor ``orden``."""
+        ids = {pid for _, pid in self._ids(texto)}
+        if not ids:
+            return None
+        return self._patrones[min(ids, key=lambda pid: self._patrones[pid][2])][1]
@@ -0,0 +1,65 @@
+"""Normalización de texto libre para las heurísticas de palabras clave.
+
+Una sola etapa, aplicada una vez por solicitud y compartida por todos los
+analizadores que la necesitan (en lugar de que cada uno haga ``.lower()`` y
+vuelva a unir los mismos campos):
+
+1. Unicode NFKD sin marcas diacríticas y en minúsculas ("Almacén" → "almacen").
+2. Espacios colapsados ("no   sé" → "no se").
+3. Raíz simple de plurales ("proveedores" → "proveedor", "ventas" → "venta").
+
+``normalizar`` devuelve un ``Normalizado`` (un ``str``) para que
+app.text_match no lo vuelva a procesar; las palabras clave pasan por la misma
+función al compilarse, así que "sin ventas" coincide con "SIN VENTA".
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Iterable, Mapping
+
+_PALABRA = re.compile(r"[^\W\d_]{4,}")
+# "-es" se quita tras estas consonantes (proveedores → proveedor, ciudades → ciudad);
+# en otro caso solo "-s" (clientes → cliente).
+_PLURAL_ES = frozenset("rlndzj")
+
+
+class Normalizado(str):
+    """Texto que ya pasó por ``normalizar``."""
+
+    __slots__ = ()
+
+
+def plegar(texto: str) -> str:
+    """Minúsculas y sin marcas diacríticas (á → a, ü → u, ñ → n)."""
+    texto = texto.lower()
+    if texto.isascii():
+        return texto
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def _raiz(m: re.Match) -> str:
+    w = m.group()
+    if w.endswith("es") and len(w) > 4 and w[-3] in _PLURAL_ES:
+        return w[:-2]
+    if w.endswith("s") and not w.endswith("ss"):
+        return w[:-1]
+    return w
+
+
+def normalizar(texto: Any) -> Normalizado:
+    if isinstance(texto, Normalizado):
+        return texto
+    texto = " ".join(plegar("" if texto is None else str(texto)).split())
+    return Normalizado(_PALABRA.sub(_raiz, texto))
+
+
+def unir(partes: Iterable[Normalizado]) -> Normalizado:
+    """Une textos ya normalizados sin volver a procesarlos."""
+    return Normalizado(" ".join(p for p in partes if p))
+
+
+def normalizar_campos(data: Mapping[str, Any], campos: Iterable[str]) -> dict[str, Normalizado]:
+    """Campos de texto de una solicitud, normalizados una sola vez."""
+    return {c: normalizar(data.get(c) or "") for c in campos}
@@ -0,0 +1,116 @@
+"""
+Pruebas del nivel local de respuestas de los chats (app/chat_faq.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_chat_faq.py
+"""
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.chat_faq import FaqIndex, SemanticCache
+
+_ENTRADAS = [
+    ("precios", ["cuánto cuesta", "precio", "tarifa"], "Consulta las FAQs."),
+    ("registro", ["cómo me registro", "crear una cuenta"], "Da clic en Registro."),
+]
+
+
+class TestFaqIndex(unittest.TestCase):
+    def test_tolera_erratas_y_acentos(self):
+        idx = FaqIndex(_ENTRADAS)
+        for q in ("¿Cuánto cuesta?", "cuanto cuetsa", "COMO ME REGISTRO"):
+            self.assertIsNotNone(idx.buscar(q), q)
+        self.assertEqual(idx.buscar("como me registro?").intencion, "registro")
+
+    def test_mensaje_largo_no_coincide(self):
+        idx = FaqIndex(_ENTRADAS)
+        self.assertIsNone(idx.buscar("mi empresa vende zapatos y quiero saber cómo crecer en ventas"))
+        self.assertIsNone(idx.buscar(""))
+
+
+class TestSemanticCache(unittest.TestCase):
+    def test_otra_redaccion(self):
+        cache = SemanticCache(ttl=60)
+        cache.set("chat:v1", "¿Sirve MentHIA para restaurantes?", "r")
+        self.assertEqual(cache.get("chat:v1", "sirve menthia para un restaurante"), "r")
+        self.assertIsNone(cache.get("chat:v1", "sirve menthia para hoteles?"))
+        self.assertIsNone(cache.get("otro:v1", "¿Sirve MentHIA para restaurantes?"))
+
+    def test_version_de_prompt_invalida(self):
+        cache = SemanticCache(ttl=60)
+        cache.set("chat:v1", "¿Qué es MentHIA?", "r")
+        self.assertIsNone(cache.get("chat:v2", "¿Qué es MentHIA?"))
+        self.assertIsNone(cache.get("chat:v1", "¿Qué es MentHIA?"))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_y_ttl(self):
+        cache = SemanticCache(ttl=60, max_entries=1)
+        cache.set("chat:v1", "¿Qué es MentHIA?", "r")
+        cache.set("chat:v1", "otra pregunta distinta", "x")
+        self.assertIsNone(cache.get("chat:v1", "¿Qué es MentHIA?"))
+        self.assertEqual(len(cache._bandas), 16)  # solo las bandas de la entrada viva
+        next(iter(cache._mem.values())).expira = time.time() - 1
+        self.assertIsNone(cache.get("chat:v1", "otra pregunta distinta"))
+        self.assertEqual(cache.stats(), {"entries": 0, "hits": 0, "misses": 2})
+
+
+class TestChatbot(unittest.TestCase):
+    def setUp(self):
+        import app.chat_faq as chat_faq
+
+        chat_faq._cache = SemanticCache()
+
+    def test_faq_sin_modelo(self):
+        from app.llm_chatbot import _RESPUESTAS, handle_chatbot
+
+        mock = AsyncMock(return_value="no")
+        with patch("app.llm_chatbot.call_claude_text", mock):
+            out = asyncio.run(handle_chatbot({"message": "¿Cuánto cuesta?"}))
+        self.assertEqual(out["reply"], _RESPUESTAS["precios"])
+        mock.assert_not_called()
+
+    def test_respuesta_aprendida(self):
+        from app.llm_chatbot import handle_chatbot
+
+        q = "mi empresa vende zapatos, ¿por dónde empiezo?"
+        mock = AsyncMock(return_value=" Empieza con MENTHIA 360. ")
+        with patch("app.llm_chatbot.call_claude_text", mock):
+            first = asyncio.run(handle_chatbot({"message": q}))
+            second = asyncio.run(handle_chatbot({"message": "Mi empresa vende zapatos: ¿por donde empiezo"}))
+            asyncio.run(
+                handle_chatbot({"message": q, "messages": [{"sender": "user", "text": "hola"}]})
+            )
+        self.assertEqual(first, second)
+        self.assertEqual(mock.call_count, 2)  # con historial no se reutiliza
+
+
+    def test_grok_ayuda_reutiliza(self):
+        from app.llm_grok_ayuda import chat_grok_ayuda
+
+        with patch("app.llm_grok_ayuda.get_breaker") as breaker, patch(
+            "app.llm_grok_ayuda.get_clients"
+        ) as clients, patch.dict("os.environ", {"OPENAI_API_KEY": "k"}):
+            breaker.return_value.allow.return_value = True
+            clients.return_value.http.return_value.post = AsyncMock(
+                return_value=_Respuesta(200, {"choices": [{"message": {"content": "Precio - costo variable."}}]})
+            )
+            first = asyncio.run(chat_grok_ayuda("¿Cómo calculo la contribución marginal?"))
+            second = asyncio.run(chat_grok_ayuda("como se calcula la contribucion marginal"))
+            post = clients.return_value.http.return_value.post
+        self.assertEqual(first, second)
+        self.assertEqual(post.call_count, 1)
+
+
+class _Respuesta:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+if __name__ == "__main__":
+    unittest.main()
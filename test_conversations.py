@@ -0,0 +1,193 @@
+"""
+Pruebas del historial de conversaciones en el servidor (app/conversations.py)
+y del agente F.I.N.A.N.C.I.A. con conversationId y resumen de turnos antiguos,
+sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_conversations.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+
+from app.conversations import ConversationStore
+
+
+class TestConversationStore(unittest.TestCase):
+    def test_append_y_ttl(self):
+        store = ConversationStore(ttl=60)
+        conv = store.create([{"role": "user", "content": "hola"}], {"fullName": "Ana"})
+        store.append(conv, {"role": "assistant", "content": "¿objetivo?"})
+        self.assertEqual(len(store.get(conv.id).messages), 2)
+        conv.updated_at = time.time() - 120
+        self.assertIsNone(store.get(conv.id))
+
+    def test_lru_recarga_de_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "conv.db")
+            store = ConversationStore(max_entries=1, db_path=db)
+            a = store.create([{"role": "user", "content": "a1"}], {"city": "León"})
+            store.append(a, {"role": "assistant", "content": "a2"}, {"role": "user", "content": "a3"})
+            store.create()  # desaloja ``a`` del LRU
+            otro = ConversationStore(db_path=db)
+            for s in (store, otro):
+                again = s.get(a.id)
+                self.assertEqual([m["content"] for m in again.messages], ["a1", "a2", "a3"])
+                self.assertEqual(again.profile, {"city": "León"})
+            self.assertTrue(otro.delete(a.id))
+            self.assertIsNone(ConversationStore(db_path=db).get(a.id))
+
+    def test_dos_workers_no_pisan_turnos(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "conv.db")
+            a, b = ConversationStore(db_path=db), ConversationStore(db_path=db)
+            conv_a = a.create([{"role": "user", "content": "hola"}])
+            conv_b = b.get(conv_a.id)
+            a.append(conv_a, {"role": "assistant", "content": "A1"})
+            # ``b`` tiene una copia sin A1; su turno va después, no encima.
+            b.append(conv_b, {"role": "user", "content": "B-u"}, {"role": "assistant", "content": "B-a"})
+            esperado = ["hola", "A1", "B-u", "B-a"]
+            self.assertEqual([m["content"] for m in conv_b.messages], esperado)
+            self.assertEqual([m["content"] for m in a.get(conv_a.id).messages], esperado)
+            self.assertEqual(
+                [m["content"] for m in ConversationStore(db_path=db).get(conv_a.id).messages], esperado
+            )
+
+    def test_purge_borra_expiradas(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ConversationStore(ttl=60, db_path=os.path.join(tmp, "conv.db"))
+            vieja = store.create([{"role": "user", "content": "hola"}])
+            store._db.execute("UPDATE llm_conversations SET updated_at = 0 WHERE id = ?", (vieja.id,))
+            store._db.commit()
+            store.create()
+            self.assertEqual(store.purge(), 1)
+            turnos = store._db.execute("SELECT COUNT(*) FROM llm_conversation_turns").fetchone()[0]
+            self.assertEqual(turnos, 0)
+
+
+class TestAgenteConversacion(unittest.TestCase):
+    def setUp(self):
+        import app.conversations as conversations
+
+        conversations._store = ConversationStore()
+
+    def test_solo_turno_nuevo(self):
+        from app.llm_agente_financia import agente_financia_chat
+
+        mock = AsyncMock(side_effect=["r1", "r2"])
+        with patch("app.llm_agente_financia.call_claude_text", mock):
+            first = asyncio.run(agente_financia_chat({"message": " hola ", "profileContext": {"name": "Ana"}}))
+            second = asyncio.run(
+                agente_financia_chat({"conversationId": first["conversationId"], "message": "crecer"})
+            )
+        self.assertEqual(second["reply"], "r2")
+        self.assertEqual(second["conversationId"], first["conversationId"])
+        enviados = mock.call_args_list[1].args[1]
+        self.assertEqual(
+            enviados,
+            [
+                {"role": "user", "content": "hola"},
+                {"role": "assistant", "content": "r1"},
+                {"role": "user", "content": "crecer"},
+            ],
+        )
+        self.assertIn("Ana", mock.call_args_list[1].kwargs["system_suffix"])
+
+    def test_fallo_no_guarda_turno(self):
+        from app.llm_agente_financia import agente_financia_chat
+
+        with patch("app.llm_agente_financia.call_claude_text", AsyncMock(return_value=None)):
+            out = asyncio.run(agente_financia_chat({"message": "hola"}))
+        self.assertFalse(out["ok"])
+        from app.conversations import get_conversations
+
+        self.assertEqual(get_conversations().get(out["conversationId"]).messages, [])
+
+    def test_id_desconocido(self):
+        from app.llm_agente_financia import agente_financia_chat
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(agente_financia_chat({"conversationId": "nope", "message": "hola"}))
+        self.assertEqual(ctx.exception.status_code, 404)
+        with patch("app.llm_agente_financia.call_claude_text", AsyncMock(return_value="ok")):
+            out = asyncio.run(
+                agente_financia_chat(
+                    {"conversationId": "nope", "message": "sigo", "messages": [{"role": "user", "content": "hola"}]}
+                )
+            )
+        self.assertNotEqual(out["conversationId"], "nope")
+
+
+def _historial_largo(pares):
+    msgs = []
+    for i in range(pares):
+        msgs.append({"role": "user", "content": f"respuesta {i} " + "detalle " * 60})
+        msgs.append({"role": "assistant", "content": f"PASO {min(i, 5)}. Entendido. " + "análisis " * 60 + "¿Algo más?"})
+    return msgs
+
+
+class TestResumenHistorial(unittest.TestCase):
+    def setUp(self):
+        os.environ["LLM_AGENTE_RESUMEN_TOKENS"] = "2000"
+        os.environ["LLM_AGENTE_TURNOS_RECIENTES"] = "4"
+
+    def tearDown(self):
+        del os.environ["LLM_AGENTE_RESUMEN_TOKENS"]
+        del os.environ["LLM_AGENTE_TURNOS_RECIENTES"]
+
+    def test_corto_sin_resumen(self):
+        from app.llm_agente_financia import _compactar_historial
+
+        self.assertEqual(_compactar_historial(_historial_largo(2)), (0, None))
+
+    def test_resumen_estructurado(self):
+        from app.llm_agente_financia import _compactar_historial, _formatear_resumen
+
+        msgs = [
+            {"role": "user", "content": "Hola, quiero financiamiento"},
+            {"role": "assistant", "content": "PASO 3:\n1. ¿Ingresos anuales?\n2. ¿Deuda bancaria?"},
+            {"role": "user", "content": "1) 18.5 millones, 2) 3 millones"},
+            {"role": "assistant", "content": "PASO 4. ¿Separas finanzas personales?"},
+            {"role": "user", "content": "No, tenemos 12 empleados y 3 cuentas"},
+        ] + _historial_largo(8)
+        desde, resumen = _compactar_historial(msgs)
+        self.assertEqual(len(msgs) - desde, 4)
+        self.assertEqual(msgs[desde]["role"], "user")
+        texto = _formatear_resumen(resumen)
+        self.assertIn("¿Ingresos anuales? → 18.5 millones", texto)
+        self.assertIn("¿Deuda bancaria? → 3 millones", texto)
+        self.assertIn("tenemos 12 empleados y 3 cuentas", texto)
+        self.assertEqual(resumen["paso"], "5")
+
+    def test_incremental_acotado(self):
+        from app.llm_agente_financia import _compactar_historial
+
+        msgs = _historial_largo(10)
+        desde, resumen = _compactar_historial(msgs)
+        msgs += _historial_largo(10)
+        desde2, resumen2 = _compactar_historial(msgs, resumen, desde)
+        self.assertGreater(desde2, desde)
+        self.assertEqual(len(msgs) - desde2, 4)
+        self.assertLessEqual(len(resumen2["intercambio"]), 24)
+
+    def test_agente_envia_resumen(self):
+        import app.conversations as conversations
+        from app.llm_agente_financia import agente_financia_chat
+
+        conversations._store = ConversationStore()
+        mock = AsyncMock(return_value="ok")
+        with patch("app.llm_agente_financia.call_claude_text", mock):
+            asyncio.run(agente_financia_chat({"message": "sigo", "messages": _historial_largo(10)}))
+        enviados = mock.call_args.args[1]
+        self.assertLessEqual(len(enviados), 5)
+        self.assertEqual(enviados[-1]["content"], "sigo")
+        self.assertIn("RESUMEN DE LA CONVERSACIÓN PREVIA", mock.call_args.kwargs["system_suffix"])
+
+
+if __name__ == "__main__":
+    unittest.main()
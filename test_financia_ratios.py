@@ -0,0 +1,80 @@
+"""
+Pruebas del motor de ratios multi-periodo F.I.N.A.N.C.I.A. (app/financia_ratios.py).
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_financia_ratios.py
+"""
+import unittest
+
+from app.financia_ratios import calcular_series
+from app.llm_financia import calcular_ratios_locales
+
+ESTADOS = [
+    {"periodo": "2022", "ingresos": 1000000, "costo_ventas": 600000, "utilidad_neta": 50000,
+     "ebitda": 120000, "activo_circulante": 400000, "activo_total": 900000,
+     "pasivo_circulante": 250000, "pasivo_total": 500000, "capital_contable": 400000,
+     "inventarios": 150000, "cuentas_por_cobrar": 180000, "cuentas_por_pagar": 90000,
+     "gastos_financieros": 30000, "deuda_bancaria_corto_plazo": 60000,
+     "deuda_bancaria_largo_plazo": 150000},
+    {"periodo": "2023", "ingresos": "1200000", "costo_ventas": 700000, "utilidad_neta": 80000,
+     "ebitda": 160000, "activo_circulante": 450000, "activo_total": 950000,
+     "pasivo_circulante": 0, "pasivo_total": 480000, "capital_contable": 470000,
+     "inventarios": "n/d", "cuentas_por_cobrar": 170000},
+    {"periodo": "2024", "ingresos": 1440000, "costo_ventas": 800000, "utilidad_neta": 110000,
+     "ebitda": 210000, "activo_circulante": 520000, "activo_total": 1000000,
+     "pasivo_circulante": 260000, "pasivo_total": 450000, "capital_contable": -10,
+     "inventarios": 140000, "cuentas_por_cobrar": 160000, "cuentas_por_pagar": 110000,
+     "gastos_financieros": 25000, "deuda_bancaria_corto_plazo": 40000},
+]
+
+
+def _ratios_escalares(estado):
+    """Cálculo escalar de referencia, periodo por periodo."""
+    def f(k):
+        try:
+            return float(estado.get(k, 0))
+        except Exception:
+            return 0.0
+    ing, cv, un, eb = f("ingresos"), f("costo_ventas"), f("utilidad_neta"), f("ebitda")
+    ac, at, pc, pt = f("activo_circulante"), f("activo_total"), f("pasivo_circulante"), f("pasivo_total")
+    cap, inv, gf = f("capital_contable"), f("inventarios"), f("gastos_financieros")
+    den = gf + (f("deuda_bancaria_corto_plazo") + f("deuda_bancaria_largo_plazo")) / 3
+    return {
+        "liquidez_corriente": ac / pc if pc > 0 else 0,
+        "prueba_acida": (ac - inv) / pc if pc > 0 else 0,
+        "ROE": un / cap if cap > 0 else 0,
+        "DSO": f("cuentas_por_cobrar") / ing * 365 if ing > 0 else 0,
+        "DSCR": eb / den if den > 0 else 0,
+    }
+
+
+class TestSeries(unittest.TestCase):
+    def test_ultimo_periodo_igual_al_escalar(self):
+        ratios = calcular_ratios_locales({"estados_financieros": ESTADOS})
+        for k, v in _ratios_escalares(ESTADOS[-1]).items():
+            self.assertEqual(ratios[k], v, k)
+        self.assertIn("X4", ratios["altman_componentes"])
+
+    def test_todos_los_periodos(self):
+        series = calcular_series({"estados_financieros": ESTADOS})
+        self.assertEqual(series["periodos"], ["2022", "2023", "2024"])
+        for i, estado in enumerate(ESTADOS):
+            for k, v in _ratios_escalares(estado).items():
+                self.assertAlmostEqual(series["ratios"][k][i], round(v, 4), places=4)
+
+    def test_crecimiento_y_tendencia(self):
+        series = calcular_series({"estados_financieros": ESTADOS})
+        ingresos = series["crecimiento"]["ingresos"]
+        self.assertEqual(ingresos["yoy"], [0.2, 0.2])
+        self.assertAlmostEqual(ingresos["cagr"], 0.2, places=4)
+        self.assertIsNone(series["crecimiento"]["capital_contable"]["cagr"])
+        self.assertGreater(series["tendencias"]["margen_neto"]["pendiente_por_periodo"], 0)
+
+    def test_un_periodo_y_vacio(self):
+        self.assertEqual(calcular_series({}), {})
+        series = calcular_series({"estados_financieros": ESTADOS[:1]})
+        self.assertNotIn("tendencias", series)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Paridad de la calificación por lotes del modelo General (app/general_batch.py).
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_general_batch.py
+"""
+import random
+import unittest
+
+from app.general_batch import calcular_modelo_batch
+from app.llm_general import PREFIJOS, _calcular_modelo, _normalizar_entrada
+
+VALORES = ["1", "2", "3", "4", "5", "a", " B ", "E", 3, 1.0, "", "x", None]
+
+
+def _cuestionarios(n, seed=11):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        d = {"sector": rnd.choice(["Servicios", "comercio", "Tecnología", "Minería", None]),
+             "numeroEmpleados": rnd.choice([None, 5, 30, 120, 900, "51-250", "grande"])}
+        for pref in PREFIJOS:
+            for q in range(1, 6):
+                if rnd.random() < 0.9:
+                    d[f"{pref}q{q}"] = rnd.choice(VALORES)
+            if rnd.random() < 0.8:
+                d[f"{pref}q6"] = rnd.choice(["1", "2", "3", "A", "b", "C", "z", 2])
+        out.append(d)
+    # Formato del frontend (respuestas por bloque)
+    out.append({"respuestas": {"estrategia_1": "D", "finanzas_2": "5", "asesoria_externa_finanzas": "C"}})
+    return out
+
+
+class TestParidad(unittest.TestCase):
+    def test_filas_identicas_al_escalar(self):
+        cuestionarios = _cuestionarios(1500)
+        batch = calcular_modelo_batch(cuestionarios)
+        self.assertEqual(len(batch), len(cuestionarios))
+        for k, d in enumerate(cuestionarios):
+            self.assertEqual(batch.row(k), _calcular_modelo(_normalizar_entrada(d)))
+
+    def test_columnas(self):
+        cols = calcular_modelo_batch(_cuestionarios(5, seed=2)).columns()
+        self.assertEqual(len(cols["calificaciones"]), 6)
+        self.assertEqual(len(cols["calificaciones"][0]), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
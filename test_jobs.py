@@ -0,0 +1,140 @@
+"""
+Pruebas de la cola de trabajos asíncronos (app/jobs.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_jobs.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from fastapi import HTTPException
+
+from app.jobs import DONE, ERROR, QUEUED, RUNNING, JobQueue, MemoryJobStore, SqliteJobStore
+
+
+async def _esperar(jobs, job_id):
+    for _ in range(100):
+        job = jobs.get(job_id)
+        if job["status"] in (DONE, ERROR):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("el trabajo no terminó")
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_resultado_y_error(self):
+        async def ok(data):
+            await asyncio.sleep(0.01)
+            return {"eco": data["x"]}
+
+        async def falla(data):
+            raise HTTPException(status_code=500, detail="sin modelo")
+
+        async def main():
+            jobs = JobQueue(MemoryJobStore(), workers=2)
+            jobs.register("ok", ok)
+            jobs.register("falla", falla)
+            a = jobs.submit("ok", {"x": 1})
+            b = jobs.submit("falla", {})
+            self.assertEqual(a["status"], QUEUED)
+            res = await _esperar(jobs, a["id"]), await _esperar(jobs, b["id"])
+            await jobs.stop()
+            return res
+
+        a, b = asyncio.run(main())
+        self.assertEqual(a["result"], {"eco": 1})
+        self.assertEqual(b["status"], ERROR)
+        self.assertEqual(b["error"], {"detail": "sin modelo", "status": 500})
+
+    def test_sqlite_retoma_pendientes(self):
+        async def ok(data):
+            return {"ok": True}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "jobs.db")
+            store = SqliteJobStore(path)
+            store.save({
+                "id": "j1", "kind": "ok", "status": QUEUED, "created_at": 0,
+                "updated_at": 0, "input": {}, "result": None, "error": None,
+            })
+
+            async def main():
+                jobs = JobQueue(SqliteJobStore(path), workers=1)
+                jobs.register("ok", ok)
+                jobs.start()
+                job = await _esperar(jobs, "j1")
+                await jobs.stop()
+                return job
+
+            job = asyncio.run(main())
+        self.assertEqual(job["status"], DONE)
+        self.assertEqual(job["result"], {"ok": True})
+
+    def test_sqlite_respeta_lease_de_otro_proceso(self):
+        llamadas = []
+
+        async def ok(data):
+            llamadas.append(data["n"])
+            return {"ok": True}
+
+        def fila(job_id, n, lease_until):
+            return {
+                "id": job_id, "kind": "ok", "status": RUNNING, "created_at": 0,
+                "updated_at": 0, "input": {"n": n}, "result": None, "error": None,
+                "owner": "otro", "lease_until": lease_until,
+            }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "jobs.db")
+            store = SqliteJobStore(path)
+            store.save(fila("vivo", 1, time.time() + 600))
+            store.save(fila("caido", 2, time.time() - 1))
+
+            async def main():
+                jobs = JobQueue(SqliteJobStore(path), workers=1)
+                jobs.register("ok", ok)
+                jobs.start()
+                caido = await _esperar(jobs, "caido")
+                await asyncio.sleep(0.05)
+                vivo = jobs.get("vivo")
+                await jobs.stop()
+                return caido, vivo
+
+            caido, vivo = asyncio.run(main())
+        self.assertEqual(caido["status"], DONE)
+        self.assertEqual(vivo["status"], RUNNING)
+        self.assertEqual(llamadas, [2])
+
+    def test_claim_es_exclusivo(self):
+        store = MemoryJobStore()
+        store.save({
+            "id": "j1", "kind": "ok", "status": QUEUED, "created_at": 0,
+            "updated_at": 0, "input": {}, "result": None, "error": None,
+        })
+        now = time.time()
+        self.assertEqual(store.claim("j1", "a", now, 60)["owner"], "a")
+        self.assertIsNone(store.claim("j1", "b", now, 60))
+        self.assertEqual(store.claim("j1", "b", now + 61, 60)["owner"], "b")
+
+    def test_barrido_purga_en_memoria(self):
+        async def ok(data):
+            return {"ok": True}
+
+        async def main():
+            jobs = JobQueue(MemoryJobStore(), workers=1, ttl=0)
+            jobs.register("ok", ok)
+            job = jobs.submit("ok", {})
+            await _esperar(jobs, job["id"])
+            jobs.sweep()
+            restante = jobs.get(job["id"])
+            await jobs.stop()
+            return restante
+
+        self.assertIsNone(asyncio.run(main()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Pruebas del parser JSON incremental (app/json_stream.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_json_stream.py
+"""
+import json
+import random
+import unittest
+
+from app.json_stream import JsonStreamParser, parse_json_object
+
+REPORTE = {
+    "resumen_ejecutivo": 'Empresa con "brechas" {críticas} en finanzas.',
+    "recomendaciones_por_seccion": [
+        {"seccion": "Estrategia", "prioridad": "Alta", "acciones": [1, 2]},
+        {"seccion": "Finanzas", "prioridad": "Crítica"},
+    ],
+    "indice": 42.5,
+    "urgente": True,
+    "nota": None,
+    "plan_30_dias": [],
+}
+
+
+class TestJsonStreamParser(unittest.TestCase):
+    def _feed_by(self, text, size):
+        parser = JsonStreamParser()
+        fields = []
+        for i in range(0, len(text), size):
+            fields.extend(parser.feed(text[i:i + size]))
+        return parser, fields
+
+    def test_emite_campos_al_cerrarse(self):
+        text = json.dumps(REPORTE, ensure_ascii=False)
+        parser, fields = self._feed_by(text, 1)
+        self.assertEqual(parser.close(), REPORTE)
+        self.assertEqual(
+            [p for p, _ in fields],
+            [
+                "resumen_ejecutivo",
+                "recomendaciones_por_seccion[0]",
+                "recomendaciones_por_seccion[1]",
+                "recomendaciones_por_seccion",
+                "indice",
+                "urgente",
+                "nota",
+                "plan_30_dias",
+            ],
+        )
+
+    def test_campo_disponible_antes_del_final(self):
+        parser = JsonStreamParser()
+        fields = parser.feed('{"resumen_ejecutivo": "ok", "plan_30_dias": [')
+        self.assertEqual(fields, [("resumen_ejecutivo", "ok")])
+        self.assertIsNone(parser.close())
+
+    def test_tolera_bloque_de_codigo_y_texto(self):
+        text = "Aquí está {el} análisis:\n```json\n" + json.dumps(REPORTE, indent=2) + "\n```\nSaludos."
+        parser, _ = self._feed_by(text, 7)
+        self.assertEqual(parser.close(), REPORTE)
+
+    def test_texto_sin_json(self):
+        self.assertIsNone(parse_json_object("Lo siento, no puedo ayudar."))
+        self.assertIsNone(parse_json_object('{"a": 1,}'))
+        self.assertEqual(parse_json_object("{}"), {})
+
+    def test_texto_despues_de_lista(self):
+        self.assertEqual(
+            parse_json_object('{"recs": [1, 2], "resumen": "texto"}'),
+            {"recs": [1, 2], "resumen": "texto"},
+        )
+
+    def test_paridad_con_json_loads(self):
+        rng = random.Random(7)
+
+        def valor(nivel):
+            tipo = rng.choice(["str", "num", "bool", "null"] + (["list", "dict"] if nivel < 3 else []))
+            if tipo == "str":
+                return rng.choice(["", "texto", 'con "comillas"', "llaves {}[]", "ñandú, 1"])
+            if tipo == "num":
+                return rng.choice([0, -3, 42.5, 1e-3])
+            if tipo == "bool":
+                return rng.random() < 0.5
+            if tipo == "null":
+                return None
+            if tipo == "list":
+                return [valor(nivel + 1) for _ in range(rng.randint(0, 3))]
+            return {f"k{i}": valor(nivel + 1) for i in range(rng.randint(0, 3))}
+
+        for _ in range(500):
+            obj = {f"c{i}": valor(1) for i in range(rng.randint(0, 6))}
+            text = json.dumps(obj, ensure_ascii=False)
+            self.assertEqual(parse_json_object(text), json.loads(text), text)
+            parser, _ = self._feed_by(text, rng.randint(1, 9))
+            self.assertEqual(parser.close(), json.loads(text), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
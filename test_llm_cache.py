@@ -0,0 +1,105 @@
+"""
+Pruebas de la caché de reportes LLM (app/llm_cache.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_llm_cache.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from app.llm_cache import ResponseCache, SingleFlight, cache_key
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_orden_de_claves_no_importa(self):
+        a = cache_key("general", {"a": 1, "b": [1, 2]}, model="m", system_prompt="p")
+        b = cache_key("general", {"b": [1, 2], "a": 1}, model="m", system_prompt="p")
+        self.assertEqual(a, b)
+
+    def test_modelo_y_prompt_cambian_la_clave(self):
+        base = cache_key("general", {"a": 1}, model="m", system_prompt="p")
+        self.assertNotEqual(base, cache_key("general", {"a": 1}, model="m2", system_prompt="p"))
+        self.assertNotEqual(base, cache_key("general", {"a": 1}, model="m", system_prompt="p v2"))
+        self.assertNotEqual(base, cache_key("express", {"a": 1}, model="m", system_prompt="p"))
+
+    def test_financia_ignora_metadatos(self):
+        from app.llm_financia import _clave_cache
+
+        datos = {"empresa": "Demo SA", "datos_financieros": {"ventas": 100}}
+        a = _clave_cache({**datos, "userId": "u1", "createdAt": "2024-01-01"})
+        b = _clave_cache({**datos, "userId": "u2", "createdAt": "2024-02-01"})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, _clave_cache({**datos, "empresa": "Otra SA"}))
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_devuelve_copia_identica(self):
+        cache = ResponseCache()
+        cache.set("k", {"resumen": "ñ", "lista": [1, 2]})
+        hit = cache.get("k")
+        self.assertEqual(hit, {"resumen": "ñ", "lista": [1, 2]})
+        hit["lista"].append(3)
+        self.assertEqual(cache.get("k")["lista"], [1, 2])
+
+    def test_lru_y_ttl(self):
+        cache = ResponseCache(ttl=0.05, max_entries=2)
+        cache.set("a", {"v": 1})
+        cache.set("b", {"v": 2})
+        cache.get("a")
+        cache.set("c", {"v": 3})
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"v": 1})
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+
+    def test_sqlite_sobrevive_reinicio(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            ResponseCache(db_path=path).set("k", {"v": 1})
+            self.assertEqual(ResponseCache(db_path=path).get("k"), {"v": 1})
+
+    def test_deshabilitada(self):
+        cache = ResponseCache(enabled=False)
+        cache.set("k", {"v": 1})
+        self.assertIsNone(cache.get("k"))
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_llamadas_concurrentes_comparten_una(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def modelo():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"resumen": "ok"}
+
+        async def main():
+            return await asyncio.gather(*[flight.do("k", modelo) for _ in range(4)])
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r == {"resumen": "ok"} for r in results))
+        self.assertEqual(len(flight), 0)
+
+    def test_error_del_lider_llega_a_los_seguidores(self):
+        flight = SingleFlight()
+
+        async def modelo():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("caído")
+
+        async def main():
+            return await asyncio.gather(
+                *[flight.do("k", modelo) for _ in range(3)], return_exceptions=True
+            )
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Pruebas de los circuit breakers (app/llm_circuit.py) y del acceso a /api/admin,
+sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_llm_circuit.py
+"""
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.llm_circuit import OPEN, CircuitBreaker, CircuitOpenError, guard
+from app.routers import admin
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TestGuard(unittest.TestCase):
+    def _llamar(self, breaker, exc=None):
+        async def main():
+            async with guard(breaker):
+                if exc is not None:
+                    raise exc
+
+        try:
+            asyncio.run(main())
+        except Exception as e:  # noqa: BLE001
+            return e
+
+    def test_registra_fallos_y_abre(self):
+        breaker = CircuitBreaker("t", failure_threshold=2)
+        self._llamar(breaker, TimeoutError("lento"))
+        self._llamar(breaker, _HTTPError(503))
+        self.assertEqual(breaker.state, OPEN)
+        self.assertIsInstance(self._llamar(breaker), CircuitOpenError)
+
+    def test_error_del_request_no_cuenta(self):
+        breaker = CircuitBreaker("t", failure_threshold=1)
+        self._llamar(breaker, _HTTPError(400))
+        self.assertEqual(breaker.failures, 0)
+        self.assertIsNone(self._llamar(breaker))
+        self.assertEqual(breaker.total_successes, 1)
+
+
+class _Falla:
+    """Cliente Anthropic cuyo stream lanza ``exc`` al abrirse."""
+
+    def __init__(self, exc):
+        self.messages, self.exc = self, exc
+
+    def stream(self, model, **request):
+        raise self.exc
+
+
+class TestAttemptBreaker(unittest.TestCase):
+    def setUp(self):
+        import app.llm_circuit as circuit
+
+        circuit._breakers.clear()
+
+    def _fallos(self, exc):
+        from app.llm_anthropic import _Attempt, _breaker
+
+        async def main():
+            attempt = _Attempt(_Falla(exc), "m", {}, "t")
+            await asyncio.gather(attempt.task, return_exceptions=True)
+
+        asyncio.run(main())
+        return _breaker("m").failures
+
+    def test_solo_fallas_del_modelo_cuentan(self):
+        self.assertEqual(self._fallos(_HTTPError(400)), 0)
+        self.assertEqual(self._fallos(_HTTPError(401)), 0)
+        self.assertEqual(self._fallos(_HTTPError(529)), 1)
+        self.assertEqual(self._fallos(TimeoutError("lento")), 2)
+
+
+class TestAdminAuth(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(admin.router, prefix="/api/admin")
+        self.client = TestClient(app)
+
+    def test_sin_token_configurado_no_expone_nada(self):
+        with patch.dict(os.environ, {"ADMIN_TOKEN": ""}):
+            self.assertEqual(self.client.get("/api/admin/llm/circuits").status_code, 404)
+            r = self.client.post("/api/admin/llm/circuits/openai/reset", headers={"X-Admin-Token": ""})
+            self.assertEqual(r.status_code, 404)
+
+    def test_token(self):
+        with patch.dict(os.environ, {"ADMIN_TOKEN": "s3creto"}):
+            self.assertEqual(self.client.get("/api/admin/llm/circuits").status_code, 401)
+            r = self.client.get("/api/admin/llm/circuits", headers={"X-Admin-Token": "otro"})
+            self.assertEqual(r.status_code, 401)
+            r = self.client.get("/api/admin/llm/circuits", headers={"X-Admin-Token": "s3creto"})
+            self.assertEqual(r.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
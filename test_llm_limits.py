@@ -0,0 +1,140 @@
+"""
+Pruebas del control de admisión LLM (app/llm_limits.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_llm_limits.py
+"""
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+from app.llm_limits import LLMOverloaded, ProviderLimiter
+
+
+class TestProviderLimiter(unittest.TestCase):
+    def test_prioridad_y_cola_llena(self):
+        async def main():
+            lim = ProviderLimiter("t", max_concurrency=1, queue_max=2, queue_timeout=1.0)
+            orden = []
+            await lim.acquire(0, 0)
+
+            async def esperar(prioridad, nombre):
+                await lim.acquire(prioridad, 0)
+                orden.append(nombre)
+                lim.release()
+
+            landing = asyncio.create_task(esperar(2, "landing"))
+            await asyncio.sleep(0)
+            diagnostico = asyncio.create_task(esperar(0, "diagnostico"))
+            await asyncio.sleep(0)
+            with self.assertRaises(LLMOverloaded) as ctx:
+                await lim.acquire(1, 0)
+            lim.release()
+            await asyncio.gather(landing, diagnostico)
+            return orden, ctx.exception
+
+        orden, exc = asyncio.run(main())
+        self.assertEqual(orden, ["diagnostico", "landing"])
+        self.assertEqual(exc.status_code, 503)
+        self.assertIn("Retry-After", exc.headers)
+
+    def test_timeout_en_cola(self):
+        async def main():
+            lim = ProviderLimiter("t", max_concurrency=1, queue_timeout=0.05)
+            await lim.acquire(0, 0)
+            with self.assertRaises(LLMOverloaded):
+                await lim.acquire(0, 0)
+            return lim.snapshot()
+
+        snap = asyncio.run(main())
+        self.assertEqual(snap["queued"], 0)
+        self.assertEqual(snap["rejected"], 1)
+
+
+class _Stream:
+    def __init__(self, delay, text):
+        self.delay, self.text = delay, text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        await asyncio.sleep(self.delay)
+        yield self.text
+
+    async def get_final_message(self):
+        return None
+
+
+class _Client:
+    """Primario lento, respaldo inmediato."""
+
+    def __init__(self):
+        self.messages = self
+        self.activos = []  # lugares ocupados al abrir cada llamada
+
+    def stream(self, model, **request):
+        from app.llm_limits import get_limiter
+
+        self.activos.append(get_limiter("anthropic").active)
+        return _Stream(5.0 if model == "lento" else 0.0, model)
+
+
+class TestHedgeLimiter(unittest.TestCase):
+    def setUp(self):
+        import app.llm_circuit as circuit
+        import app.llm_limits as limits
+
+        circuit._breakers.clear()
+        limits._limiters.clear()
+        os.environ["LLM_HEDGE_AFTER_S"] = "0.01"
+
+    def tearDown(self):
+        del os.environ["LLM_HEDGE_AFTER_S"]
+
+    def _carrera(self, max_concurrency):
+        from app.llm_anthropic import _Race, _breaker
+        from app.llm_limits import get_limiter
+
+        client = _Client()
+
+        async def main():
+            lim = get_limiter("anthropic")
+            lim.max_concurrency = max_concurrency
+            with patch("app.llm_anthropic._models_to_try", return_value=["lento", "rapido"]):
+                async with lim.slot("diagnostic", 10):
+                    race = _Race(client, {}, "t", 10)
+                    try:
+                        if max_concurrency == 1:
+                            return await asyncio.wait_for(race.first_to_finish(), 0.2)
+                        return await race.first_to_finish()
+                    finally:
+                        race.cancel_all()
+                        await asyncio.sleep(0)
+
+        try:
+            out = asyncio.run(main())
+        except asyncio.TimeoutError:
+            out = None
+        return out, client.activos, _breaker("lento").failures
+
+    def test_respaldo_ocupa_lugar_y_el_perdedor_no_falla(self):
+        ganador, activos, fallos = self._carrera(max_concurrency=2)
+        self.assertEqual(ganador, "rapido")
+        self.assertEqual(activos, [1, 2])  # el respaldo toma su propio lugar
+        self.assertEqual(fallos, 0)
+
+    def test_sin_lugar_no_hay_respaldo(self):
+        out, activos, fallos = self._carrera(max_concurrency=1)
+        self.assertIsNone(out)  # espera al primario en vez de lanzar el respaldo
+        self.assertEqual(activos, [1])
+        self.assertEqual(fallos, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Pruebas del presupuesto de tokens (app/llm_tokens.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_llm_tokens.py
+"""
+import os
+import unittest
+from types import SimpleNamespace
+
+from app.llm_metrics import record_output
+from app.llm_tokens import (
+    EntradaDemasiadoLarga,
+    estimar_tokens,
+    max_tokens_adaptativo,
+    planificar,
+    registrar_salida,
+)
+
+
+class TestEstimacion(unittest.TestCase):
+    def test_piezas(self):
+        self.assertEqual(estimar_tokens(""), 0)
+        self.assertEqual(estimar_tokens("hola"), 1)
+        self.assertEqual(estimar_tokens("empresa"), 2)
+        self.assertEqual(estimar_tokens("123456"), 2)
+        self.assertEqual(estimar_tokens('{"a":1}'), 7)
+
+
+class TestMaxTokensAdaptativo(unittest.TestCase):
+    def test_sin_muestras_usa_techo(self):
+        self.assertEqual(max_tokens_adaptativo("t_vacio", 6000), 6000)
+
+    def test_percentil_con_margen_y_piso(self):
+        for n in range(1, 101):
+            record_output("t_p99", n * 10)
+        # p99 = 990 → ×1.25 = 1238, bajo el techo
+        self.assertEqual(max_tokens_adaptativo("t_p99", 6000), 1238)
+        self.assertEqual(max_tokens_adaptativo("t_p99", 800), 800)
+        for _ in range(30):
+            record_output("t_piso", 10)
+        self.assertEqual(max_tokens_adaptativo("t_piso", 6000), 256)
+
+    def test_desactivado(self):
+        for _ in range(30):
+            record_output("t_off", 100)
+        os.environ["LLM_ADAPTIVE_MAX_TOKENS"] = "0"
+        try:
+            self.assertEqual(max_tokens_adaptativo("t_off", 3500), 3500)
+        finally:
+            del os.environ["LLM_ADAPTIVE_MAX_TOKENS"]
+
+    def test_reportes_json_usan_el_techo(self):
+        for _ in range(30):
+            record_output("express", 100)
+        self.assertEqual(max_tokens_adaptativo("express", 3500), 3500)
+
+    def test_truncada_registra_techo(self):
+        max_tokens_adaptativo("t_trunc", 3500)
+        for _ in range(30):
+            registrar_salida(
+                "t_trunc",
+                SimpleNamespace(usage=SimpleNamespace(output_tokens=400), stop_reason="max_tokens"),
+            )
+        self.assertEqual(max_tokens_adaptativo("t_trunc", 3500), 3500)
+
+
+class TestPlanificar(unittest.TestCase):
+    def setUp(self):
+        os.environ["LLM_CONTEXT_TOKENS"] = "1000"
+
+    def tearDown(self):
+        del os.environ["LLM_CONTEXT_TOKENS"]
+
+    def test_cabe_sin_cambios(self):
+        msgs = [{"role": "user", "content": "hola"}]
+        plan = planificar("t_plan", "sistema", msgs, 500)
+        self.assertEqual(plan.messages, msgs)
+        self.assertEqual(plan.max_tokens, 500)
+        self.assertEqual(plan.turnos_recortados, 0)
+
+    def test_recorta_turnos_antiguos(self):
+        largo = "palabra " * 150
+        msgs = [
+            {"role": "user", "content": largo},
+            {"role": "assistant", "content": largo},
+            {"role": "user", "content": largo},
+            {"role": "assistant", "content": "ok"},
+            {"role": "user", "content": "¿y ahora?"},
+        ]
+        plan = planificar("t_plan", "sistema", msgs, 500)
+        self.assertEqual(plan.messages[0]["role"], "user")
+        self.assertEqual(plan.messages[-1]["content"], "¿y ahora?")
+        self.assertGreater(plan.turnos_recortados, 0)
+        self.assertLessEqual(plan.tokens_entrada + plan.max_tokens, 1000)
+
+    def test_reduce_max_tokens_y_rechaza(self):
+        msgs = [{"role": "user", "content": "palabra " * 200}]
+        plan = planificar("t_plan", "", msgs, 800)
+        self.assertEqual(plan.tokens_entrada + plan.max_tokens, 1000)
+        with self.assertRaises(EntradaDemasiadoLarga) as ctx:
+            planificar("t_plan", "", [{"role": "user", "content": "palabra " * 900}], 800)
+        self.assertEqual(ctx.exception.status_code, 413)
+
+
+if __name__ == "__main__":
+    unittest.main()
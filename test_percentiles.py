@@ -0,0 +1,69 @@
+"""
+Pruebas del índice de percentiles compartido (app/percentiles.py).
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_percentiles.py
+"""
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from app.llm_express import QUESTION_MC, calcular_express
+from app.llm_general import _diagnostico_percentil
+from app.percentiles import (
+    BANDAS,
+    PERCENTILES_POR_SECTOR,
+    SECTORES,
+    TAMANOS,
+    banda,
+    bandas,
+    grupos,
+    umbrales,
+)
+
+
+class TestIndice(unittest.TestCase):
+    def test_enteros_igual_que_los_rangos(self):
+        for sector, tamano in itertools.product(SECTORES, TAMANOS):
+            for inicio, fin, clasif in PERCENTILES_POR_SECTOR[sector][tamano]:
+                for p in range(inicio, fin + 1):
+                    self.assertEqual(banda(p, sector, tamano), clasif)
+            fines = tuple(r[1] for r in PERCENTILES_POR_SECTOR[sector][tamano][:3])
+            self.assertEqual(umbrales(sector, tamano), fines)
+
+    def test_decimales_con_ceil(self):
+        self.assertEqual(banda(36.0, "Servicios", "Micro"), "Deficiente")
+        self.assertEqual(banda(36.2, "Servicios", "Micro"), "Promedio")
+        self.assertEqual(banda(120, "Desconocido", "?"), "Líder")
+
+    def test_vectorizado_igual_al_escalar(self):
+        rnd = random.Random(5)
+        idx = [round(rnd.uniform(-5, 105), 2) for _ in range(500)]
+        sec = [rnd.choice(SECTORES) for _ in idx]
+        tam = [rnd.choice(TAMANOS) for _ in idx]
+        codigos = bandas(np.array(idx), grupos(sec, tam))
+        self.assertEqual([BANDAS[c] for c in codigos], [banda(i, s, t) for i, s, t in zip(idx, sec, tam)])
+
+
+class TestConsistenciaMotores(unittest.TestCase):
+    def test_general_y_express_coinciden(self):
+        rnd = random.Random(9)
+        for _ in range(300):
+            sector = rnd.choice(SECTORES)
+            data = {
+                "sector": sector,
+                "numeroEmpleados": rnd.choice([3, 20, 100, 400]),
+                "respuestas": {qid: rnd.choice("ABCDE") for qid, _ in QUESTION_MC},
+            }
+            data["respuestas"].update({"qt1": "texto", "qt2": "texto", "qt3": "texto"})
+            calc = calcular_express(data)
+            self.assertEqual(
+                calc["capa1_percentil"],
+                _diagnostico_percentil(calc["indice_menthia_0_100"], sector, calc["tamano"]),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
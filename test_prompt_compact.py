@@ -0,0 +1,40 @@
+"""
+Pruebas de la compactación de prompts (app/prompt_compact.py).
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_prompt_compact.py
+"""
+import json
+import unittest
+
+from app.llm_general import _fmt_datos
+from app.prompt_compact import compactar, estimar_tokens, limpiar
+
+
+class TestCompactar(unittest.TestCase):
+    def test_quita_vacios_metadatos_y_espacios(self):
+        data = {
+            "userId": "u1",
+            "createdAt": "2024-01-01",
+            "problema": "  no   tengo\n\nliquidez ",
+            "vacio": "",
+            "lista": [None, "", {"x": None}, "ok"],
+            "anidado": {"correoElectronico": "a@b.c", "monto": 0, "activo": False},
+        }
+        self.assertEqual(
+            limpiar(data),
+            {"problema": "no tengo liquidez", "lista": ["ok"], "anidado": {"monto": 0, "activo": False}},
+        )
+
+    def test_general_omite_respuestas_ya_calificadas(self):
+        d = {"es_q1": "3", "fi_q6": "2", "sector": "Servicios", "retoPrincipal": "crecer  ventas", "userId": "x"}
+        self.assertEqual(json.loads(_fmt_datos(d)), {"retoPrincipal": "crecer ventas"})
+
+    def test_mas_corto_que_el_volcado(self):
+        data = {"a": {"b": [1, 2, 3], "c": "texto"}, "d": ""}
+        original = json.dumps(data, indent=2, ensure_ascii=False)
+        self.assertLess(estimar_tokens(compactar(data)), estimar_tokens(original))
+
+
+if __name__ == "__main__":
+    unittest.main()
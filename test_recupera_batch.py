@@ -0,0 +1,102 @@
+"""
+Paridad del motor R.E.C.U.P.E.R.A.™ vectorizado con el escalar (app/recupera_batch.py).
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_recupera_batch.py
+"""
+import random
+import unittest
+from dataclasses import asdict
+
+from app.recupera_batch import compute_recupera_escenarios, compute_recupera_profesional_batch
+from app.recupera_engine import compute_recupera_profesional
+
+
+def _cartera(n, seed=7):
+    rnd = random.Random(seed)
+    campos = (
+        "ventasMensuales", "costoVentasMensual", "gastosOperativos", "depreciacion",
+        "cuentasPorCobrar", "cuentasPorPagar", "inventarioTotal", "efectivoDisponible",
+        "comprasMensuales",
+    )
+    cartera = []
+    for _ in range(n):
+        row = {c: rnd.choice([0, None, -5000.0, rnd.uniform(0, 2e6)]) for c in campos}
+        for c in ("controlPresupuesto", "controlRevision", "controlKpis", "controlFlujoProyectado"):
+            row[c] = rnd.choice(["A", "b", "C) Parcial", "E", "", None, "x"])
+        cartera.append(row)
+    return cartera
+
+
+class TestParidad(unittest.TestCase):
+    def test_filas_identicas_al_escalar(self):
+        cartera = _cartera(2000)
+        batch = compute_recupera_profesional_batch(cartera)
+        self.assertEqual(len(batch), len(cartera))
+        for k, inputs in enumerate(cartera):
+            self.assertEqual(asdict(batch.row(k)), asdict(compute_recupera_profesional(inputs)))
+
+    def test_columnas_equivalen_a_filas(self):
+        cartera = _cartera(50, seed=3)
+        columnas = {c: [row.get(c) for row in cartera] for c in cartera[0]}
+        por_filas = compute_recupera_profesional_batch(cartera).columns()
+        por_columnas = compute_recupera_profesional_batch(columnas).columns()
+        self.assertEqual(por_filas, por_columnas)
+
+    def test_columnas_de_distinto_largo(self):
+        with self.assertRaises(ValueError):
+            compute_recupera_profesional_batch({"ventasMensuales": [1, 2], "inventarioTotal": [1]})
+
+
+class TestEscenarios(unittest.TestCase):
+    BASE = {
+        "ventasMensuales": 100000,
+        "costoVentasMensual": 70000,
+        "cuentasPorCobrar": 200000,
+        "cuentasPorPagar": 20000,
+        "comprasMensuales": 60000,
+        "inventarioTotal": 400000,
+    }
+
+    def test_rejilla_coincide_con_el_escalar(self):
+        out = compute_recupera_escenarios(
+            self.BASE,
+            {"reduccion_dias_cartera": [0, 10, 20, 30], "cierre_brecha_inventario": {"desde": 0, "hasta": 1, "paso": 0.5}},
+        )
+        self.assertEqual(out["forma"], [4, 3])
+        self.assertEqual(out["ejes"]["cierre_brecha_inventario"], [0.0, 0.5, 1.0])
+        # Escenario (30 días menos, inventario en el ideal): índice 3*3 + 2.
+        k = 11
+        esperado = compute_recupera_profesional(
+            {**self.BASE, "cuentasPorCobrar": 200000 - 30 * 100000 / 30, "inventarioTotal": 70000 / 12 * 2}
+        )
+        self.assertAlmostEqual(out["metricas"]["ciclo_caja"][k], esperado.ciclo_caja)
+        self.assertAlmostEqual(
+            out["metricas"]["dinero_recuperable_estimado"][k], esperado.dinero_recuperable_estimado
+        )
+        self.assertEqual(out["semaforos"][out["metricas"]["estado_flujo"][k]], esperado.estado_flujo)
+        self.assertEqual(out["metricas"]["indice_salud_0_100"][0], compute_recupera_profesional(self.BASE).indice_salud_0_100)
+
+    def test_palanca_desconocida(self):
+        with self.assertRaises(ValueError):
+            compute_recupera_escenarios(self.BASE, {"bajar_impuestos": [1]})
+
+    def test_rango_enorme_se_rechaza_sin_asignar(self):
+        with self.assertRaises(ValueError):
+            compute_recupera_escenarios(
+                self.BASE, {"reduccion_dias_cartera": {"desde": 0, "hasta": 1e10, "paso": 1}}
+            )
+        with self.assertRaises(ValueError):
+            compute_recupera_escenarios(
+                self.BASE, {"reduccion_dias_cartera": {"desde": 0, "hasta": float("inf"), "paso": 1}}
+            )
+        # Cada eje cabe pero el producto no.
+        eje = {"desde": 0, "hasta": 999, "paso": 1}
+        with self.assertRaises(ValueError):
+            compute_recupera_escenarios(
+                self.BASE, {"reduccion_dias_cartera": eje, "extension_dias_proveedores": eje}
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
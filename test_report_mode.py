@@ -0,0 +1,134 @@
+"""
+Pruebas del modo fast/full de los diagnósticos (app/report_mode.py), sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_report_mode.py
+"""
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+
+import app.llm_limits as llm_limits
+from app.llm_express import QUESTION_MC
+from app.llm_limits import LLMOverloaded, ProviderLimiter
+from app.report_mode import analizar, analizar_stream, resolver
+
+_GENERAL = {
+    "nombreEmpresa": "Demo SA",
+    "sector": "comercio",
+    "numeroEmpleados": 12,
+    "respuestas": {f"{p}{i}": "3" for p in ("EST", "FIN", "OPE", "MKT", "RH", "TEC", "GOB") for i in range(1, 4)},
+}
+_EXPRESS = {
+    "nombreEmpresa": "Demo SA",
+    "numeroEmpleados": 8,
+    "respuestas": {**{q: 2 for q, _ in QUESTION_MC}, "qt1": "Crecer ventas", "qt2": "Flujo de caja", "qt3": "Contratar"},
+}
+
+
+def _llenar_cola(n):
+    lim = ProviderLimiter("anthropic", queue_max=4)
+    lim._waiters = [(0, i, None, 0) for i in range(n)]
+    llm_limits._limiters["anthropic"] = lim
+
+
+class TestResolver(unittest.TestCase):
+    def tearDown(self):
+        llm_limits._limiters.pop("anthropic", None)
+
+    def test_modos(self):
+        self.assertEqual(resolver(None), "full")
+        self.assertEqual(resolver("FAST"), "fast")
+        with self.assertRaises(HTTPException) as ctx:
+            resolver("turbo")
+        self.assertEqual(ctx.exception.status_code, 422)
+
+    def test_degrada_por_cola(self):
+        _llenar_cola(1)
+        self.assertEqual(resolver("full"), "full")
+        _llenar_cola(2)
+        self.assertEqual(resolver("full"), "degradado")
+        self.assertEqual(resolver("full", provider=None), "full")
+        with patch.dict("os.environ", {"LLM_FAST_AUTO": "0"}):
+            self.assertEqual(resolver("full"), "full")
+
+
+class TestAnalizar(unittest.TestCase):
+    def test_fast_sin_modelo(self):
+        from app.llm_express import analizar_diagnostico_express_fast
+        from app.llm_general import analizar_diagnostico_general_fast
+        from app.llm_emergencia import analizar_diagnostico_emergencia_fast
+        from app.llm_profundo import analizar_diagnostico_profundo_fast
+
+        full = AsyncMock()
+        casos = [
+            (analizar_diagnostico_general_fast, _GENERAL),
+            (analizar_diagnostico_express_fast, _EXPRESS),
+            (analizar_diagnostico_emergencia_fast, {"nombreSolicitante": "Ana", "problemaPrincipal": "no alcanza para la nómina"}),
+            (analizar_diagnostico_profundo_fast, {"nombreEmpresa": "Demo"}),
+        ]
+        for fast, data in casos:
+            fast(data)  # calienta imports/caches
+            t0 = time.perf_counter()
+            out = asyncio.run(analizar("t", "fast", lambda: fast(data), full))
+            self.assertLess(time.perf_counter() - t0, 0.05, fast.__name__)
+            self.assertEqual(out["modo"], "fast")
+            self.assertNotIn("modo_degradado", out)
+        full.assert_not_called()
+
+    def test_rechazo_del_limitador_degrada(self):
+        full = AsyncMock(side_effect=LLMOverloaded("anthropic", 3))
+        out = asyncio.run(analizar("t", "full", lambda: {"ok": 1}, full))
+        self.assertEqual(out, {"ok": 1, "modo": "fast", "modo_degradado": True})
+        with patch.dict("os.environ", {"LLM_FAST_AUTO": "0"}), self.assertRaises(LLMOverloaded):
+            asyncio.run(analizar("t", "full", lambda: {"ok": 1}, full))
+
+
+async def _recoger(eventos):
+    return [e async for e in eventos]
+
+
+class TestStream(unittest.TestCase):
+    def tearDown(self):
+        llm_limits._limiters.pop("anthropic", None)
+
+    def test_fast_antes_del_modelo(self):
+        async def modelo():
+            yield "delta", {"text": "{"}
+            yield "result", {"ok": "modelo"}
+
+        eventos = asyncio.run(_recoger(analizar_stream("t", "full", lambda: {"ok": "reglas"}, modelo)))
+        self.assertEqual([e for e, _ in eventos], ["fast", "delta", "result"])
+        self.assertEqual(eventos[0][1]["ok"], "reglas")
+        self.assertEqual(eventos[-1][1], {"ok": "modelo"})
+
+    def test_rechazo_a_mitad_del_flujo(self):
+        async def modelo():
+            yield "error", {"detail": "saturado", "status": 503, "retry_after": 2}
+
+        eventos = asyncio.run(_recoger(analizar_stream("t", "full", lambda: {"ok": 1}, modelo)))
+        self.assertEqual([e for e, _ in eventos], ["fast", "error", "result"])
+        self.assertTrue(eventos[-1][1]["modo_degradado"])
+
+    def test_rechazo_lanzado_a_mitad_del_flujo(self):
+        async def modelo():
+            yield "delta", {"text": "{"}
+            raise LLMOverloaded("anthropic", 2)
+
+        eventos = asyncio.run(_recoger(analizar_stream("t", "full", lambda: {"ok": 1}, modelo)))
+        self.assertEqual([e for e, _ in eventos], ["fast", "delta", "result"])
+        self.assertEqual(eventos[-1][1], {"ok": 1, "modo": "fast", "modo_degradado": True})
+
+    def test_cola_llena_no_abre_el_modelo(self):
+        _llenar_cola(4)
+        modelo = AsyncMock()
+        eventos = asyncio.run(_recoger(analizar_stream("t", "full", lambda: {"ok": 1}, modelo)))
+        self.assertEqual(eventos, [("result", {"ok": 1, "modo": "fast", "modo_degradado": True})])
+        modelo.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
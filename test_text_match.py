@@ -0,0 +1,84 @@
+"""
+Pruebas del matcher de palabras clave (app/text_match.py) y de los
+analizadores que lo usan, sin red.
+
+Ejecutar desde la carpeta mentorapp_api_llm:
+  python test_text_match.py
+"""
+import random
+import unittest
+
+from app.text_match import KeywordMatcher
+from app.text_normalize import Normalizado, normalizar, plegar, unir
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_solapadas_y_categorias(self):
+        m = KeywordMatcher({"a": ["he", "she", "her"], "b": ["his", "he"]})
+        hits = m.buscar("usher")
+        self.assertEqual(
+            sorted((h.inicio, h.fin, h.patron, h.categoria) for h in hits),
+            [(1, 4, "she", "a"), (2, 4, "he", "a"), (2, 4, "he", "b"), (2, 5, "her", "a")],
+        )
+        self.assertEqual(m.categorias("usher"), {"a": {"he", "she", "her"}, "b": {"he"}})
+        self.assertEqual(m.categorias("nada"), {})
+
+    def test_plegado(self):
+        self.assertEqual(plegar("Diagnóstico AÑO Pingüino"), "diagnostico ano pinguino")
+        m = KeywordMatcher({"d": ["diagnostico"], "c": ["crítico"]})
+        self.assertEqual(set(m.categorias("DIAGNÓSTICO critico")), {"d", "c"})
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar("  SIN   Ventas,\n proveedores  "), "sin venta, proveedor")
+        self.assertEqual(normalizar("Almacén"), normalizar("almacenes"))
+        n = normalizar("Quiebra")
+        self.assertIsInstance(n, Normalizado)
+        self.assertIs(normalizar(n), n)
+        self.assertEqual(unir([n, normalizar(""), normalizar("crisis")]), "quiebra crisi")
+        m = KeywordMatcher({"v": ["sin ventas"], "i": ["almacén"]})
+        self.assertEqual(set(m.categorias("QUIEBRA, sin venta y almacen lleno")), {"v", "i"})
+
+    def test_primero_por_orden(self):
+        m = KeywordMatcher([("corta", "cost"), ("larga", "costo")])
+        self.assertEqual(m.primero("el costo"), "corta")
+        self.assertIsNone(m.primero("precio"))
+
+    def test_equivale_a_busqueda_ingenua(self):
+        rng = random.Random(7)
+        alfabeto = "abcn "
+        kws = {f"k{i}": ["".join(rng.choice(alfabeto) for _ in range(rng.randint(1, 4)))] for i in range(40)}
+        m = KeywordMatcher(kws)
+        for _ in range(200):
+            texto = "".join(rng.choice(alfabeto) for _ in range(rng.randint(0, 30)))
+            esperado = {cat for cat, (kw,) in kws.items() if normalizar(kw) and normalizar(kw) in normalizar(texto)}
+            self.assertEqual(set(m.categorias(texto)), esperado, texto)
+
+
+class TestAnalizadores(unittest.TestCase):
+    def test_emergencia(self):
+        from app.llm_emergencia import _analizar_sentimiento, _detectar_patrones_riesgo
+
+        out = _analizar_sentimiento("Estoy preocupado, no sé qué hacer, es urgente y crítico")
+        self.assertEqual(out["nivel_estres"], 2)
+        from app.llm_emergencia import _analisis_local
+
+        _, patrones, _ = _analisis_local(
+            {"problematicaEspecifica": "Sin liquidez", "problemaMasUrgente": "cero ventas"}
+        )
+        self.assertEqual(patrones["patrones_criticos"], ["flujo_caja_critico", "ventas_colapsadas"])
+        self.assertTrue(patrones["alerta_temprana"])
+        from app.text_normalize import normalizar as n
+
+        self.assertEqual(_detectar_patrones_riesgo(n("SIN VENTAS"))["patrones_criticos"], ["ventas_colapsadas"])
+
+    def test_respuestas_locales(self):
+        from app.llm_grok import get_quick_response
+        from app.llm_grok_ayuda import LOCAL_RESPONSES, get_local_response
+
+        self.assertIn("precios", get_quick_response("¿Cuánto cuesta?") or "")
+        self.assertEqual(get_local_response("¿Qué es la tasa de conversión?"), LOCAL_RESPONSES["tasa de conversion"])
+        self.assertIsNone(get_local_response("hola"))
+
+
+if __name__ == "__main__":
+    unittest.main()